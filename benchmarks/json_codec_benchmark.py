@@ -0,0 +1,46 @@
+"""
+Per-entity JSON encode/decode cost of each installed JSON backend (see openalex_sqlite_cache.json_codec).
+
+For each example entity in tests/examples_from_web_API, times:
+- encode/decode: the whole payload, as for raw payloads and snapshot records
+- flatten: Entity.flatten, which encodes the JSON columns (abstract_inverted_index, display_name_alternatives, ...)
+
+Run from the repository root: python benchmarks/json_codec_benchmark.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.cache import table_entity_classes
+
+from fixtures.examples import load_web_api_example
+
+EXAMPLES = ("work", "author", "institution", "source", "publisher", "funder", "concept", "topic")
+
+
+def microseconds_per_call(function, iterations: int) -> float:
+    return min(timeit.repeat(function, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main(iterations: int = 2000):
+    backends = [name for name, available in json_codec.available_json_backends().items() if available]
+    print(f"{'entity':<12} {'bytes':>7} {'backend':<8} {'encode us':>10} {'decode us':>10} {'flatten us':>11}")
+    for name in EXAMPLES:
+        data = load_web_api_example(name)
+        entity_class = table_entity_classes[name + "s"]
+        for backend in backends:
+            json_codec.set_json_backend(backend)
+            encoded = json_codec.dumpb(data)
+            encode = microseconds_per_call(lambda: json_codec.dumpb(data), iterations)
+            decode = microseconds_per_call(lambda: json_codec.loads(encoded), iterations)
+            flatten = microseconds_per_call(lambda: entity_class.flatten(data), iterations)
+            print(f"{name:<12} {len(encoded):>7} {backend:<8} {encode:>10.1f} {decode:>10.1f} {flatten:>11.1f}")
+    json_codec.set_json_backend()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,138 +1,133 @@
 import sqlite3
-from typing import Union, List
-import json
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from openalex_sqlite_cache.entity import Entity
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
 
 class Author(Entity):
 
+    TABLES = {
+        "authors": ("id", "orcid", "display_name", "display_name_alternatives", "works_count", "cited_by_count", "last_known_institution", "works_api_url", "updated_date"),
+        "authors_counts_by_year": ("author_id", "year", "works_count", "cited_by_count"),
+        "authors_ids": ("author_id", "openalex", "orcid", "scopus", "twitter", "wikipedia", "mag"),
+    }
+
+    # The parent table columns of the fields that are not stored in a column of the same name.
+    FIELD_COLUMNS = {"last_known_institutions": ("last_known_institution",)}
+
+    # Counts by year are read oldest year first.
+    ORDER_BY = {"authors_counts_by_year": "year DESC"}
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "ids": "authors_ids",
+        "counts_by_year": "authors_counts_by_year",
+    }
+
+    # The external IDs to index in external_ids, as kind: [(table, column)] (see identifiers.py).
+    EXTERNAL_IDS = {"orcid": [("authors", "orcid")]}
+
     # Only included here for type hinting
     def __init__(self, author: Union[pyalex.Author, dict]):
         super().__init__(author)
 
     @staticmethod
-    def create_authors_from_web_api_by_ids(conn: sqlite3.Connection, author_ids: list) -> "Author":
+    def create_authors_from_web_api_by_ids(conn: sqlite3.Connection, author_ids: list, transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Author":
         """
         Query the OpenAlex web API for a particular author(s) to create the pyalex.Author dict. Insert the author(s) into the database.
         The only Authors returned are those that were successfully inserted into the database.
         If an author already exists in the database, it will not be inserted again, and will not be returned here.
         """
-        if not isinstance(author_ids, list):
-            author_ids = [author_ids]
-        pyalexAuthors = []
-        for author_id in author_ids:
-            tmpAuthor = pyalex.Authors()[author_id] # I think this may be the syntax for just one author. How to do this for a list of authors at once?
-            pyalexAuthors.append(tmpAuthor)
-        assert len(pyalexAuthors) == len(author_ids)
-        authors = [Author(a) for a in pyalexAuthors]
-        return_authors = []
-        for author in authors:
-            try:
-                author.insert_or_replace_in_db(conn)
-                return_authors.append(author)
-            except sqlite3.IntegrityError as e:
-                # print(f"Error inserting author {author.author_id} into database: {e}")
-                pass            
-        return return_authors
+        return Author._create_from_web_api_by_ids(conn, author_ids, transport=transport, engine=engine)
+
+    @staticmethod
+    def iter_authors_from_db_by_ids(conn: sqlite3.Connection, author_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Author"]:
+        """
+        Query the database for authors to create their pyalex.Author dicts, in the order of the IDs (unknown IDs are left out).
+        The authors are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
+        """
+        return Author._iter_from_db_by_ids(conn, author_ids, chunk_size, lazy, fields, compact)
 
     @staticmethod
-    def read_authors_from_db_by_ids(conn: sqlite3.Connection, author_ids: Union[List[str], str]) -> "Author":
+    def read_authors_from_db_by_ids(conn: sqlite3.Connection, author_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Author"]:
         """
-        Query the database for a particular author to create its pyalex.Author dict. 
+        Query the database for authors to create their pyalex.Author dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, only the authors table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the authors only have those fields, and only their columns and tables are read.
+        With compact=True, the authors are compact AuthorRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
         """
-        if not isinstance(author_ids, list):
-            author_ids = [author_ids]        
-        cursor = conn.cursor()
+        return list(Author.iter_authors_from_db_by_ids(conn, author_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_author: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Author":
+        """
+        Build the author from its row of the authors table and the child rows grouped by author ID (see Entity._iter_rows).
+        """
+        author_id = result_author[0]
+        author_dict = {}
+        # Build the author_dict
         # AUTHORS
-        raw_sql = "SELECT id, orcid, display_name, display_name_alternatives, works_count, cited_by_count, last_known_institution, works_api_url, updated_date FROM authors WHERE id IN ({})".format(','.join('?' * len(author_ids)))
-        author_ids_tuple = tuple([Author._remove_base_url(author_id) for author_id in author_ids])
-        cursor.execute(raw_sql, author_ids_tuple)
-        result_authors = cursor.fetchall()
+        author_dict["id"] = Author._prepend_base_url(author_id)
+        author_dict["orcid"] = result_author[1]
+        author_dict["display_name"] = result_author[2]
+        author_dict["display_name_alternatives"] = json_codec.loads(result_author[3]) if result_author[3] is not None else None
+        author_dict["works_count"] = result_author[4]
+        author_dict["cited_by_count"] = result_author[5]
+        author_dict["last_known_institutions"] = [result_author[6]]
+        author_dict["works_api_url"] = Author._prepend_base_url(result_author[7])
+        author_dict["updated_date"] = result_author[8]
+
+        # AUTHORS_IDS
+        author_dict["ids"] = {}
+        for result_author_ids in child_rows["authors_ids"].get(author_id, [])[:1]:
+            author_dict["ids"]["openalex"] = result_author_ids[1]
+            author_dict["ids"]["orcid"] = result_author_ids[2]
+            author_dict["ids"]["scopus"] = result_author_ids[3]
+            author_dict["ids"]["twitter"] = result_author_ids[4]
+            author_dict["ids"]["wikipedia"] = result_author_ids[5]
+            author_dict["ids"]["mag"] = result_author_ids[6]
 
         # AUTHORS_COUNTS_BY_YEAR
-        raw_sql = "SELECT author_id, year, works_count, cited_by_count FROM authors_counts_by_year WHERE author_id IN ({})".format(','.join('?' * len(author_ids)))
-        cursor.execute(raw_sql, author_ids_tuple)
-        result_authors_counts_by_year = cursor.fetchall()
-
-        # AUTHORS_IDS        
-        raw_sql = "SELECT author_id, openalex, orcid, scopus, twitter, wikipedia, mag FROM authors_ids WHERE author_id IN ({})".format(','.join('?' * len(author_ids)))
-        cursor.execute(raw_sql, author_ids_tuple)
-        result_authors_ids = cursor.fetchall()
-
-        assert len(result_authors) == len(result_authors_ids)
-        authors = []
-        for i in range(len(result_authors)):
-            author_dict = {}        
-            # Build the author_dict
-            # AUTHORS
-            author_dict["id"] = Author._prepend_base_url(result_authors[i][0])
-            author_dict["orcid"] = result_authors[i][1]
-            author_dict["display_name"] = result_authors[i][2]
-            author_dict["display_name_alternatives"] = json.loads(result_authors[i][3])
-            author_dict["works_count"] = result_authors[i][4]
-            author_dict["cited_by_count"] = result_authors[i][5]
-            author_dict["last_known_institutions"] = []
-            last_known_institution = {}
-            last_known_institution["id"] = Author._prepend_base_url(result_authors[i][6])
-            author_dict["last_known_institutions"].append(result_authors[i][6])
-            author_dict["works_api_url"] = Author._prepend_base_url(result_authors[i][7])
-            author_dict["updated_date"] = result_authors[i][8]
-
-            # AUTHORS_IDS
-            author_dict["ids"] = {}
-            author_dict["ids"]["openalex"] = result_authors_ids[i][1]
-            author_dict["ids"]["orcid"] = result_authors_ids[i][2]
-            author_dict["ids"]["scopus"] = result_authors_ids[i][3]
-            author_dict["ids"]["twitter"] = result_authors_ids[i][4]
-            author_dict["ids"]["wikipedia"] = result_authors_ids[i][5]
-            author_dict["ids"]["mag"] = result_authors_ids[i][6]            
-        
-            # AUTHORS_COUNTS_BY_YEAR
-            author_dict["counts_by_year"] = []
-            for j in range(len(result_authors_counts_by_year)):
-                author_count_by_year = {
-                    "year": result_authors_counts_by_year[j][1],
-                    "works_count": result_authors_counts_by_year[j][2],
-                    "cited_by_count": result_authors_counts_by_year[j][3]
-                }
-                author_dict["counts_by_year"].append(author_count_by_year)                        
-
-            authors.append(Author(author_dict))
-        assert len(authors) == len(author_ids)
-
-        return authors
+        author_dict["counts_by_year"] = []
+        for count in child_rows["authors_counts_by_year"].get(author_id, []):
+            author_count_by_year = {
+                "year": count[1],
+                "works_count": count[2],
+                "cited_by_count": count[3]
+            }
+            author_dict["counts_by_year"].append(author_count_by_year)
+
+        return Author(author_dict)
     
+    read_from_db_by_ids = read_authors_from_db_by_ids
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the author from the database.
         """
         author_id = self.id
-        conn.execute("DELETE FROM authors WHERE id=?", (author_id,))
-        conn.execute("DELETE FROM authors_counts_by_year WHERE author_id=?", (author_id,))
-        conn.execute("DELETE FROM authors_ids WHERE author_id=?", (author_id,))
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [author_id])
+        conn.execute("DELETE FROM authors WHERE id=?", (stored_id,))
+        conn.execute("DELETE FROM authors_counts_by_year WHERE author_id=?", (stored_id,))
+        conn.execute("DELETE FROM authors_ids WHERE author_id=?", (stored_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(author: dict) -> Dict[str, List[tuple]]:
         """
-        REPLACE the author in the database.
+        Flatten the author into the rows of the authors tables.
         """
-        author = self.data
-        cursor = conn.cursor()
+        author_id = Author._remove_base_url(author['id'])
         # AUTHORS
-        insert_tuple = (Author._remove_base_url(author['id']), author['orcid'], author['display_name'], json.dumps(author['display_name_alternatives']), author['works_count'], author['cited_by_count'], Author._remove_base_url(author['last_known_institutions'][0]["id"]), author['works_api_url'], author['updated_date'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        cursor.execute(
-            f"REPLACE INTO authors (id, orcid, display_name, display_name_alternatives, works_count, cited_by_count, last_known_institution, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        last_known_institutions = author.get('last_known_institutions') or [{"id": None}]
+        authors_rows = [(author_id, author['orcid'], author['display_name'], json_codec.dumps(author['display_name_alternatives']), author['works_count'], author['cited_by_count'], Author._remove_base_url(last_known_institutions[0]["id"]), author['works_api_url'], author['updated_date'])]
 
         # AUTHORS_COUNTS_BY_YEAR
-        for count in author['counts_by_year']:
-            insert_tuple = (Author._remove_base_url(author['id']), count['year'], count['works_count'], count['cited_by_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            cursor.execute(
-                f"REPLACE INTO authors_counts_by_year (author_id, year, works_count, cited_by_count) VALUES ({question_marks})", insert_tuple
-            )
+        authors_counts_by_year_rows = [(author_id, count['year'], count['works_count'], count['cited_by_count']) for count in author['counts_by_year']]
 
         # AUTHORS_IDS
         author_ids = author['ids']
@@ -142,10 +137,10 @@ class Author(Entity):
         twitter_id = author_ids.get('twitter')
         wikipedia_id = author_ids.get('wikipedia')
         mag_id = author_ids.get('mag')
-        insert_tuple = (Author._remove_base_url(author['id']), openalex_id, orcid_id, scopus_id, twitter_id, wikipedia_id, mag_id)
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        cursor.execute(
-            f"REPLACE INTO authors_ids (author_id, openalex, orcid, scopus, twitter, wikipedia, mag) VALUES ({question_marks})", insert_tuple
-        )
+        authors_ids_rows = [(author_id, openalex_id, orcid_id, scopus_id, twitter_id, wikipedia_id, mag_id)]
 
-        conn.commit()
\ No newline at end of file
+        return {
+            "authors": authors_rows,
+            "authors_counts_by_year": authors_counts_by_year_rows,
+            "authors_ids": authors_ids_rows,
+        }
@@ -0,0 +1,56 @@
+import sqlite3
+from typing import Union, List, Optional
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.concept import Concept
+from openalex_sqlite_cache.funder import Funder
+from openalex_sqlite_cache.institution import Institution
+from openalex_sqlite_cache.publisher import Publisher
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.topic import Topic
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.get_items_from_api import short_id, Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+
+first_letter_entity_classes = {
+    "W": Work,
+    "A": Author,
+    "S": Source,
+    "I": Institution,
+    "C": Concept,
+    "T": Topic,
+    "P": Publisher,
+    "F": Funder,
+}
+
+# The same classes, keyed by the name of their parent table (e.g. "authors").
+table_entity_classes = {next(iter(entity_class.TABLES)): entity_class for entity_class in first_letter_entity_classes.values()}
+
+def get_entity_class(openalex_item_id: str):
+    """
+    Return the Entity subclass for an OpenAlex ID, based on the first letter of the ID.
+    """
+    first_letter = short_id(openalex_item_id)[:1].upper()
+    if first_letter not in first_letter_entity_classes:
+        raise ValueError(f"Unknown OpenAlex ID type: {openalex_item_id}")
+    return first_letter_entity_classes[first_letter]
+
+def get_or_fetch(conn: sqlite3.Connection, openalex_item_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None,
+                 fields: Optional[List[str]] = None) -> list:
+    """
+    Return the entities for IDs of any type, in the order requested.
+    The IDs are grouped by entity type, and each group goes through its entity class' get_or_fetch, so only the IDs missing from the database are fetched from the web API.
+    fields limits the fields of the entities (see Entity.get_or_fetch); they must exist in every requested entity type.
+    """
+    if not isinstance(openalex_item_ids, list):
+        openalex_item_ids = [openalex_item_ids]
+    ids_by_class = {}
+    for item_id in openalex_item_ids:
+        ids_by_class.setdefault(get_entity_class(item_id), []).append(item_id)
+
+    entities_by_id = {}
+    for entity_class, item_ids in ids_by_class.items():
+        for entity in entity_class.get_or_fetch(conn, item_ids, transport=transport, engine=engine, fields=fields):
+            entities_by_id[entity.id] = entity
+    requested_ids = [short_id(item_id) for item_id in openalex_item_ids]
+    return [entities_by_id[item_id] for item_id in requested_ids if item_id in entities_by_id]
@@ -0,0 +1,143 @@
+import sqlite3
+from typing import Dict, List, Optional, Union
+
+from openalex_sqlite_cache import entity
+from openalex_sqlite_cache.compact_ids import read_ids, stored_ids, uses_compact_ids
+from openalex_sqlite_cache.entity import MAX_SQL_VARIABLES, temp_id_table
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+from openalex_sqlite_cache.get_items_from_api import Transport, chunk_ids, short_id
+from openalex_sqlite_cache.work import Work
+
+# The edges of each direction of the citation graph, as (table, column of the known work, column of its neighbor).
+# Each lookup column is indexed: work_id by init_db.sql, referenced_work_id by indexes.SECONDARY_INDEXES.
+DIRECTIONS = {
+    "references": ("works_referenced_works", "work_id", "referenced_work_id"),
+    "cited_by": ("works_referenced_works", "referenced_work_id", "work_id"),
+    "related": ("works_related_works", "work_id", "related_work_id"),
+}
+
+
+def _short_ids(work_ids: Union[List[str], str]) -> List[str]:
+    if not isinstance(work_ids, list):
+        work_ids = [work_ids]
+    return list(dict.fromkeys(short_id(work_id) for work_id in work_ids))
+
+
+def _fetch_missing_works(conn: sqlite3.Connection, work_ids: List[str], transport: Optional[Transport], engine: Optional[FetchEngine]):
+    """
+    Fetch the works missing from the cache from the web API and insert them, so that their references are known.
+    """
+    existing_ids = Work._existing_ids(conn, work_ids)
+    missing_ids = [work_id for work_id in work_ids if work_id not in existing_ids]
+    if missing_ids:
+        Work._create_from_web_api_by_ids(conn, missing_ids, transport=transport, engine=engine)
+
+
+def neighbors(conn: sqlite3.Connection, work_ids: Union[List[str], str], direction: str = "references") -> Dict[str, List[str]]:
+    """
+    The neighbors of works in one direction of the graph (see DIRECTIONS), in the cache: {work_id: [neighbor_id, ...]}, for every requested work.
+    Reads MAX_SQL_VARIABLES works per indexed IN (...) query, or joins a TEMP table of the IDs for more than entity.TEMP_TABLE_THRESHOLD works.
+    In a compact cache (see compact_ids.py), the edges are read in the order of the (work_id, position) primary key instead of the rowid.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction: {direction}. Choose from {list(DIRECTIONS)}")
+    table, key_column, neighbor_column = DIRECTIONS[direction]
+    work_ids = _short_ids(work_ids)
+    result = {work_id: [] for work_id in work_ids}
+    compact = uses_compact_ids(conn)
+    order_by = "position" if compact else "rowid"
+
+    def add_edges(rows: List[tuple]):
+        for work_id, neighbor_id in zip(read_ids(conn, (row[0] for row in rows), "W"), read_ids(conn, (row[1] for row in rows), "W")):
+            result[work_id].append(neighbor_id)
+
+    if len(work_ids) > entity.TEMP_TABLE_THRESHOLD:
+        with temp_id_table(conn, work_ids, "W" if compact else None) as id_table:
+            raw_sql = "SELECT e.{0}, e.{1} FROM {2} t JOIN {3} e ON e.{0} = t.id ORDER BY e.{4}".format(key_column, neighbor_column, id_table, table, order_by)
+            add_edges(conn.execute(raw_sql).fetchall())
+        return result
+    for chunk in chunk_ids(work_ids, MAX_SQL_VARIABLES):
+        raw_sql = "SELECT {}, {} FROM {} WHERE {} IN ({}) ORDER BY {}".format(key_column, neighbor_column, table, key_column, ','.join('?' * len(chunk)), order_by)
+        add_edges(conn.execute(raw_sql, stored_ids(conn, chunk, "W")).fetchall())
+    return result
+
+
+def references(conn: sqlite3.Connection, work_ids: Union[List[str], str], fetch_missing: bool = False,
+               transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> Dict[str, List[str]]:
+    """
+    The works each work references: {work_id: [referenced_work_id, ...]} (short IDs).
+    With fetch_missing, the works missing from the cache are fetched from the web API (in batches) and inserted first.
+    """
+    work_ids = _short_ids(work_ids)
+    if fetch_missing:
+        _fetch_missing_works(conn, work_ids, transport, engine)
+    return neighbors(conn, work_ids, "references")
+
+
+def cited_by(conn: sqlite3.Connection, work_ids: Union[List[str], str]) -> Dict[str, List[str]]:
+    """
+    The cached works that cite each work: {work_id: [citing_work_id, ...]} (short IDs).
+    Only the citations of the works in the cache are known, so this is a subset of the work's cited_by_count.
+    """
+    return neighbors(conn, work_ids, "cited_by")
+
+
+def related(conn: sqlite3.Connection, work_ids: Union[List[str], str]) -> Dict[str, List[str]]:
+    """
+    The related works of each work: {work_id: [related_work_id, ...]} (short IDs).
+    """
+    return neighbors(conn, work_ids, "related")
+
+
+def k_hop(conn: sqlite3.Connection, work_ids: Union[List[str], str], depth: int = 1, direction: str = "references", fetch_missing: bool = False,
+          transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> Dict[str, int]:
+    """
+    The works within depth hops of the given works, with their distance in hops (the given works are at 0).
+    The graph is walked breadth first, one batched query (see neighbors) per hop for the whole frontier.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        work_ids (list[str]): The works to start from.
+        depth (int): The maximum number of hops.
+        direction (str): "references", "cited_by", "related", or "both" (references and cited_by).
+        fetch_missing (bool): Before expanding each frontier, fetch its works missing from the cache from the web API and insert them,
+            so that their references are known. Only useful with "references" or "related": citing works cannot be discovered from the cache.
+        transport (Transport): Optional callable used to send the requests.
+        engine (FetchEngine): Optional fetch engine, to rate limit and retry the requests.
+
+    Returns:
+        dict: {work_id: hops}, in the order the works were reached.
+    """
+    directions = ["references", "cited_by"] if direction == "both" else [direction]
+    if any(d not in DIRECTIONS for d in directions):
+        raise ValueError(f"Unknown direction: {direction}. Choose from {list(DIRECTIONS) + ['both']}")
+    if depth < 0:
+        raise ValueError("depth cannot be negative")
+    hops = {work_id: 0 for work_id in _short_ids(work_ids)}
+    frontier = list(hops)
+    for hop in range(1, depth + 1):
+        if not frontier:
+            break
+        if fetch_missing:
+            _fetch_missing_works(conn, frontier, transport, engine)
+        next_frontier = []
+        for d in directions:
+            for neighbor_ids in neighbors(conn, frontier, d).values():
+                for neighbor_id in neighbor_ids:
+                    if neighbor_id not in hops:
+                        hops[neighbor_id] = hop
+                        next_frontier.append(neighbor_id)
+        frontier = next_frontier
+    return hops
+
+
+def co_citation(conn: sqlite3.Connection, work_a: str, work_b: str) -> int:
+    """
+    The co-citation count of two works: the number of cached works that cite both.
+    """
+    raw_sql = (
+        "SELECT COUNT(DISTINCT a.work_id) FROM works_referenced_works a "
+        "JOIN works_referenced_works b ON b.work_id = a.work_id "
+        "WHERE a.referenced_work_id = ? AND b.referenced_work_id = ?"
+    )
+    return conn.execute(raw_sql, stored_ids(conn, [short_id(work_a), short_id(work_b)], "W")).fetchone()[0]
@@ -0,0 +1,172 @@
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# In the compact schema (see init_db.open_openalex_db(..., compact_ids=True)), OpenAlex IDs are stored as the INTEGER after their
+# prefix, e.g. W2741809807 as 2741809807 in works.id and works_referenced_works.referenced_work_id. The prefix is implied by the
+# column: the first column of every table of an entity type holds IDs of that type (see Entity.TABLES), and the other ID columns
+# are listed in ID_COLUMNS. The IDs are converted back when read, so the entities and the APIs of the cache are unchanged.
+
+# The prefix of the IDs of each entity type, by parent table.
+ENTITY_PREFIXES = {
+    "works": "W",
+    "authors": "A",
+    "sources": "S",
+    "institutions": "I",
+    "concepts": "C",
+    "topics": "T",
+    "publishers": "P",
+    "funders": "F",
+}
+
+# The prefix of the IDs of the other ID columns, per table. Columns that may hold IDs of several types (e.g. sources.publisher,
+# a publisher or an institution) are not listed, and stay TEXT.
+ID_COLUMNS = {
+    "works_primary_locations": {"source_id": "S"},
+    "works_locations": {"source_id": "S"},
+    "works_best_oa_locations": {"source_id": "S"},
+    "works_authorships": {"author_id": "A", "institution_id": "I"},
+    "works_topics": {"topic_id": "T"},
+    "works_concepts": {"concept_id": "C"},
+    "works_referenced_works": {"referenced_work_id": "W"},
+    "works_related_works": {"related_work_id": "W"},
+    "authors": {"last_known_institution": "I"},
+    "institutions_associated_institutions": {"associated_institution_id": "I"},
+    "concepts_ancestors": {"ancestor_id": "C"},
+    "concepts_related_concepts": {"related_concept_id": "C"},
+    "topics": {"subfield_id": "subfields/", "field_id": "fields/", "domain_id": "domains/"},
+    # Tables derived from the entity tables
+    "concepts_closure": {"ancestor_id": "C", "descendant_id": "C"},
+    "domains": {"id": "domains/"},
+    "fields": {"id": "fields/", "domain_id": "domains/"},
+    "subfields": {"id": "subfields/", "field_id": "fields/", "domain_id": "domains/"},
+}
+
+# The ID columns of the other tables, whose prefix is implied by another column of the row (the entity type of refresh_log,
+# the level of topic_rollups).
+TYPED_ID_COLUMNS = {
+    "refresh_log": "id",
+    "topic_rollups": "taxon_id",
+}
+
+# The tables of init_db.sql, other than the entity tables, that hold IDs of the entity tables.
+DERIVED_TABLES = ("refresh_log", "concepts_closure", "domains", "fields", "subfields", "topic_rollups")
+
+
+def uses_compact_ids(conn: sqlite3.Connection) -> bool:
+    """
+    Whether the cache of the connection uses the compact schema. Set on the connections opened by init_db.open_openalex_db.
+    """
+    return getattr(conn, "compact_ids", False)
+
+
+def encode_id(value: Any, prefix: str) -> Any:
+    """
+    The stored form of an ID, e.g. "W2741809807" -> 2741809807 for the prefix "W". Values that are not an ID with the prefix
+    (None, other strings) are stored as they are, which SQLite allows in INTEGER columns.
+    """
+    if isinstance(value, str) and value.startswith(prefix):
+        number = value[len(prefix):]
+        # IDs with leading zeros would not survive the round trip.
+        if number.isascii() and number.isdigit() and (number[0] != "0" or number == "0"):
+            return int(number)
+    return value
+
+
+def decode_id(value: Any, prefix: str) -> Any:
+    """
+    The ID of a stored value, e.g. 2741809807 -> "W2741809807" for the prefix "W".
+    """
+    return prefix + str(value) if isinstance(value, int) else value
+
+
+def encode_ids(ids: Iterable[Any], prefix: str) -> list:
+    """The stored form of IDs (see encode_id)."""
+    return [encode_id(value, prefix) for value in ids]
+
+
+def decode_ids(values: Iterable[Any], prefix: str) -> list:
+    """The IDs of stored values (see decode_id)."""
+    return [decode_id(value, prefix) for value in values]
+
+
+def stored_ids(conn: sqlite3.Connection, ids: Iterable[Any], prefix: str) -> list:
+    """The IDs as stored in the cache of the connection: encoded in a compact cache, unchanged otherwise."""
+    return encode_ids(ids, prefix) if uses_compact_ids(conn) else list(ids)
+
+
+def read_ids(conn: sqlite3.Connection, values: Iterable[Any], prefix: str) -> list:
+    """The IDs of values read from the cache of the connection (see stored_ids)."""
+    return decode_ids(values, prefix) if uses_compact_ids(conn) else list(values)
+
+
+@lru_cache(maxsize=None)
+def row_id_columns(parent_table: str, table: str, columns: Tuple[str, ...]) -> Tuple[Tuple[int, str], ...]:
+    """
+    The (index, prefix) of the ID columns of the rows of a table of an entity type (parent_table), in the order of columns.
+    """
+    id_columns = dict(ID_COLUMNS.get(table, {}))
+    id_columns[columns[0]] = ENTITY_PREFIXES[parent_table]
+    return tuple((index, id_columns[column]) for index, column in enumerate(columns) if column in id_columns)
+
+
+def encode_rows(parent_table: str, table: str, columns: Tuple[str, ...], rows: List[tuple], positions: bool = False) -> List[tuple]:
+    """
+    The stored form of the rows of a table of an entity type. With positions, a last column numbers the rows of each entity
+    from 0 in their order, for the (entity ID, position) primary key of the compact child tables.
+    """
+    id_columns = row_id_columns(parent_table, table, columns)
+    counts: Dict[Any, int] = {}
+    encoded_rows = []
+    for row in rows:
+        row = list(row)
+        for index, prefix in id_columns:
+            row[index] = encode_id(row[index], prefix)
+        if positions:
+            position = counts.get(row[0], 0)
+            counts[row[0]] = position + 1
+            row.append(position)
+        encoded_rows.append(tuple(row))
+    return encoded_rows
+
+
+def decode_rows(parent_table: str, table: str, columns: Tuple[str, ...], rows: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    The rows of a table of an entity type, with their IDs converted back from the stored form, as they are consumed.
+    """
+    id_columns = row_id_columns(parent_table, table, columns)
+    for row in rows:
+        row = list(row)
+        for index, prefix in id_columns:
+            row[index] = decode_id(row[index], prefix)
+        yield tuple(row)
+
+
+def compact_table_sql(parent_table: str, table: str, columns: List[Tuple[str, str]]) -> str:
+    """
+    The CREATE TABLE statement of a table of an entity type in the compact schema, from its (column, declared type) in init_db.sql.
+    The parent table is keyed by its INTEGER ID (the rowid, so the table is clustered by ID). The child tables get a position
+    column and are WITHOUT ROWID tables clustered by (entity ID, position), so that the rows of an entity are stored together,
+    in order, with no separate index on the entity ID.
+    """
+    column_names = tuple(column for column, _ in columns)
+    id_columns = {column_names[index] for index, _ in row_id_columns(parent_table, table, column_names)}
+    definitions = [f"{column} {'INTEGER' if column in id_columns else declared_type}" for column, declared_type in columns]
+    if table == parent_table:
+        definitions[0] += " PRIMARY KEY"
+        return f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(definitions) + "\n);"
+    definitions.append("position INTEGER")
+    definitions.append(f"PRIMARY KEY ({columns[0][0]}, position)")
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(definitions) + "\n) WITHOUT ROWID;"
+
+
+def compact_derived_table_sql(table: str, sql: str) -> str:
+    """
+    The CREATE TABLE statement of a table derived from the entity tables (see ID_COLUMNS and TYPED_ID_COLUMNS) in the compact schema:
+    its statement in init_db.sql (as in sqlite_master), with INTEGER ID columns.
+    """
+    id_columns = list(ID_COLUMNS.get(table, {})) + ([TYPED_ID_COLUMNS[table]] if table in TYPED_ID_COLUMNS else [])
+    for column in id_columns:
+        sql = re.sub(rf"^(\s*){column} TEXT\b", rf"\1{column} INTEGER", sql, flags=re.MULTILINE)
+    return sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1) + ";"
@@ -1,186 +1,173 @@
 import sqlite3
-from typing import Union, List
-import json
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from openalex_sqlite_cache.entity import Entity
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.concept_hierarchy import update_concept_closure
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
 
 class Concept(Entity):
 
+    TABLES = {
+        "concepts": ("id", "wikidata", "display_name", "level", "description", "works_count", "cited_by_count", "image_url", "image_thumbnail_url", "works_api_url", "updated_date"),
+        "concepts_ancestors": ("concept_id", "ancestor_id", "ancestor_level"),
+        "concepts_counts_by_year": ("concept_id", "year", "works_count", "cited_by_count"),
+        "concepts_ids": ("concept_id", "openalex", "wikidata", "wikipedia", "umls_cui", "mag"),
+        "concepts_related_concepts": ("concept_id", "related_concept_id", "score"),
+    }
+
+    # Counts by year are read oldest year first.
+    ORDER_BY = {"concepts_counts_by_year": "year DESC"}
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "ancestors": "concepts_ancestors",
+        "counts_by_year": "concepts_counts_by_year",
+        "ids": "concepts_ids",
+        "related_concepts": "concepts_related_concepts",
+    }
+
     def __init__(self, concept: Union[pyalex.Concept, dict]):
         super().__init__(concept)
 
     @staticmethod
-    def create_concepts_from_web_api_by_ids(conn: sqlite3.Connection, concept_ids: Union[List[str], str]) -> "Concept":
+    def create_concepts_from_web_api_by_ids(conn: sqlite3.Connection, concept_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Concept":
         """
         Query the OpenAlex web API for a particular concept(s) to create the pyalex.Concept dict. Insert the concept(s) into the database.
         The only Concepts returned are those that were successfully inserted into the database.
         If a concept already exists in the database, it will not be inserted again, and will not be returned here.
         """
-        if not isinstance(concept_ids, list):
-            concept_ids = [concept_ids]        
-        pyAlexConcepts = []
-        for concept_id in concept_ids:
-            tmpConcept = pyalex.Concepts()[concept_id]
-            pyAlexConcepts.append(tmpConcept)
-        assert len(pyAlexConcepts) == len(concept_ids)
-        concepts = [Concept(c) for c in pyAlexConcepts]
-        return_concepts = []
-        for concept in concepts:
-            try:
-                concept.insert_or_replace_in_db(conn)
-                return_concepts.append(concept)
-            except sqlite3.IntegrityError as e:
-                # print(f"Error inserting concept {concept.concept_id} into database: {e}")
-                pass
-        return return_concepts
+        return Concept._create_from_web_api_by_ids(conn, concept_ids, transport=transport, engine=engine)
 
     @staticmethod
-    def read_concepts_from_db_by_ids(conn: sqlite3.Connection, concept_ids: Union[List[str], str]) -> "Concept":
+    def iter_concepts_from_db_by_ids(conn: sqlite3.Connection, concept_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Concept"]:
         """
-        Query the database for a particular concept to create its pyalex.Concept dict. 
+        Query the database for concepts to create their pyalex.Concept dicts, in the order of the IDs (unknown IDs are left out).
+        The concepts are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
         """
-        if not isinstance(concept_ids, list):
-            concept_ids = [concept_ids]        
-        cursor = conn.cursor()
+        return Concept._iter_from_db_by_ids(conn, concept_ids, chunk_size, lazy, fields, compact)
+
+    @staticmethod
+    def read_concepts_from_db_by_ids(conn: sqlite3.Connection, concept_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Concept"]:
+        """
+        Query the database for concepts to create their pyalex.Concept dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, only the concepts table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the concepts only have those fields, and only their columns and tables are read.
+        With compact=True, the concepts are compact ConceptRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
+        """
+        return list(Concept.iter_concepts_from_db_by_ids(conn, concept_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_concept: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Concept":
+        """
+        Build the concept from its row of the concepts table and the child rows grouped by concept ID (see Entity._iter_rows).
+        """
+        concept_id = result_concept[0]
+        concept_dict = {}
+        # Build the concept_dict
         # CONCEPTS
-        raw_sql = "SELECT id, wikidata, display_name, level, description, works_count, cited_by_count, image_url, image_thumbnail_url, works_api_url, updated_date FROM concepts WHERE id=?"
-        concepts_ids_tuple = tuple([Concept._remove_base_url(concept_id) for concept_id in concept_ids])
-        cursor.execute(raw_sql, concepts_ids_tuple)
-        result_concepts = cursor.fetchall()
+        concept_dict["id"] = Concept._prepend_base_url(concept_id)
+        concept_dict["wikidata"] = result_concept[1]
+        concept_dict["display_name"] = result_concept[2]
+        concept_dict["level"] = result_concept[3]
+        concept_dict["description"] = result_concept[4]
+        concept_dict["works_count"] = result_concept[5]
+        concept_dict["cited_by_count"] = result_concept[6]
+        concept_dict["image_url"] = result_concept[7]
+        concept_dict["image_thumbnail_url"] = result_concept[8]
+        concept_dict["works_api_url"] = result_concept[9]
+        concept_dict["updated_date"] = result_concept[10]
 
         # CONCEPTS_ANCESTORS
-        raw_sql = "SELECT ancestor_id, concept_id FROM concepts_ancestors WHERE concept_id=?"
-        cursor.execute(raw_sql, concepts_ids_tuple)
-        result_concepts_ancestors = cursor.fetchall()
+        concept_dict["ancestors"] = []
+        for ancestor in child_rows["concepts_ancestors"].get(concept_id, []):
+            ancestor_dict = {}
+            ancestor_dict["id"] = Concept._prepend_base_url(ancestor[1])
+            concept_dict["ancestors"].append(ancestor_dict)
 
         # CONCEPTS_COUNTS_BY_YEAR
-        raw_sql = "SELECT concept_id, year, works_count, cited_by_count FROM concepts_counts_by_year WHERE concept_id=?"
-        cursor.execute(raw_sql, concepts_ids_tuple)
-        result_concepts_counts_by_year = cursor.fetchall()        
+        concept_dict["counts_by_year"] = []
+        for count in child_rows["concepts_counts_by_year"].get(concept_id, []):
+            concept_count_by_year = {
+                "year": count[1],
+                "works_count": count[2],
+                "cited_by_count": count[3]
+            }
+            concept_dict["counts_by_year"].append(concept_count_by_year)
 
         # CONCEPTS_IDS
-        raw_sql = "SELECT concept_id, openalex, wikidata, wikipedia, umls_cui, mag FROM concepts_ids WHERE concept_id=?"
-        cursor.execute(raw_sql, concepts_ids_tuple)
-        result_concepts_ids = cursor.fetchall()
+        concept_dict["ids"] = {}
+        for result_concept_ids in child_rows["concepts_ids"].get(concept_id, [])[:1]:
+            concept_dict["ids"]["openalex"] = result_concept_ids[1]
+            concept_dict["ids"]["wikidata"] = result_concept_ids[2]
+            concept_dict["ids"]["wikipedia"] = result_concept_ids[3]
+            concept_dict["ids"]["umls_cui"] = json_codec.loads(result_concept_ids[4])
+            concept_dict["ids"]["mag"] = result_concept_ids[5]
 
         # CONCEPTS_RELATED_CONCEPTS
-        raw_sql = "SELECT related_concept_id, concept_id, score FROM concepts_related_concepts WHERE concept_id=?"
-        cursor.execute(raw_sql, concepts_ids_tuple)
-        result_concepts_related_concepts = cursor.fetchall()
-
-        assert len(result_concepts) == len(result_concepts_ids)
-        concepts = []
-        for i in range(len(result_concepts)):
-            concept_dict = {}        
-            # Build the concept_dict
-            # CONCEPTS
-            concept_dict["id"] = Concept._prepend_base_url(result_concepts[i][0])
-            concept_dict["wikidata"] = result_concepts[i][1]
-            concept_dict["display_name"] = result_concepts[i][2]
-            concept_dict["level"] = result_concepts[i][3]
-            concept_dict["description"] = result_concepts[i][4]
-            concept_dict["works_count"] = result_concepts[i][5]
-            concept_dict["cited_by_count"] = result_concepts[i][6]
-            concept_dict["image_url"] = result_concepts[i][7]
-            concept_dict["image_thumbnail_url"] = result_concepts[i][8]
-            concept_dict["works_api_url"] = result_concepts[i][9]
-            concept_dict["updated_date"] = result_concepts[i][10]
-
-            # CONCEPTS_ANCESTORS
-            concept_dict["ancestors"] = []
-            for ancestor in result_concepts_ancestors:
-                if ancestor[1] == result_concepts[i][0]:
-                    ancestor_dict = {}
-                    ancestor_dict["id"] = Concept._prepend_base_url(ancestor[0])
-                    concept_dict["ancestors"].append(ancestor_dict)
-
-            # CONCEPTS_COUNTS_BY_YEAR
-            concept_dict["counts_by_year"] = []
-            for j in range(len(result_concepts_counts_by_year)):
-                concept_count_by_year = {
-                    "year": result_concepts_counts_by_year[j][1],
-                    "works_count": result_concepts_counts_by_year[j][2],
-                    "cited_by_count": result_concepts_counts_by_year[j][3]
-                }
-                concept_dict["counts_by_year"].append(concept_count_by_year)
-
-            # CONCEPTS_IDS
-            concept_dict["ids"] = {}
-            concept_dict["ids"]["openalex"] = result_concepts_ids[i][1]
-            concept_dict["ids"]["wikidata"] = result_concepts_ids[i][2]
-            concept_dict["ids"]["wikipedia"] = result_concepts_ids[i][3]
-            concept_dict["ids"]["umls_cui"] = json.loads(result_concepts_ids[i][4])
-            concept_dict["ids"]["mag"] = result_concepts_ids[i][5]
-
-            # CONCEPTS_RELATED_CONCEPTS
-            concept_dict["related_concepts"] = []
-            for related_concept in result_concepts_related_concepts:
-                related_concept_dict = {}
-                related_concept_dict["id"] = Concept._prepend_base_url(related_concept[0])
-                related_concept_dict["score"] = related_concept[2]
-                concept_dict["related_concepts"].append(related_concept_dict)
-            
-            concepts.append(Concept(concept_dict))
-        assert len(concepts) == len(concept_ids)
-
-        return concepts
+        concept_dict["related_concepts"] = []
+        for related_concept in child_rows["concepts_related_concepts"].get(concept_id, []):
+            related_concept_dict = {}
+            related_concept_dict["id"] = Concept._prepend_base_url(related_concept[1])
+            related_concept_dict["score"] = related_concept[2]
+            concept_dict["related_concepts"].append(related_concept_dict)
+
+        return Concept(concept_dict)
     
+    read_from_db_by_ids = read_concepts_from_db_by_ids
+
+    @classmethod
+    def _after_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Update the hierarchy closure of the inserted concepts and their descendants (see concept_hierarchy.py).
+        """
+        update_concept_closure(conn, entity_ids)
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the concept from the database.
         """
         concept_id = self.id
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [concept_id])
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM concepts WHERE id=?", (concept_id,))
-        cursor.execute("DELETE FROM concepts_ancestors WHERE concept_id=?", (concept_id,))
-        cursor.execute("DELETE FROM concepts_counts_by_year WHERE concept_id=?", (concept_id,))
-        cursor.execute("DELETE FROM concepts_ids WHERE concept_id=?", (concept_id,))      
-        cursor.execute("DELETE FROM concepts_related_concepts WHERE concept_id=?", (concept_id,))  
+        cursor.execute("DELETE FROM concepts WHERE id=?", (stored_id,))
+        cursor.execute("DELETE FROM concepts_ancestors WHERE concept_id=?", (stored_id,))
+        cursor.execute("DELETE FROM concepts_counts_by_year WHERE concept_id=?", (stored_id,))
+        cursor.execute("DELETE FROM concepts_ids WHERE concept_id=?", (stored_id,))      
+        cursor.execute("DELETE FROM concepts_related_concepts WHERE concept_id=?", (stored_id,))  
+        cursor.execute("DELETE FROM concepts_closure WHERE descendant_id=? OR ancestor_id=?", (stored_id, stored_id))
         conn.commit() 
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(concept: dict) -> Dict[str, List[tuple]]:
         """
-        REPLACE the concept in the database.
+        Flatten the concept into the rows of the concepts tables.
         """
-        concept = self.data
+        concept_id = Concept._remove_base_url(concept['id'])
         # CONCEPTS
-        insert_tuple = (Concept._remove_base_url(concept['id']), concept['wikidata'], concept['display_name'], concept['level'], concept['description'], concept['works_count'], concept['cited_by_count'], concept['image_url'], concept['image_thumbnail_url'], concept['works_api_url'], concept['updated_date'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO concepts (id, wikidata, display_name, level, description, works_count, cited_by_count, image_url, image_thumbnail_url, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        concepts_rows = [(concept_id, concept['wikidata'], concept['display_name'], concept['level'], concept['description'], concept['works_count'], concept['cited_by_count'], concept['image_url'], concept['image_thumbnail_url'], concept['works_api_url'], concept['updated_date'])]
 
         # CONCEPTS_ANCESTORS
-        for ancestor in concept['ancestors']:
-            insert_tuple = (Concept._remove_base_url(ancestor['id']), Concept._remove_base_url(concept['id']))
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_ancestors (ancestor_id, concept_id) VALUES ({question_marks})", insert_tuple
-            )
+        concepts_ancestors_rows = [(concept_id, Concept._remove_base_url(ancestor['id']), ancestor.get('level')) for ancestor in concept['ancestors']]
         
         # CONCEPTS_COUNTS_BY_YEAR
-        for year in concept['counts_by_year']:
-            insert_tuple = (Concept._remove_base_url(concept['id']), year['year'], year['works_count'], year['cited_by_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_counts_by_year (concept_id, year, works_count, cited_by_count) VALUES ({question_marks})", insert_tuple
-            )
+        concepts_counts_by_year_rows = [(concept_id, year['year'], year['works_count'], year['cited_by_count']) for year in concept['counts_by_year']]
 
         # CONCEPTS_IDS
-        insert_tuple = (Concept._remove_base_url(concept['id']), concept['ids']['openalex'], concept['ids']['wikidata'], concept['ids']['wikipedia'], json.dumps(concept['ids']['umls_cui']), concept['ids']['mag'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO concepts_ids (concept_id, openalex, wikidata, wikipedia, umls_cui, mag) VALUES ({question_marks})", insert_tuple
-        )
+        ids = concept['ids']
+        concepts_ids_rows = [(concept_id, ids['openalex'], ids.get('wikidata'), ids.get('wikipedia'), json_codec.dumps(ids.get('umls_cui')), ids.get('mag'))]
 
         # CONCEPTS_RELATED_CONCEPTS
-        for related_concept in concept['related_concepts']:
-            insert_tuple = (Concept._remove_base_url(related_concept['id']), Concept._remove_base_url(concept['id']), related_concept['score'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_related_concepts (related_concept_id, concept_id, score) VALUES ({question_marks})", insert_tuple
-            )
-
-        conn.commit()
\ No newline at end of file
+        concepts_related_concepts_rows = [(concept_id, Concept._remove_base_url(related_concept['id']), related_concept['score']) for related_concept in concept['related_concepts']]
+
+        return {
+            "concepts": concepts_rows,
+            "concepts_ancestors": concepts_ancestors_rows,
+            "concepts_counts_by_year": concepts_counts_by_year_rows,
+            "concepts_ids": concepts_ids_rows,
+            "concepts_related_concepts": concepts_related_concepts_rows,
+        }
@@ -0,0 +1,110 @@
+import sqlite3
+from typing import Dict, List, Optional
+
+from openalex_sqlite_cache.compact_ids import read_ids, stored_ids, uses_compact_ids
+from openalex_sqlite_cache.entity import temp_id_table
+from openalex_sqlite_cache.get_items_from_api import short_id
+
+# The longest chain of ancestor links followed when updating the closure. OpenAlex concepts have levels 0 to 5, so this only
+# stops the walk on a cycle in corrupt data.
+MAX_CONCEPT_DEPTH = 16
+
+
+def update_concept_closure(conn: sqlite3.Connection, concept_ids: List[str]):
+    """
+    Recompute the concepts_closure rows of inserted concepts, and of the cached concepts below them, from concepts_ancestors.
+    Called by Concept.bulk_insert_rows, in its transaction. The descendants are found in the closure itself and in concepts_ancestors,
+    so this only walks up from the concepts that changed: a concept inserted before its ancestors already has closure rows to their IDs.
+
+    OpenAlex lists all the ancestors of a concept, not only its parents, so the depth of a pair is the difference of the levels of the
+    two concepts (the level of an uncached ancestor is the one its descendants' payloads give). Counting the links would make the
+    grandparents of a concept depth 1 whenever its parents are not cached. The longest chain of links is only used when a level is unknown.
+    """
+    concept_ids = list(dict.fromkeys(short_id(concept_id) for concept_id in concept_ids))
+    if not concept_ids:
+        return
+    with temp_id_table(conn, concept_ids, "C" if uses_compact_ids(conn) else None) as id_table:
+        descendant_ids = [row[0] for row in conn.execute(
+            f"SELECT c.descendant_id FROM {id_table} t JOIN concepts_closure c ON c.ancestor_id = t.id"
+            f" UNION SELECT a.concept_id FROM {id_table} t JOIN concepts_ancestors a ON a.ancestor_id = t.id")]
+        conn.executemany(f"INSERT OR IGNORE INTO {id_table} (id) VALUES (?)", ((descendant_id,) for descendant_id in descendant_ids))
+        conn.execute(f"DELETE FROM concepts_closure WHERE descendant_id IN (SELECT id FROM {id_table})")
+        # UNION (not UNION ALL) keeps one row per (concept, ancestor, level, links), however many chains reach it.
+        conn.execute(
+            f"WITH RECURSIVE chain(descendant_id, ancestor_id, ancestor_level, links) AS ("
+            f" SELECT id, id, NULL, 0 FROM {id_table}"
+            f" UNION"
+            f" SELECT chain.descendant_id, a.ancestor_id, a.ancestor_level, chain.links + 1 FROM chain"
+            f" JOIN concepts_ancestors a ON a.concept_id = chain.ancestor_id WHERE chain.links < ?"
+            f"), pairs AS ("
+            f" SELECT chain.ancestor_id, chain.descendant_id, MAX(chain.links) AS links,"
+            f" MAX(d.level) - COALESCE(MAX(c.level), MAX(chain.ancestor_level)) AS level_depth"
+            f" FROM chain LEFT JOIN concepts d ON d.id = chain.descendant_id LEFT JOIN concepts c ON c.id = chain.ancestor_id"
+            f" GROUP BY chain.ancestor_id, chain.descendant_id"
+            f") INSERT INTO concepts_closure (ancestor_id, descendant_id, depth)"
+            f" SELECT ancestor_id, descendant_id, CASE WHEN ancestor_id = descendant_id THEN 0 WHEN level_depth > 0 THEN level_depth ELSE links END"
+            f" FROM pairs",
+            (MAX_CONCEPT_DEPTH,)
+        )
+
+
+def rebuild_concept_closure(conn: sqlite3.Connection):
+    """
+    Rebuild concepts_closure from all the cached concepts, e.g. for a cache created before the table existed.
+    """
+    with conn:
+        conn.execute("DELETE FROM concepts_closure")
+        update_concept_closure(conn, [row[0] for row in conn.execute("SELECT id FROM concepts")])
+
+
+def _related_concepts(conn: sqlite3.Connection, raw_sql: str, concept_id: str, max_depth: Optional[int], include_self: bool) -> Dict[str, int]:
+    params = [stored_ids(conn, [short_id(concept_id)], "C")[0], 0 if include_self else 1]
+    if max_depth is not None:
+        raw_sql += " AND depth <= ?"
+        params.append(max_depth)
+    rows = conn.execute(raw_sql + " ORDER BY depth, 1", params).fetchall()
+    return dict(zip(read_ids(conn, (row[0] for row in rows), "C"), (row[1] for row in rows)))
+
+
+def descendants(conn: sqlite3.Connection, concept_id: str, max_depth: Optional[int] = None, include_self: bool = False) -> Dict[str, int]:
+    """
+    The cached concepts below a concept, with their depth below it: {concept_id: depth}, closest first.
+    One lookup on the primary key of concepts_closure, however deep the hierarchy.
+    """
+    raw_sql = "SELECT descendant_id, depth FROM concepts_closure WHERE ancestor_id = ? AND depth >= ?"
+    return _related_concepts(conn, raw_sql, concept_id, max_depth, include_self)
+
+
+def ancestors(conn: sqlite3.Connection, concept_id: str, max_depth: Optional[int] = None, include_self: bool = False) -> Dict[str, int]:
+    """
+    The ancestors of a cached concept, with their depth above it: {concept_id: depth}, closest first.
+    """
+    raw_sql = "SELECT ancestor_id, depth FROM concepts_closure WHERE descendant_id = ? AND depth >= ?"
+    return _related_concepts(conn, raw_sql, concept_id, max_depth, include_self)
+
+
+def works_with_descendants(conn: sqlite3.Connection, concept_id: str, include_self: bool = True, max_depth: Optional[int] = None,
+                           min_score: Optional[float] = None) -> List[str]:
+    """
+    The cached works tagged with a concept or any of its descendants (short IDs, sorted), with a single join of concepts_closure
+    and works_concepts. The join looks up works_concepts by concept_id: create the secondary indexes (see indexes.py) on a large cache.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        concept_id (str): The concept.
+        include_self (bool): Include the works tagged with the concept itself.
+        max_depth (int): Only follow descendants up to this depth below the concept.
+        min_score (float): Only count the tags with at least this score.
+    """
+    raw_sql = (
+        "SELECT DISTINCT wc.work_id FROM concepts_closure c JOIN works_concepts wc ON wc.concept_id = c.descendant_id "
+        "WHERE c.ancestor_id = ? AND c.depth >= ?"
+    )
+    params = [stored_ids(conn, [short_id(concept_id)], "C")[0], 0 if include_self else 1]
+    if max_depth is not None:
+        raw_sql += " AND c.depth <= ?"
+        params.append(max_depth)
+    if min_score is not None:
+        raw_sql += " AND wc.score >= ?"
+        params.append(min_score)
+    return read_ids(conn, (row[0] for row in conn.execute(raw_sql + " ORDER BY wc.work_id", params)), "W")
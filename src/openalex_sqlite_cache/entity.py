@@ -1,9 +1,23 @@
-import json
-from typing import Union
+import sqlite3
+import itertools
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Union, List, Optional, Dict, Tuple, Iterable, Iterator, Sized
 from abc import abstractmethod
 
 from pyalex.api import OpenAlexEntity
 
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.compact_ids import ENTITY_PREFIXES, decode_ids, decode_rows, encode_id, encode_ids, encode_rows, uses_compact_ids
+from openalex_sqlite_cache.get_items_from_api import chunk_ids, get_entity_batch, iter_entity_batches, short_id, Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+from openalex_sqlite_cache.identifiers import normalize_external_id
+from openalex_sqlite_cache.memory_tier import MemoryTier, get_memory_tier, invalidate
+from openalex_sqlite_cache.records import make_record_class
+# A module import, as raw_payloads imports this module (for MAX_SQL_VARIABLES).
+from openalex_sqlite_cache import raw_payloads as payload_store
+
 REPLACEMENTS = {
     "'": "\"", 
     "True": ''' "True" ''',
@@ -12,9 +26,69 @@ REPLACEMENTS = {
 
 BASE_URL = "https://openalex.org/"
 
+# Stay below SQLite's default SQLITE_MAX_VARIABLE_NUMBER (999 before SQLite 3.32) in "IN (?, ?, ...)" queries.
+MAX_SQL_VARIABLES = 900
+
+# Above this many IDs, reads and membership checks insert the IDs into a TEMP table once and join every table against it,
+# instead of sending one IN (...) query per table for every MAX_SQL_VARIABLES IDs.
+TEMP_TABLE_THRESHOLD = 10 * MAX_SQL_VARIABLES
+
+_temp_table_numbers = itertools.count()
+
+@lru_cache(maxsize=None)
+def _replace_sql(table: str, columns: Tuple[str, ...]) -> str:
+    """
+    Build the REPLACE statement for a table once, so every executemany reuses the same (cached, prepared) SQL string.
+    """
+    question_marks = ', '.join(['?'] * len(columns))
+    return f"REPLACE INTO {table} ({', '.join(columns)}) VALUES ({question_marks})"
+
+def utc_now() -> str:
+    """
+    The current UTC time in the ISO format used by the API's updated_date (without the time zone).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+@contextmanager
+def temp_id_table(conn: sqlite3.Connection, ids: Iterable[str], prefix: Optional[str] = None) -> Iterator[str]:
+    """
+    Insert the (short, unique) IDs into a new TEMP table, in order, and yield its name; the table is dropped afterwards.
+    The table has the columns position (INTEGER PRIMARY KEY, the order of the IDs) and id (UNIQUE), so joins on id are index lookups.
+    With the prefix of the IDs, they are stored as INTEGERs instead, to be joined with the ID columns of a compact cache (see compact_ids.py).
+    """
+    table_name = f"temp_ids_{next(_temp_table_numbers)}"
+    conn.execute(f"CREATE TEMP TABLE {table_name} (position INTEGER PRIMARY KEY, id {'TEXT' if prefix is None else 'INTEGER'} NOT NULL UNIQUE)")
+    try:
+        in_transaction = conn.in_transaction
+        id_rows = ((short_id(i),) for i in ids) if prefix is None else ((encode_id(short_id(i), prefix),) for i in ids)
+        conn.executemany(f"INSERT OR IGNORE INTO {table_name} (id) VALUES (?)", id_rows)
+        if not in_transaction:
+            # Only the TEMP table was written; do not keep a transaction open on the connection.
+            conn.commit()
+        yield table_name
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS temp.{table_name}")
+
 class Entity:
     """Base class for OpenAlex entities."""
 
+    # The tables of the entity type and their columns, parent table first.
+    # The first column of every table holds the ID of the entity that the row belongs to.
+    TABLES: Dict[str, Tuple[str, ...]] = {}
+
+    # The order of the child rows of an entity when reading, per table, as an ORDER BY expression. Defaults to insertion order.
+    ORDER_BY: Dict[str, str] = {}
+
+    # The columns holding external IDs (DOI, ORCID, ...) to index in external_ids, as kind: [(table, column)].
+    EXTERNAL_IDS: Dict[str, List[Tuple[str, str]]] = {}
+
+    # The fields of the entity dict that are built from a child table, and their table.
+    # Lazy reads only load them on first access (see LazyEntity), and reads with fields= only query the tables of the requested ones.
+    CHILD_FIELDS: Dict[str, str] = {}
+
+    # The parent table columns of the fields that are not stored in a column of the same name, e.g. {"host_organization": ("publisher",)}.
+    FIELD_COLUMNS: Dict[str, Tuple[str, ...]] = {}
+
     def __init__(self, data: Union[OpenAlexEntity, dict]):
         self.id = Entity._remove_base_url(data["id"])
         self.data = data
@@ -24,14 +98,13 @@ class Entity:
             self.origin = "db"
 
     def __repr__(self):
-        return f"<{self.__class__.__name__} id={self.id}> data={json.dumps(self.data)}>"
+        return f"<{self.__class__.__name__} id={self.id}> data={json_codec.dumps(self.data)}>"
     
-    @abstractmethod
-    def insert_or_replace_in_db(self, conn):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
         """
-        Insert or replace the entity in the database.
+        REPLACE the entity in the database.
         """
-        pass
+        type(self).bulk_insert(conn, [self])
 
     @abstractmethod
     def delete(self, conn):
@@ -40,6 +113,631 @@ class Entity:
         """
         pass    
 
+    @staticmethod
+    @abstractmethod
+    def flatten(data: dict) -> Dict[str, List[tuple]]:
+        """
+        Flatten an API-shaped entity dict into the rows to insert, keyed by table name (in the column order of TABLES).
+        """
+        pass
+
+    @classmethod
+    def bulk_insert(cls, conn: sqlite3.Connection, entities: Iterable[Union["Entity", dict]], refreshed_date: Optional[str] = None):
+        """
+        REPLACE many entities in the database at once.
+        The entities are flattened into one row list per table, and each table is written with a single executemany, all inside one transaction.
+        If raw payloads are enabled for the entity type (see raw_payloads.enable_raw_payloads), the full payloads are stored too, compressed,
+        in place of the PAYLOAD_COLUMNS of the parent table.
+        """
+        parent_table = next(iter(cls.TABLES))
+        payload_codec = payload_store.get_payload_codec(conn, parent_table)
+        rows = {table: [] for table in cls.TABLES}
+        payloads = []
+        for entity in entities:
+            data = entity.data if isinstance(entity, Entity) else entity
+            for table, table_rows in cls.flatten(data).items():
+                rows[table].extend(table_rows)
+            if payload_codec is not None:
+                payloads.append(data)
+        raw_payloads = payload_store.raw_payload_rows(parent_table, payloads, payload_codec) if payload_codec is not None else None
+        cls.bulk_insert_rows(conn, rows, refreshed_date=refreshed_date, raw_payloads=raw_payloads)
+
+    @classmethod
+    def bulk_insert_rows(cls, conn: sqlite3.Connection, rows: Dict[str, List[tuple]], refreshed_date: Optional[str] = None, raw_payloads: Optional[List[tuple]] = None):
+        """
+        REPLACE already flattened rows (see flatten) in the database, in a single transaction.
+        The previous child rows of the entities are deleted first, so that re-inserting an entity does not duplicate them.
+        The entities are logged in refresh_log as refreshed at refreshed_date (default: now), and forgotten by the memory tier of the connection.
+        raw_payloads are optional rows of the raw_payloads table (see raw_payloads.raw_payload_rows). With them, the PAYLOAD_COLUMNS of the
+        parent rows (see raw_payloads.py) are stored NULL, and read from the payloads.
+        In a compact cache, the IDs are stored as INTEGERs and the child rows numbered (see compact_ids.py).
+        """
+        parent_table = next(iter(cls.TABLES))
+        entity_ids = [(row[0],) for row in rows.get(parent_table, [])]
+        if not entity_ids:
+            return
+        if refreshed_date is None:
+            refreshed_date = utc_now()
+        if raw_payloads:
+            rows = dict(rows)
+            rows[parent_table] = cls._without_payload_columns(rows[parent_table])
+        stored_rows, stored_ids, table_columns = rows, entity_ids, cls.TABLES
+        if uses_compact_ids(conn):
+            stored_rows = {table: encode_rows(parent_table, table, columns, rows.get(table) or [], positions=table != parent_table)
+                           for table, columns in cls.TABLES.items()}
+            stored_ids = [(row[0],) for row in stored_rows[parent_table]]
+            table_columns = {table: columns if table == parent_table else columns + ("position",) for table, columns in cls.TABLES.items()}
+        with conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            cls._before_insert(conn, [entity_id for (entity_id,) in entity_ids])
+            for table, columns in cls.TABLES.items():
+                if table != parent_table:
+                    conn.executemany(f"DELETE FROM {table} WHERE {columns[0]}=?", stored_ids)
+            for table, columns in table_columns.items():
+                if stored_rows.get(table):
+                    conn.executemany(_replace_sql(table, columns), stored_rows[table])
+            conn.executemany(
+                "REPLACE INTO refresh_log (entity_type, id, refreshed_date) VALUES (?, ?, ?)",
+                [(parent_table, entity_id, refreshed_date) for (entity_id,) in stored_ids]
+            )
+            if cls.EXTERNAL_IDS:
+                conn.executemany("DELETE FROM external_ids WHERE openalex_id=?", entity_ids)
+                conn.executemany("REPLACE INTO external_ids (kind, value, openalex_id) VALUES (?, ?, ?)", cls._external_id_rows(rows))
+            if raw_payloads:
+                conn.executemany("REPLACE INTO raw_payloads (entity_type, id, codec, dictionary_id, payload) VALUES (?, ?, ?, ?, ?)", raw_payloads)
+            cls._after_insert(conn, [entity_id for (entity_id,) in entity_ids])
+        invalidate(conn, parent_table, [entity_id for (entity_id,) in entity_ids])
+
+    @classmethod
+    def _payload_column_indexes(cls, fields: Optional[Tuple[str, ...]] = None) -> List[int]:
+        """
+        The indexes of the PAYLOAD_COLUMNS (see raw_payloads.py) in the parent rows, only those a read of the fields selects.
+        """
+        parent_table, parent_columns = next(iter(cls.TABLES.items()))
+        selected_columns = cls._parent_select(fields)
+        return [parent_columns.index(column) for column in payload_store.PAYLOAD_COLUMNS.get(parent_table, ()) if column in selected_columns]
+
+    @classmethod
+    def _without_payload_columns(cls, parent_rows: List[tuple]) -> List[tuple]:
+        """
+        The parent rows with NULL in their PAYLOAD_COLUMNS, for the entities stored with their raw payloads.
+        """
+        indexes = cls._payload_column_indexes()
+        if not indexes:
+            return parent_rows
+        return [tuple(None if index in indexes else value for index, value in enumerate(row)) for row in parent_rows]
+
+    @classmethod
+    def _with_payload_columns(cls, conn: sqlite3.Connection, parent_rows: List[tuple], indexes: List[int]) -> List[tuple]:
+        """
+        The parent rows (as read, see _decoded_rows) with the NULL PAYLOAD_COLUMNS at indexes filled from the raw payloads of the entities.
+        The payloads are only looked up for the rows with a NULL value, in one query.
+        """
+        missing_ids = [row[0] for row in parent_rows if any(row[index] is None for index in indexes)]
+        if not missing_ids:
+            return parent_rows
+        parent_table, parent_columns = next(iter(cls.TABLES.items()))
+        values = payload_store.payload_column_values(conn, parent_table, missing_ids)
+        filled_rows = []
+        for row in parent_rows:
+            if row[0] in values:
+                row = tuple(values[row[0]][parent_columns[index]] if index in indexes and value is None else value for index, value in enumerate(row))
+            filled_rows.append(row)
+        return filled_rows
+
+    @classmethod
+    def _before_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Update the tables derived from the current rows of the entities before they are replaced, in the transaction of bulk_insert_rows.
+        Nothing to do by default.
+        """
+        pass
+
+    @classmethod
+    def _after_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Update the tables derived from the rows of the entities, in the transaction of bulk_insert_rows. Nothing to do by default.
+        """
+        pass
+
+    @classmethod
+    def _delete_derived(cls, conn: sqlite3.Connection, ids: List[str]):
+        """
+        Delete the rows that bulk_insert_rows and get_or_fetch add outside the entity tables (refresh_log, external_ids, raw_payloads,
+        merged_ids) for deleted entities, and forget them from the memory tier of the connection. Called by delete.
+        """
+        parent_table = next(iter(cls.TABLES))
+        invalidate(conn, parent_table, ids)
+        conn.executemany("DELETE FROM refresh_log WHERE entity_type = ? AND id = ?", [(parent_table, i) for i in cls._stored_ids(conn, ids)])
+        if cls.EXTERNAL_IDS:
+            conn.executemany("DELETE FROM external_ids WHERE openalex_id = ?", [(i,) for i in ids])
+        conn.executemany("DELETE FROM raw_payloads WHERE entity_type = ? AND id = ?", [(parent_table, i) for i in ids])
+        conn.executemany("DELETE FROM merged_ids WHERE merged_into = ?", [(i,) for i in ids])
+
+    @classmethod
+    def _id_prefix(cls, conn: sqlite3.Connection) -> Optional[str]:
+        """
+        The prefix of the entity IDs in a compact cache (see compact_ids.py), or None in a regular cache.
+        """
+        return ENTITY_PREFIXES[next(iter(cls.TABLES))] if uses_compact_ids(conn) else None
+
+    @classmethod
+    def _stored_ids(cls, conn: sqlite3.Connection, ids: List[str]) -> list:
+        """
+        The (short) IDs as stored in the entity tables: INTEGERs in a compact cache.
+        """
+        prefix = cls._id_prefix(conn)
+        return ids if prefix is None else encode_ids(ids, prefix)
+
+    def _stored_id(self, conn: sqlite3.Connection):
+        """
+        The ID of the entity as stored in the entity tables (see _stored_ids).
+        """
+        return type(self)._stored_ids(conn, [self.id])[0]
+
+    @classmethod
+    def _decoded_rows(cls, conn: sqlite3.Connection, table: str, rows: Iterable[tuple], columns: Optional[Tuple[str, ...]] = None) -> Iterable[tuple]:
+        """
+        The rows read from a table of the entity type (with the columns of TABLES, e.g. a cursor), with their IDs converted back in a
+        compact cache.
+        """
+        if not uses_compact_ids(conn):
+            return rows
+        return decode_rows(next(iter(cls.TABLES)), table, columns or cls.TABLES[table], rows)
+
+    @classmethod
+    def _order_by(cls, conn: sqlite3.Connection, table: str) -> str:
+        """
+        The ORDER BY expression of the rows of a child table: ORDER_BY, or the insertion order (the position column in a compact cache).
+        """
+        return cls.ORDER_BY.get(table, "position" if uses_compact_ids(conn) else "rowid")
+
+    @classmethod
+    def _external_id_rows(cls, rows: Dict[str, List[tuple]]) -> List[tuple]:
+        """
+        Collect the normalized (kind, value, openalex_id) rows of external_ids from flattened rows. Malformed external IDs are skipped.
+        """
+        external_id_rows = []
+        for kind, columns in cls.EXTERNAL_IDS.items():
+            for table, column in columns:
+                column_index = cls.TABLES[table].index(column)
+                for row in rows.get(table, []):
+                    values = row[column_index]
+                    if isinstance(values, str) and values.startswith("["):
+                        values = json_codec.loads(values)
+                    if not isinstance(values, list):
+                        values = [values]
+                    for value in values:
+                        try:
+                            value = normalize_external_id(kind, value)
+                        except ValueError:
+                            continue
+                        if value is not None:
+                            external_id_rows.append((kind, value, row[0]))
+        return external_id_rows
+
+    @staticmethod
+    @abstractmethod
+    def read_from_db_by_ids(conn: sqlite3.Connection, ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> list:
+        """
+        Query the database for the entities. Each entity type aliases this to its read_*_from_db_by_ids.
+        """
+        pass
+
+    @staticmethod
+    def _iter_id_chunks(ids: Union[Iterable[str], str], chunk_size: int) -> Iterator[List[str]]:
+        """
+        Split IDs (a list or any iterable, in any form) into chunks of at most chunk_size short IDs, consuming them lazily.
+        The IDs are unique within a chunk only, so that memory stays bounded by the chunk size however many IDs are read:
+        an ID repeated in another chunk is read again.
+        """
+        if isinstance(ids, str):
+            ids = [ids]
+        chunk = {}
+        for entity_id in ids:
+            chunk[short_id(entity_id)] = None
+            if len(chunk) >= chunk_size:
+                yield list(chunk)
+                chunk = {}
+        if chunk:
+            yield list(chunk)
+
+    @classmethod
+    def _parent_fields(cls) -> Dict[str, Tuple[str, ...]]:
+        """
+        The fields of the entity dict built from the parent table, and their columns.
+        """
+        parent_table, parent_columns = next(iter(cls.TABLES.items()))
+        renamed_columns = {column for columns in cls.FIELD_COLUMNS.values() for column in columns}
+        parent_fields = {column: (column,) for column in parent_columns if column not in renamed_columns}
+        parent_fields.update(cls.FIELD_COLUMNS)
+        return parent_fields
+
+    @classmethod
+    def _check_fields(cls, fields: Optional[Union[List[str], str]]) -> Optional[Tuple[str, ...]]:
+        """
+        Validate the fields of a projected read (see _iter_from_db_by_ids). "id" is always included.
+        """
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = [fields]
+        parent_fields = cls._parent_fields()
+        unknown_fields = [field for field in fields if field not in parent_fields and field not in cls.CHILD_FIELDS]
+        if unknown_fields:
+            raise ValueError(f"Unknown {cls.__name__} fields: {unknown_fields}. Choose from {list(parent_fields) + list(cls.CHILD_FIELDS)}")
+        return tuple(dict.fromkeys(["id"] + list(fields)))
+
+    @classmethod
+    def _parent_select(cls, fields: Optional[Tuple[str, ...]]) -> List[str]:
+        """
+        The columns of the parent table to select, with NULL in place of the columns that no field needs, so that every
+        _from_rows can keep reading the row by position.
+        """
+        parent_columns = next(iter(cls.TABLES.values()))
+        if fields is None:
+            return list(parent_columns)
+        parent_fields = cls._parent_fields()
+        needed_columns = {column for field in fields if field in parent_fields for column in parent_fields[field]}
+        return [column if column in needed_columns else "NULL" for column in parent_columns]
+
+    @classmethod
+    def _child_tables(cls, fields: Optional[Tuple[str, ...]]) -> List[str]:
+        """
+        The child tables to query: all of them, or only those of the child fields.
+        """
+        parent_table = next(iter(cls.TABLES))
+        if fields is None:
+            return [table for table in cls.TABLES if table != parent_table]
+        needed_tables = {cls.CHILD_FIELDS[field] for field in fields if field in cls.CHILD_FIELDS}
+        return [table for table in cls.TABLES if table in needed_tables]
+
+    @staticmethod
+    def _project(entity: "Entity", fields: Optional[Tuple[str, ...]]) -> "Entity":
+        """
+        Keep only the fields of a projected read in the entity dict.
+        """
+        if fields is not None:
+            entity.data = {key: value for key, value in entity.data.items() if key in fields}
+        return entity
+
+    @classmethod
+    def _iter_rows(cls, conn: sqlite3.Connection, ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES,
+                   fields: Optional[Tuple[str, ...]] = None) -> Iterator[Tuple[List[tuple], Dict[str, Dict[str, List[tuple]]]]]:
+        """
+        Read the rows of the entities from every table, chunk_size IDs at a time, with one "IN (...)" query per table and chunk.
+        Yields, for each chunk, the parent rows in the order of the IDs (leaving out unknown IDs) and the child rows of each table
+        grouped by entity ID in a single pass, in the order of ORDER_BY: {table: {entity_id: [row, ...]}}.
+        With fields, only the columns and child tables of the fields are read.
+        """
+        for parent_rows in cls._iter_parent_rows(conn, ids, chunk_size, fields):
+            yield parent_rows, cls._read_child_rows(conn, [row[0] for row in parent_rows], fields)
+
+    @classmethod
+    def _iter_parent_rows(cls, conn: sqlite3.Connection, ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES,
+                          fields: Optional[Tuple[str, ...]] = None) -> Iterator[List[tuple]]:
+        """
+        Read the rows of the parent table, chunk_size IDs at a time, yielding each chunk's rows in the order of the IDs (leaving out unknown IDs).
+        """
+        chunk_size = min(chunk_size, MAX_SQL_VARIABLES)
+        parent_table = next(iter(cls.TABLES))
+        parent_select = ', '.join(cls._parent_select(fields))
+        payload_column_indexes = cls._payload_column_indexes(fields)
+        for chunk in cls._iter_id_chunks(ids, chunk_size):
+            raw_sql = "SELECT {} FROM {} WHERE id IN ({})".format(parent_select, parent_table, ','.join('?' * len(chunk)))
+            # The rows are consumed from the cursor, to be put back in the order of the chunk.
+            parent_rows_by_id = {row[0]: row for row in cls._decoded_rows(conn, parent_table, conn.execute(raw_sql, cls._stored_ids(conn, chunk)))}
+            parent_rows = [parent_rows_by_id[i] for i in chunk if i in parent_rows_by_id]
+            yield cls._with_payload_columns(conn, parent_rows, payload_column_indexes) if payload_column_indexes else parent_rows
+
+    @classmethod
+    def _read_child_rows(cls, conn: sqlite3.Connection, ids: List[str], fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Dict[str, List[tuple]]]:
+        """
+        Read the child rows of at most MAX_SQL_VARIABLES entities, with one "IN (...)" query per child table (only the tables of the
+        fields, with fields), grouped by entity ID in a single pass, in the order of ORDER_BY: {table: {entity_id: [row, ...]}}.
+        Every child table has an entry, empty for the tables that were not read.
+        """
+        parent_table = next(iter(cls.TABLES))
+        child_rows = {table: {} for table in cls.TABLES if table != parent_table}
+        if not ids:
+            return child_rows
+        question_marks = ','.join('?' * len(ids))
+        stored_ids = cls._stored_ids(conn, ids)
+        for table in cls._child_tables(fields):
+            rows_by_id = child_rows[table]
+            columns = cls.TABLES[table]
+            raw_sql = "SELECT {} FROM {} WHERE {} IN ({}) ORDER BY {}".format(', '.join(columns), table, columns[0], question_marks, cls._order_by(conn, table))
+            for row in cls._decoded_rows(conn, table, conn.execute(raw_sql, stored_ids)):
+                rows_by_id.setdefault(row[0], []).append(row)
+        return child_rows
+
+    @staticmethod
+    @abstractmethod
+    def _from_rows(result: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Entity":
+        """
+        Build one entity from its parent row and the child rows of its chunk, grouped by entity ID (see _iter_rows).
+        """
+        pass
+
+    @classmethod
+    def _iter_joined_rows(cls, conn: sqlite3.Connection, id_table: str, fields: Optional[Tuple[str, ...]] = None) -> Iterator[Tuple[tuple, Dict[str, Dict[str, List[tuple]]]]]:
+        """
+        Read the rows of the entities whose IDs are in a TEMP table (see temp_id_table), with one join per table, all ordered by
+        the position of the IDs. The cursors are merged as they are consumed, yielding each parent row with its child rows
+        grouped like _iter_rows does.
+        """
+        parent_table = next(iter(cls.TABLES))
+        raw_sql = "SELECT t.position, {} FROM {} t JOIN {} p ON p.id = t.id ORDER BY t.position".format(
+            ', '.join('p.' + column if column != "NULL" else column for column in cls._parent_select(fields)), id_table, parent_table)
+        unread_tables = [table for table in cls.TABLES if table != parent_table and table not in cls._child_tables(fields)]
+        child_cursors = {}
+        for table in cls._child_tables(fields):
+            columns = cls.TABLES[table]
+            order_by = ', '.join('c.' + column.strip() for column in cls._order_by(conn, table).split(','))
+            child_sql = "SELECT t.position, {} FROM {} t JOIN {} c ON c.{} = t.id ORDER BY t.position, {}".format(
+                ', '.join('c.' + column for column in columns), id_table, table, columns[0], order_by)
+            cursor = conn.execute(child_sql)
+            child_cursors[table] = [cursor, next(cursor, None)]
+
+        compact = uses_compact_ids(conn)
+        payload_column_indexes = cls._payload_column_indexes(fields)
+        parent_cursor = conn.execute(raw_sql)
+        try:
+            for parent_row in parent_cursor:
+                position, result = parent_row[0], parent_row[1:]
+                if compact:
+                    result = next(iter(cls._decoded_rows(conn, parent_table, [result])))
+                if payload_column_indexes:
+                    result = cls._with_payload_columns(conn, [result], payload_column_indexes)[0]
+                child_rows = {table: {} for table in unread_tables}
+                for table, state in child_cursors.items():
+                    cursor, row = state
+                    rows = []
+                    # Skip orphan child rows, then take the rows of this entity.
+                    while row is not None and row[0] < position:
+                        row = next(cursor, None)
+                    while row is not None and row[0] == position:
+                        rows.append(row[1:])
+                        row = next(cursor, None)
+                    state[1] = row
+                    if compact:
+                        rows = list(cls._decoded_rows(conn, table, rows))
+                    child_rows[table] = {result[0]: rows} if rows else {}
+                yield result, child_rows
+        finally:
+            # Finish the statements, so that the TEMP table can be dropped.
+            parent_cursor.close()
+            for cursor, _ in child_cursors.values():
+                cursor.close()
+
+    @classmethod
+    def _iter_from_db_by_ids(cls, conn: sqlite3.Connection, ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False,
+                             fields: Optional[Union[List[str], str]] = None, compact: bool = False) -> Iterator["Entity"]:
+        """
+        Yield the entities from the database in the order of the IDs (unknown IDs are left out), as they are assembled.
+        More than TEMP_TABLE_THRESHOLD IDs are read with a TEMP table join per table, fewer (or an iterator) chunk by chunk with IN (...)
+        queries. A repeated ID is yielded once, or once per chunk it appears in when reading chunk by chunk (see _iter_id_chunks).
+        With lazy=True, only the parent table is read and the entities are LazyEntity proxies (see LazyEntity).
+        With fields (top-level fields of the entity dict, e.g. ["display_name", "counts_by_year"]), the entity dicts only have
+        those fields (and "id"): the other columns of the parent table are not read, and neither are the child tables of the other fields.
+        With compact=True, the entities are compact records of their rows instead (see records.EntityRecord).
+        Full reads (without lazy, fields or compact) go through the memory tier of the connection, if it has one (see memory_tier.py).
+        """
+        if lazy and compact:
+            raise ValueError("A read cannot be both lazy and compact")
+        fields = cls._check_fields(fields)
+        if isinstance(ids, str):
+            ids = [ids]
+        tier = get_memory_tier(conn)
+        if tier is not None and not lazy and fields is None and not compact and tier.caches(next(iter(cls.TABLES))):
+            yield from cls._iter_through_memory_tier(conn, tier, ids, chunk_size)
+            return
+        build = cls._to_record if compact else lambda result, child_rows: cls._project(cls._from_rows(result, child_rows), fields)
+        if lazy:
+            lazy_class = cls._lazy_class()
+            for parent_rows in cls._iter_parent_rows(conn, ids, chunk_size, fields):
+                yield from _LazyBatch(conn, lazy_class, parent_rows, fields).entities
+            return
+        if isinstance(ids, Sized) and len(ids) > TEMP_TABLE_THRESHOLD:
+            with temp_id_table(conn, ids, cls._id_prefix(conn)) as id_table, closing(cls._iter_joined_rows(conn, id_table, fields)) as joined_rows:
+                for result, child_rows in joined_rows:
+                    yield build(result, child_rows)
+            return
+        for parent_rows, child_rows in cls._iter_rows(conn, ids, chunk_size, fields):
+            for result in parent_rows:
+                yield build(result, child_rows)
+
+    @classmethod
+    def _iter_through_memory_tier(cls, conn: sqlite3.Connection, tier: MemoryTier, ids: Iterable[str], chunk_size: int) -> Iterator["Entity"]:
+        """
+        Yield the entities in the order of the IDs, chunk_size IDs at a time, taking them from the memory tier and reading the
+        missing ones from the database (which caches them in the tier).
+        """
+        parent_table = next(iter(cls.TABLES))
+        for chunk in cls._iter_id_chunks(ids, min(chunk_size, MAX_SQL_VARIABLES)):
+            entities_by_id = {}
+            missing_ids = []
+            for entity_id in chunk:
+                entity = tier.get(parent_table, entity_id)
+                if entity is None:
+                    missing_ids.append(entity_id)
+                else:
+                    entities_by_id[entity_id] = entity
+            if missing_ids:
+                for parent_rows, child_rows in cls._iter_rows(conn, missing_ids, len(missing_ids)):
+                    for result in parent_rows:
+                        entity = cls._from_rows(result, child_rows)
+                        tier.put(parent_table, entity.id, entity)
+                        entities_by_id[entity.id] = entity
+            for entity_id in chunk:
+                if entity_id in entities_by_id:
+                    yield entities_by_id[entity_id]
+
+    @classmethod
+    def record_class(cls) -> type:
+        """
+        The compact record class of the entity type (e.g. WorkRecord, see records.EntityRecord), created once.
+        """
+        if "_record_class" not in cls.__dict__:
+            cls._record_class = make_record_class(cls)
+        return cls._record_class
+
+    @classmethod
+    def _to_record(cls, result: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]):
+        """
+        Build the compact record of an entity from its rows.
+        """
+        entity_id = result[0]
+        return cls.record_class()(*result, *(tuple(child_rows[table].get(entity_id, ())) for table in cls.CHILD_FIELDS.values()))
+
+    @classmethod
+    def _lazy_class(cls) -> type:
+        """
+        The LazyEntity subclass of the entity class (e.g. LazyWork, a subclass of Work), created once.
+        """
+        if "_lazy_subclass" not in cls.__dict__:
+            cls._lazy_subclass = type(f"Lazy{cls.__name__}", (LazyEntity, cls), {"__doc__": f"Lazy {cls.__name__} read from the database (see LazyEntity)."})
+        return cls._lazy_subclass
+
+    @classmethod
+    def read_raw_from_db_by_ids(cls, conn: sqlite3.Connection, ids: Union[List[str], str]) -> list:
+        """
+        Read the entities from their stored full API payloads (see raw_payloads), in the order of the IDs, without reading the entity tables.
+        Entities without a stored payload are left out.
+        """
+        return [cls(payload) for payload in payload_store.iter_raw_payloads(conn, ids)]
+
+    @classmethod
+    def _existing_ids(cls, conn: sqlite3.Connection, ids: List[str]) -> set:
+        """
+        Return which of the (short) IDs are already in the entity's parent table.
+        """
+        parent_table = next(iter(cls.TABLES))
+        existing_ids = set()
+        prefix = cls._id_prefix(conn)
+        if len(ids) > TEMP_TABLE_THRESHOLD:
+            with temp_id_table(conn, ids, prefix) as id_table:
+                raw_sql = "SELECT t.id FROM {} t JOIN {} p ON p.id = t.id".format(id_table, parent_table)
+                existing_ids.update(row[0] for row in conn.execute(raw_sql))
+        else:
+            for i in range(0, len(ids), MAX_SQL_VARIABLES):
+                chunk = ids[i:i + MAX_SQL_VARIABLES]
+                raw_sql = "SELECT id FROM {} WHERE id IN ({})".format(parent_table, ','.join('?' * len(chunk)))
+                existing_ids.update(row[0] for row in conn.execute(raw_sql, cls._stored_ids(conn, chunk)))
+        return existing_ids if prefix is None else set(decode_ids(existing_ids, prefix))
+
+    @classmethod
+    def get_or_fetch(cls, conn: sqlite3.Connection, ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None,
+                     fields: Optional[List[str]] = None) -> list:
+        """
+        Return the entities from the database, fetching only the ones missing from the database from the web API (in batches) and inserting them first.
+        The entities are returned in the order of the requested IDs. IDs that the web API does not know are left out, and a merged ID is
+        answered with the entity it was merged into (under its new ID, see _merged_ids). The merged IDs of the inserted entities are
+        stored in merged_ids, so that they are answered from the database too.
+        With fields, the cached entities are read with fields= (see _iter_from_db_by_ids), and the missing ones are fetched with
+        the API's select= and returned without being inserted, since the database only holds complete entities.
+        """
+        select = cls._check_fields(fields)
+        if not isinstance(ids, list):
+            ids = [ids]
+        requested_ids = [short_id(i) for i in ids]
+        unique_ids = list(dict.fromkeys(requested_ids))
+        # The requested IDs that the web API returned under another ID, as requested ID: returned ID.
+        merged_ids = cls._stored_merged_ids(conn, unique_ids)
+        existing_ids = cls._existing_ids(conn, list(dict.fromkeys(merged_ids.get(i, i) for i in unique_ids)))
+
+        entities_by_id = {}
+        missing_ids = [i for i in unique_ids if merged_ids.get(i, i) not in existing_ids]
+        if missing_ids:
+            select = list(select) if select is not None else None
+            if engine is not None:
+                entity_batches = engine.iter_batches(missing_ids, select=select)
+            else:
+                entity_batches = iter_entity_batches(missing_ids, transport=transport, select=select)
+            # The batches are fetched MAX_IDS_PER_REQUEST IDs at a time, in order, like chunk_ids splits them.
+            for batch_ids, entity_batch in zip(chunk_ids(missing_ids), entity_batches):
+                batch_merged_ids = cls._merged_ids(batch_ids, entity_batch, transport, engine, select)
+                merged_ids.update(batch_merged_ids)
+                if select is not None:
+                    entities_by_id.update((entity.id, entity) for entity in (cls(e) for e in entity_batch))
+                    continue
+                cls.bulk_insert(conn, entity_batch)
+                existing_ids.update(Entity._remove_base_url(e["id"]) for e in entity_batch)
+                if batch_merged_ids:
+                    with conn:
+                        conn.executemany("REPLACE INTO merged_ids (id, merged_into) VALUES (?, ?)", batch_merged_ids.items())
+
+        found_ids = list(dict.fromkeys(merged_ids.get(i, i) for i in unique_ids if merged_ids.get(i, i) in existing_ids))
+        if found_ids:
+            entities_by_id.update((entity.id, entity) for entity in cls.read_from_db_by_ids(conn, found_ids, fields=fields))
+        return [entities_by_id[merged_ids.get(i, i)] for i in requested_ids if merged_ids.get(i, i) in entities_by_id]
+
+    @staticmethod
+    def _stored_merged_ids(conn: sqlite3.Connection, ids: List[str]) -> Dict[str, str]:
+        """
+        The (short) IDs that were stored as merged into another entity by get_or_fetch, as ID: merged into ID.
+        """
+        merged_ids = {}
+        for chunk in chunk_ids(ids, MAX_SQL_VARIABLES):
+            raw_sql = "SELECT id, merged_into FROM merged_ids WHERE id IN ({})".format(','.join('?' * len(chunk)))
+            merged_ids.update(conn.execute(raw_sql, chunk))
+        return merged_ids
+
+    @staticmethod
+    def _merged_ids(batch_ids: List[str], entity_batch: list, transport: Optional[Transport], engine: Optional[FetchEngine],
+                    select: Optional[List[str]]) -> Dict[str, str]:
+        """
+        Map the requested IDs of a batch that the web API returned under another ID (merged entities) to that ID. A single unanswered ID
+        is paired with the single unrequested entity of the batch; when there are more, each unanswered ID is requested on its own.
+        """
+        returned_ids = [short_id(e["id"]) for e in entity_batch]
+        requested = set(batch_ids)
+        extra_ids = [i for i in returned_ids if i not in requested]
+        if not extra_ids:
+            return {}
+        returned = set(returned_ids)
+        unanswered_ids = [i for i in batch_ids if i not in returned]
+        if len(unanswered_ids) == 1 and len(extra_ids) == 1:
+            return {unanswered_ids[0]: extra_ids[0]}
+        merged_ids = {}
+        for requested_id in unanswered_ids:
+            if engine is not None:
+                entities = engine.fetch_batch([requested_id], select=select)
+            else:
+                entities = get_entity_batch([requested_id], transport=transport, select=select)
+            if entities:
+                merged_ids[requested_id] = short_id(entities[0]["id"])
+        return merged_ids
+
+    @classmethod
+    def _create_from_web_api_by_ids(cls, conn: sqlite3.Connection, ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> list:
+        """
+        Query the OpenAlex web API for the entities in batches of up to 50 IDs per request, and insert them into the database.
+        With an engine, the batches are fetched concurrently and inserted here, in order, as they arrive.
+        Returns the entities that were successfully inserted into the database.
+        """
+        if not isinstance(ids, list):
+            ids = [ids]
+        if engine is not None:
+            entity_batches = engine.iter_batches(ids)
+        else:
+            entity_batches = iter_entity_batches(ids, transport=transport)
+        return_entities = []
+        for entity_batch in entity_batches:
+            entities = [cls(e) for e in entity_batch]
+            try:
+                cls.bulk_insert(conn, entities)
+                return_entities.extend(entities)
+            except sqlite3.IntegrityError:
+                # Fall back to one entity at a time to keep the ones that can be inserted.
+                for entity in entities:
+                    try:
+                        entity.insert_or_replace_in_db(conn)
+                        return_entities.append(entity)
+                    except sqlite3.IntegrityError:
+                        pass
+        return return_entities
     
     @staticmethod
     def _clean_string(string: str) -> str:
@@ -55,6 +753,8 @@ class Entity:
         """
         Removes the base URL from a string.
         """
+        if string is None:
+            return None
         return string.replace(base_url, "")
 
     @staticmethod
@@ -62,4 +762,82 @@ class Entity:
         """
         Prepends the base URL to a string.
         """
-        return base_url + string
\ No newline at end of file
+        if string is None:
+            return None
+        return base_url + string
+
+class _LazyBatch:
+    """
+    The lazy entities of one chunk of a lazy read. The child rows of all of them are read together, when one of them first needs them.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, lazy_class: type, parent_rows: List[tuple], fields: Optional[Tuple[str, ...]] = None):
+        self.conn = conn
+        self.fields = fields
+        parent_table = next(iter(lazy_class.TABLES))
+        no_child_rows = {table: {} for table in lazy_class.TABLES if table != parent_table}
+        self.entities = [lazy_class(parent_row, no_child_rows, self) for parent_row in parent_rows]
+
+    def load(self):
+        """
+        Read the child rows of the entities that are not loaded yet, with one query per child table, and complete them.
+        """
+        entities = [entity for entity in self.entities if entity._data is None]
+        if not entities:
+            return
+        entity_class = type(entities[0])
+        child_rows = entity_class._read_child_rows(self.conn, [entity.id for entity in entities], self.fields)
+        for entity in entities:
+            entity._data = entity_class._project(entity_class._from_rows(entity._parent_row, child_rows), self.fields).data
+
+
+class LazyEntity:
+    """
+    Mixin of the entities returned by lazy reads (read_*_from_db_by_ids(..., lazy=True)), which only read the parent table.
+    The fields of the parent row are attributes (work.display_name, work.cited_by_count) that need no query.
+    Accessing a child field (see Entity.CHILD_FIELDS, e.g. work.authorships) or data loads the child rows of every entity of the
+    same read chunk at once, so the connection must stay open until then.
+    """
+
+    def __init__(self, parent_row: tuple, no_child_rows: Dict[str, dict], batch: _LazyBatch):
+        fields = self._project(self._from_rows(parent_row, no_child_rows), batch.fields).data
+        for field in self.CHILD_FIELDS:
+            fields.pop(field, None)
+        self.id = parent_row[0]
+        self.origin = "db"
+        self._fields = fields
+        self._parent_row = parent_row
+        self._batch = batch
+        self._data = None
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the child rows are loaded."""
+        return self._data is not None
+
+    @property
+    def data(self) -> dict:
+        """The full entity dict, as read_*_from_db_by_ids returns it. Loads the child rows on first access."""
+        if self._data is None:
+            self._batch.load()
+        return self._data
+
+    @data.setter
+    def data(self, data: dict):
+        self._data = data
+
+    def __getattr__(self, name: str):
+        # Only called for the names that are not regular attributes.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._data is not None:
+            if name in self._data:
+                return self._data[name]
+        elif name in self._fields:
+            return self._fields[name]
+        elif name in self.CHILD_FIELDS and (self._batch.fields is None or name in self._batch.fields):
+            return self.data[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} id={self.id} loaded={self.loaded}>"
@@ -0,0 +1,165 @@
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:  # Optional dependency: pip install numpy
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional dependency: pip install pyarrow
+    pyarrow = None
+
+from openalex_sqlite_cache import json_codec
+
+# Rows per chunk (Arrow record batch, NumPy array) of an export.
+DEFAULT_CHUNK_SIZE = 65536
+
+# The NumPy dtype of each declared SQLite column type. TEXT columns are Python strings (object), and NULLs in INTEGER columns
+# are written as integer_null (see iter_numpy_chunks), since NumPy integers have no missing value.
+NUMPY_TYPES = {"INTEGER": "i8", "REAL": "f8", "TEXT": "O", "BLOB": "O"}
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy export requires the numpy package: pip install numpy")
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Arrow and Parquet export require the pyarrow package: pip install pyarrow")
+
+
+def exportable_sources(conn: sqlite3.Connection) -> List[str]:
+    """
+    The tables and views of the cache that can be exported, e.g. "works", "works_authorships" or "works_citations_view".
+    """
+    return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def source_columns(conn: sqlite3.Connection, source: str) -> Dict[str, str]:
+    """
+    The columns of a table or view and their declared SQLite types (INTEGER, REAL, TEXT or BLOB).
+    """
+    if source not in exportable_sources(conn):
+        raise ValueError(f"Unknown table or view: {source}")
+    return {row[1]: (row[2] or "BLOB").upper() for row in conn.execute(f"PRAGMA table_info({source})")}
+
+
+def _export_query(conn: sqlite3.Connection, source: str, columns: Optional[List[str]], filters: Optional[Dict[str, Any]]) -> Tuple[str, list, Dict[str, str]]:
+    """
+    Build the SELECT of an export, with its parameters and the declared types of the selected columns.
+    The table, view and column names are checked against the schema, since they cannot be bound as parameters.
+    """
+    declared_types = source_columns(conn, source)
+    columns = list(columns) if columns is not None else list(declared_types)
+    unknown_columns = [column for column in columns + list(filters or {}) if column not in declared_types]
+    if unknown_columns:
+        raise ValueError(f"Unknown columns of {source}: {unknown_columns}")
+
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            # One parameter for any number of values, instead of one per value.
+            conditions.append(f"{column} IN (SELECT value FROM json_each(?))")
+            params.append(json_codec.dumps(list(value)))
+        elif value is None:
+            conditions.append(f"{column} IS NULL")
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    raw_sql = "SELECT {} FROM {}".format(', '.join(columns), source)
+    if conditions:
+        raw_sql += " WHERE " + " AND ".join(conditions)
+    return raw_sql, params, {column: declared_types[column] for column in columns}
+
+
+def iter_chunks(conn: sqlite3.Connection, source: str, columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Stream the rows of a table or view, chunk_size rows at a time, e.g.
+    iter_chunks(conn, "works_authorships", ["work_id", "author_id"], filters={"author_id": ["A1", "A2"]}).
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        source (str): A table or view of the cache (see exportable_sources).
+        columns (list[str]): The columns to export. Defaults to all of them.
+        filters (dict): Keep the rows where each column equals a value, or is one of a list of values (or IS NULL, for None).
+        chunk_size (int): The number of rows per chunk.
+    """
+    raw_sql, params, _ = _export_query(conn, source, columns, filters)
+    cursor = conn.execute(raw_sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def arrow_schema(declared_types: Dict[str, str]):
+    """
+    The Arrow schema of columns with declared SQLite types, so that every record batch of an export has the same schema.
+    """
+    _require_pyarrow()
+    arrow_types = {"INTEGER": pyarrow.int64(), "REAL": pyarrow.float64(), "TEXT": pyarrow.string(), "BLOB": pyarrow.binary()}
+    return pyarrow.schema([(column, arrow_types.get(declared_type, pyarrow.string())) for column, declared_type in declared_types.items()])
+
+
+def iter_record_batches(conn: sqlite3.Connection, source: str, columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator["pyarrow.RecordBatch"]:
+    """
+    Stream a table or view as Arrow record batches of chunk_size rows (see iter_chunks), typed from the declared column types.
+    """
+    _require_pyarrow()
+    _, _, declared_types = _export_query(conn, source, columns, filters)
+    schema = arrow_schema(declared_types)
+    for rows in iter_chunks(conn, source, list(declared_types), filters, chunk_size):
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def read_arrow_table(conn: sqlite3.Connection, source: str, columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> "pyarrow.Table":
+    """
+    Read a table or view into an Arrow table (e.g. for table.to_pandas() or polars.from_arrow(table)).
+    """
+    _require_pyarrow()
+    _, _, declared_types = _export_query(conn, source, columns, filters)
+    return pyarrow.Table.from_batches(list(iter_record_batches(conn, source, columns, filters, chunk_size)), schema=arrow_schema(declared_types))
+
+
+def write_parquet(conn: sqlite3.Connection, path: str, source: str, columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, compression: str = "zstd") -> int:
+    """
+    Write a table or view to a Parquet file, one row group per chunk, without holding more than a chunk in memory.
+    Returns the number of rows written.
+    """
+    _require_pyarrow()
+    _, _, declared_types = _export_query(conn, source, columns, filters)
+    row_count = 0
+    with pyarrow.parquet.ParquetWriter(path, arrow_schema(declared_types), compression=compression) as writer:
+        for record_batch in iter_record_batches(conn, source, columns, filters, chunk_size):
+            writer.write_batch(record_batch)
+            row_count += record_batch.num_rows
+    return row_count
+
+
+def iter_numpy_chunks(conn: sqlite3.Connection, source: str, columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, integer_null: int = -1) -> Iterator["numpy.ndarray"]:
+    """
+    Stream a table or view as NumPy structured arrays of chunk_size rows (see iter_chunks), with a field per column typed from
+    its declared type (see NUMPY_TYPES). NULLs are integer_null in INTEGER columns and NaN in REAL columns.
+    """
+    _require_numpy()
+    _, _, declared_types = _export_query(conn, source, columns, filters)
+    dtype = numpy.dtype([(column, NUMPY_TYPES.get(declared_type, "O")) for column, declared_type in declared_types.items()])
+    nulls = tuple({"INTEGER": integer_null, "REAL": float("nan")}.get(declared_type) for declared_type in declared_types.values())
+    for rows in iter_chunks(conn, source, list(declared_types), filters, chunk_size):
+        if any(null is not None for null in nulls):
+            rows = [tuple(null if value is None else value for value, null in zip(row, nulls)) for row in rows]
+        yield numpy.array(rows, dtype=dtype)
@@ -0,0 +1,81 @@
+import sqlite3
+from typing import Dict, List, Optional, Union
+
+from openalex_sqlite_cache.cache import table_entity_classes
+from openalex_sqlite_cache.entity import MAX_SQL_VARIABLES
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+from openalex_sqlite_cache.get_items_from_api import Transport, chunk_ids, get_filter_batch
+from openalex_sqlite_cache.identifiers import normalize_external_id
+
+# The entity type each kind of external ID resolves to, and the web API filter to look it up.
+EXTERNAL_ID_TARGETS = {
+    "doi": ("works", "doi"),
+    "pmid": ("works", "pmid"),
+    "orcid": ("authors", "orcid"),
+    "ror": ("institutions", "ror"),
+    "issn": ("sources", "issn"),
+}
+
+
+def lookup_external_ids(conn: sqlite3.Connection, kind: str, values: List[str]) -> Dict[str, str]:
+    """
+    Look up normalized external IDs in the external_ids table, with chunked IN queries on its primary key.
+    Returns the OpenAlex ID (short form) of each value that is cached.
+    """
+    found = {}
+    for chunk in chunk_ids(values, MAX_SQL_VARIABLES):
+        raw_sql = "SELECT value, openalex_id FROM external_ids WHERE kind = ? AND value IN ({})".format(','.join('?' * len(chunk)))
+        found.update(conn.execute(raw_sql, [kind] + chunk).fetchall())
+    return found
+
+
+def _normalize_or_none(kind: str, value: Optional[str]) -> Optional[str]:
+    """
+    Normalize an external ID (see identifiers.normalize_external_id), or return None for a malformed one.
+    """
+    try:
+        return normalize_external_id(kind, value)
+    except ValueError:
+        return None
+
+
+def resolve_ids(conn: sqlite3.Connection, kind: str, values: Union[List[str], str], fetch_missing: bool = True,
+                transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> Dict[str, Optional[str]]:
+    """
+    Resolve external IDs to OpenAlex IDs, e.g. resolve_ids(conn, "doi", ["https://doi.org/10.1038/s41586-020-2649-2"]).
+    The values are normalized and looked up in the cache first. The misses are then fetched from the web API with batched
+    filters (doi:a|b|c, 50 values per request), and the entities found are inserted in the cache, which also caches their external IDs.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        kind (str): "doi", "pmid" (works), "orcid" (authors), "ror" (institutions) or "issn" (sources).
+        values (list[str]): The external IDs, in any usual form (URL or bare, any case).
+        fetch_missing (bool): Look up the values missing from the cache in the web API.
+        transport (Transport): Optional callable used to send the requests.
+        engine (FetchEngine): Optional fetch engine, to rate limit and retry the requests.
+
+    Returns:
+        dict: The OpenAlex ID (short form) for each value as given, or None if it could not be resolved. Malformed values
+            (e.g. a DOI without the "10." prefix) resolve to None instead of failing the batch.
+    """
+    if kind not in EXTERNAL_ID_TARGETS:
+        raise ValueError(f"Unknown external ID kind: {kind}. Choose from {list(EXTERNAL_ID_TARGETS)}")
+    if not isinstance(values, list):
+        values = [values]
+    normalized = {value: _normalize_or_none(kind, value) for value in values}
+    unique_values = list(dict.fromkeys(v for v in normalized.values() if v is not None))
+
+    found = lookup_external_ids(conn, kind, unique_values)
+    missing = [value for value in unique_values if value not in found]
+    if missing and fetch_missing:
+        entity_type, filter_name = EXTERNAL_ID_TARGETS[kind]
+        entity_class = table_entity_classes[entity_type]
+        for chunk in chunk_ids(missing):
+            if engine is not None:
+                entities = engine.fetch_filter_batch(entity_type, filter_name, chunk)
+            else:
+                entities = get_filter_batch(entity_type, filter_name, chunk, transport=transport)
+            entity_class.bulk_insert(conn, entities)
+        found.update(lookup_external_ids(conn, kind, missing))
+
+    return {value: found.get(normalized_value) for value, normalized_value in normalized.items()}
@@ -0,0 +1,138 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, List, Optional
+
+import requests
+
+from openalex_sqlite_cache.get_items_from_api import (
+    REQUEST_TIMEOUT_SECONDS,
+    OpenAlexHTTPError,
+    Transport,
+    chunk_ids,
+    get_entity_batch,
+    get_filter_batch,
+    normalize_ids,
+    requests_transport,
+)
+
+# OpenAlex asks for at most 10 requests per second in the polite pool.
+POLITE_REQUESTS_PER_SECOND = 10.0
+
+RETRY_HTTP_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter. Holds at most `capacity` tokens, refilled at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float = POLITE_REQUESTS_PER_SECOND, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, blocking until it is available. Tokens are reserved in arrival order, so the balance may go negative.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+
+
+class FetchEngine:
+    """
+    Fetches entities from the OpenAlex API with batched requests fanned out over a bounded thread pool.
+    All workers share one TokenBucket, and requests failing with 429/5xx, a connection error or a timeout are retried with exponential backoff.
+    Without a transport, requests are sent with requests_transport and time out after timeout seconds.
+    """
+
+    def __init__(self, max_workers: int = 4, requests_per_second: float = POLITE_REQUESTS_PER_SECOND,
+                 max_retries: int = 5, backoff_factor: float = 0.5, retry_http_codes=RETRY_HTTP_CODES,
+                 transport: Optional[Transport] = None, sleep: Callable[[float], None] = time.sleep,
+                 timeout: Optional[float] = REQUEST_TIMEOUT_SECONDS):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.retry_http_codes = tuple(retry_http_codes)
+        self.transport = transport if transport is not None else partial(requests_transport, timeout=timeout)
+        self.rate_limiter = TokenBucket(requests_per_second, sleep=sleep)
+        self._sleep = sleep
+
+    def _request(self, get_batch: Callable[..., list], *args, **kwargs) -> list:
+        """
+        Send one request through get_batch, waiting for the rate limiter and retrying transient errors.
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return get_batch(*args, transport=self.transport, **kwargs)
+            except OpenAlexHTTPError as e:
+                if e.status_code not in self.retry_http_codes or attempt >= self.max_retries:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else self.backoff_factor * 2 ** attempt
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_factor * 2 ** attempt
+            attempt += 1
+            self._sleep(delay)
+
+    def fetch_batch(self, openalex_item_ids: List[str], select: Optional[List[str]] = None) -> list:
+        """
+        Fetch one batch of up to 50 IDs, waiting for the rate limiter and retrying transient errors.
+        """
+        return self._request(get_entity_batch, openalex_item_ids, select=select)
+
+    def fetch_filter_batch(self, endpoint: str, filter_name: str, values: List[str], select: Optional[List[str]] = None) -> list:
+        """
+        Fetch the entities matching up to 50 values of a filter (see get_filter_batch), waiting for the rate limiter and retrying transient errors.
+        """
+        return self._request(get_filter_batch, endpoint, filter_name, values, select=select)
+
+    def iter_batches(self, openalex_item_ids: List[str], select: Optional[List[str]] = None) -> Iterator[list]:
+        """
+        Yield the fetched entities one batch at a time, in the order of the IDs.
+        At most 2 * max_workers batches are in flight, so a slow consumer (e.g. the SQLite writer) does not buffer the whole result.
+        """
+        item_ids = normalize_ids(openalex_item_ids)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = deque()
+        try:
+            for item_batch in chunk_ids(item_ids):
+                futures.append(executor.submit(self.fetch_batch, item_batch, select))
+                if len(futures) >= 2 * self.max_workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def get_entities_by_id(self, openalex_item_ids: List[str]) -> list:
+        """
+        Get entities from OpenAlex API by their IDs.
+        """
+        entities = []
+        for entity_batch in self.iter_batches(openalex_item_ids):
+            entities.extend(entity_batch)
+        return entities
@@ -0,0 +1,137 @@
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from openalex_sqlite_cache.cache import table_entity_classes
+from openalex_sqlite_cache.compact_ids import ENTITY_PREFIXES, read_ids, stored_ids
+from openalex_sqlite_cache.entity import utc_now, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+from openalex_sqlite_cache.get_items_from_api import Transport, chunk_ids, iter_entity_batches, short_id
+
+
+class FreshnessPolicy:
+    """
+    When a cached entity should be refreshed from the web API.
+
+    Args:
+        max_age (timedelta): An entity is due once it has not been fetched (or checked) for max_age.
+        check_api_updated_date (bool): Only re-download a due entity if the web API's updated_date is newer than the cached one.
+            Checking costs one request with select=id,updated_date per 50 due entities, which is much lighter than re-downloading them.
+    """
+
+    def __init__(self, max_age: timedelta, check_api_updated_date: bool = False):
+        self.max_age = max_age
+        self.check_api_updated_date = check_api_updated_date
+
+    def __repr__(self):
+        return f"<FreshnessPolicy max_age={self.max_age} check_api_updated_date={self.check_api_updated_date}>"
+
+
+# Default policies per entity type, keyed by parent table name.
+FRESHNESS_POLICIES = {
+    "works": FreshnessPolicy(timedelta(days=30), check_api_updated_date=True),
+    "authors": FreshnessPolicy(timedelta(days=30), check_api_updated_date=True),
+    "sources": FreshnessPolicy(timedelta(days=90), check_api_updated_date=True),
+    "institutions": FreshnessPolicy(timedelta(days=90), check_api_updated_date=True),
+    "publishers": FreshnessPolicy(timedelta(days=90), check_api_updated_date=True),
+    "funders": FreshnessPolicy(timedelta(days=90), check_api_updated_date=True),
+    "topics": FreshnessPolicy(timedelta(days=365)),
+    "concepts": FreshnessPolicy(timedelta(days=365)),
+}
+
+
+def _get_policy(entity_type: str, policy: Optional[FreshnessPolicy]) -> FreshnessPolicy:
+    if entity_type not in table_entity_classes:
+        raise ValueError(f"Unknown entity type: {entity_type}")
+    return policy if policy is not None else FRESHNESS_POLICIES[entity_type]
+
+
+def find_stale_ids(conn: sqlite3.Connection, entity_type: str, limit: int = 1000, policy: Optional[FreshnessPolicy] = None, now: Optional[str] = None) -> List[str]:
+    """
+    Return up to `limit` IDs of cached entities that are due for a refresh, least recently refreshed first.
+    Uses the (entity_type, refreshed_date) index of refresh_log, so it does not scan the entity table.
+    """
+    policy = _get_policy(entity_type, policy)
+    if now is None:
+        now = utc_now()
+    cutoff = (datetime.fromisoformat(now) - policy.max_age).isoformat()
+    raw_sql = (
+        "SELECT r.id FROM refresh_log r JOIN {} e ON e.id = r.id "
+        "WHERE r.entity_type = ? AND r.refreshed_date < ? ORDER BY r.refreshed_date LIMIT ?"
+    ).format(entity_type)
+    return read_ids(conn, (row[0] for row in conn.execute(raw_sql, (entity_type, cutoff, limit))), ENTITY_PREFIXES[entity_type])
+
+
+def _log_checked(conn: sqlite3.Connection, entity_type: str, ids: List[str], now: str):
+    """
+    Log cached entities as checked at `now` in refresh_log without re-downloading them, so that they are not due again before max_age.
+    """
+    with conn:
+        conn.executemany(
+            "UPDATE refresh_log SET refreshed_date = ? WHERE entity_type = ? AND id = ?",
+            [(now, entity_type, stored_id) for stored_id in stored_ids(conn, ids, ENTITY_PREFIXES[entity_type])]
+        )
+
+
+def _filter_updated_in_api(conn: sqlite3.Connection, entity_type: str, ids: List[str], transport: Optional[Transport], engine: Optional[FetchEngine], now: str) -> List[str]:
+    """
+    Ask the web API for the updated_date of the entities, and return the IDs whose updated_date is newer than the cached one.
+    The other entities are logged as checked at `now`.
+    """
+    prefix = ENTITY_PREFIXES[entity_type]
+    cached_dates = {}
+    for chunk in chunk_ids(ids, MAX_SQL_VARIABLES):
+        raw_sql = "SELECT id, updated_date FROM {} WHERE id IN ({})".format(entity_type, ','.join('?' * len(chunk)))
+        rows = conn.execute(raw_sql, stored_ids(conn, chunk, prefix)).fetchall()
+        cached_dates.update(zip(read_ids(conn, (row[0] for row in rows), prefix), (row[1] for row in rows)))
+
+    select = ["id", "updated_date"]
+    if engine is not None:
+        batches = engine.iter_batches(ids, select=select)
+    else:
+        batches = iter_entity_batches(ids, transport=transport, select=select)
+    updated_ids = []
+    for batch in batches:
+        for entity in batch:
+            entity_id = short_id(entity["id"])
+            cached_date = cached_dates.get(entity_id)
+            if cached_date is None or (entity.get("updated_date") or "") > cached_date:
+                updated_ids.append(entity_id)
+
+    updated = set(updated_ids)
+    _log_checked(conn, entity_type, [entity_id for entity_id in ids if entity_id not in updated], now)
+    return updated_ids
+
+
+def refresh_stale(conn: sqlite3.Connection, entity_type: str, limit: int = 1000, policy: Optional[FreshnessPolicy] = None,
+                  transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None, now: Optional[str] = None) -> List[str]:
+    """
+    Refresh up to `limit` stale entities of one type (e.g. "authors"): select the due IDs, optionally keep only the ones
+    the web API has updated since, and re-download those in batches.
+    Meant to be run periodically; returns the IDs that were re-downloaded.
+    The due entities that the web API no longer returns (deleted or merged) are logged as checked, so that they do not stay first in
+    line and block the others.
+    """
+    policy = _get_policy(entity_type, policy)
+    if now is None:
+        now = utc_now()
+    stale_ids = find_stale_ids(conn, entity_type, limit=limit, policy=policy, now=now)
+    if not stale_ids:
+        return []
+    if policy.check_api_updated_date:
+        stale_ids = _filter_updated_in_api(conn, entity_type, stale_ids, transport, engine, now)
+        if not stale_ids:
+            return []
+
+    entity_class = table_entity_classes[entity_type]
+    if engine is not None:
+        batches = engine.iter_batches(stale_ids)
+    else:
+        batches = iter_entity_batches(stale_ids, transport=transport)
+    refreshed_ids = []
+    for batch in batches:
+        entity_class.bulk_insert(conn, batch, refreshed_date=now)
+        refreshed_ids.extend(short_id(entity["id"]) for entity in batch)
+    refreshed = set(refreshed_ids)
+    _log_checked(conn, entity_type, [entity_id for entity_id in stale_ids if entity_id not in refreshed], now)
+    return refreshed_ids
@@ -1,138 +1,137 @@
 import sqlite3
-from typing import Union, List
-import json
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from openalex_sqlite_cache.entity import Entity
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
 
 class Funder(Entity):
 
+    TABLES = {
+        "funders": ("id", "display_name", "alternate_titles", "country_code", "description", "homepage_url", "image_url", "image_thumbnail_url", "grants_count", "works_count", "cited_by_count", "updated_date"),
+        "funders_counts_by_year": ("funder_id", "year", "works_count", "cited_by_count"),
+        "funders_ids": ("funder_id", "openalex", "ror", "wikidata", "crossref", "doi"),
+    }
+
+    # Counts by year are read oldest year first.
+    ORDER_BY = {"funders_counts_by_year": "year DESC"}
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "counts_by_year": "funders_counts_by_year",
+        "ids": "funders_ids",
+    }
+
     # Only included here for type hinting
     def __init__(self, funder: Union[pyalex.Funder, dict]):
         super().__init__(funder)
 
     @staticmethod
-    def create_funders_from_web_api_by_ids(conn: sqlite3.Connection, funder_ids: Union[List[str], str]) -> "Funder":
+    def create_funders_from_web_api_by_ids(conn: sqlite3.Connection, funder_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Funder":
         """
         Query the OpenAlex web API for a particular funder(s) to create the pyalex.Funder dict. Insert the funder(s) into the database.
         The only Funders returned are those that were successfully inserted into the database.
         If a funder already exists in the database, it will not be inserted again, and will not be returned here.
         """
-        if not isinstance(funder_ids, list):
-            funder_ids = [funder_ids]
-        pyalexFunders = []
-        for funder_id in funder_ids:
-            tmpFunder = pyalex.Funders()[funder_id] # I think this may be the syntax for just one funder. How to do this for a list of funders at once?
-            pyalexFunders.append(tmpFunder)
-        assert len(pyalexFunders) == len(funder_ids)
-        funders = [Funder(f) for f in pyalexFunders]
-        return_funders = []
-        for funder in funders:
-            try:
-                funder.insert_or_replace_in_db(conn)
-                return_funders.append(funder)
-            except sqlite3.IntegrityError as e:
-                # print(f"Error inserting funder {funder.funder_id} into database: {e}")
-                pass            
-        return return_funders
+        return Funder._create_from_web_api_by_ids(conn, funder_ids, transport=transport, engine=engine)
     
     @staticmethod
-    def read_funders_from_db_by_ids(conn: sqlite3.Connection, funder_ids: Union[List[str], str]) -> "Funder":
+    def iter_funders_from_db_by_ids(conn: sqlite3.Connection, funder_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Funder"]:
         """
-        Query the database for a particular funder to create its pyalex.Funder dict. 
+        Query the database for funders to create their pyalex.Funder dicts, in the order of the IDs (unknown IDs are left out).
+        The funders are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
         """
-        if not isinstance(funder_ids, list):
-            funder_ids = [funder_ids]
-        cursor = conn.cursor()
+        return Funder._iter_from_db_by_ids(conn, funder_ids, chunk_size, lazy, fields, compact)
+
+    @staticmethod
+    def read_funders_from_db_by_ids(conn: sqlite3.Connection, funder_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Funder"]:
+        """
+        Query the database for funders to create their pyalex.Funder dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, only the funders table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the funders only have those fields, and only their columns and tables are read.
+        With compact=True, the funders are compact FunderRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
+        """
+        return list(Funder.iter_funders_from_db_by_ids(conn, funder_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_funder: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Funder":
+        """
+        Build the funder from its row of the funders table and the child rows grouped by funder ID (see Entity._iter_rows).
+        """
+        funder_id = result_funder[0]
+        funder_dict = {}
+        # Build the funder_dict
         # FUNDERS
-        raw_sql = "SELECT id, display_name, alternate_names, country_codes, types, works_count, cited_by_count, sources_api_url, updated_date FROM funders WHERE id IN ({})".format(','.join('?' * len(funder_ids)))
-        funder_ids_tuple = tuple([Funder._remove_base_url(funder_id) for funder_id in funder_ids])
-        cursor.execute(raw_sql, funder_ids_tuple)
-        result_funders = cursor.fetchall()
+        funder_dict['id'] = Funder._prepend_base_url(funder_id)
+        funder_dict['display_name'] = result_funder[1]
+        funder_dict['alternate_titles'] = json_codec.loads(result_funder[2]) if result_funder[2] is not None else None
+        funder_dict['country_code'] = result_funder[3]
+        funder_dict['description'] = result_funder[4]
+        funder_dict['homepage_url'] = result_funder[5]
+        funder_dict['image_url'] = result_funder[6]
+        funder_dict['image_thumbnail_url'] = result_funder[7]
+        funder_dict['grants_count'] = result_funder[8]
+        funder_dict['works_count'] = result_funder[9]
+        funder_dict['cited_by_count'] = result_funder[10]
+        funder_dict['updated_date'] = result_funder[11]
 
         # FUNDERS_COUNTS_BY_YEAR
-        raw_sql = "SELECT funder_id, year, works_count, cited_by_count FROM funders_counts_by_year WHERE funder_id IN ({})".format(','.join('?' * len(funder_ids)))
-        cursor.execute(raw_sql, funder_ids_tuple)
-        result_funders_counts_by_year = cursor.fetchall()
+        funder_dict['counts_by_year'] = []
+        for count in child_rows['funders_counts_by_year'].get(funder_id, []):
+            year_dict = {}
+            year_dict['year'] = count[1]
+            year_dict['works_count'] = count[2]
+            year_dict['cited_by_count'] = count[3]
+            funder_dict['counts_by_year'].append(year_dict)
 
         # FUNDERS_IDS
-        raw_sql = "SELECT funder_id, openalex FROM funders_ids WHERE funder_id IN ({})".format(','.join('?' * len(funder_ids)))
-        cursor.execute(raw_sql, funder_ids_tuple)
-        result_funders_ids = cursor.fetchall()       
-
-        assert len(result_funders) == len(funder_ids)
-        funders = []
-        for i in range(len(result_funders)):
-            funder_dict = {}
-            # Build the funder_dict
-            # FUNDERS
-            funder_dict['id'] = Funder._prepend_base_url(result_funders[i][0])
-            funder_dict['display_name'] = result_funders[i][1]
-            funder_dict['alternate_names'] = result_funders[i][2]
-            funder_dict['country_codes'] = json.loads(result_funders[i][3])
-            funder_dict['types'] = json.loads(result_funders[i][4])
-            funder_dict['works_count'] = result_funders[i][5]
-            funder_dict['cited_by_count'] = result_funders[i][6]
-            funder_dict['sources_api_url'] = result_funders[i][7]
-            funder_dict['updated_date'] = result_funders[i][8]
-
-            # FUNDERS_COUNTS_BY_YEAR
-            funder_dict['counts_by_year'] = []
-            for count in result_funders_counts_by_year:
-                year_dict = {}
-                year_dict['year'] = count[1]
-                year_dict['works_count'] = count[2]
-                year_dict['cited_by_count'] = count[3]
-                funder_dict['counts_by_year'].append(year_dict)
-
-            # FUNDERS_IDS
-            funder_dict['ids'] = {}
-            funder_dict['ids']['openalex'] = result_funders_ids[i][1]
-            
-            funders.append(Funder(funder_dict))
-        assert len(funders) == len(funder_ids)
-
-        return funders
+        funder_dict['ids'] = {}
+        for result_funder_ids in child_rows['funders_ids'].get(funder_id, [])[:1]:
+            funder_dict['ids']['openalex'] = result_funder_ids[1]
+            funder_dict['ids']['ror'] = result_funder_ids[2]
+            funder_dict['ids']['wikidata'] = result_funder_ids[3]
+            funder_dict['ids']['crossref'] = result_funder_ids[4]
+            funder_dict['ids']['doi'] = result_funder_ids[5]
+
+        return Funder(funder_dict)
     
+    read_from_db_by_ids = read_funders_from_db_by_ids
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete funders from the database.
         """
         funder_id = self.id
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [funder_id])
         cursor = conn.cursor()
         # Delete the funder from the database
-        cursor.execute("DELETE FROM funders WHERE id=?", (funder_id,))
-        cursor.execute("DELETE FROM funders_counts_by_year WHERE funder_id=?", (funder_id,))
-        cursor.execute("DELETE FROM funders_ids WHERE funder_id=?", (funder_id,))
+        cursor.execute("DELETE FROM funders WHERE id=?", (stored_id,))
+        cursor.execute("DELETE FROM funders_counts_by_year WHERE funder_id=?", (stored_id,))
+        cursor.execute("DELETE FROM funders_ids WHERE funder_id=?", (stored_id,))
         conn.commit()
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(funder: dict) -> Dict[str, List[tuple]]:
         """
-        REPLACE the funder into the database.
+        Flatten the funder into the rows of the funders tables.
         """
-        funder = self.data
-        cursor = conn.cursor()
+        funder_id = Funder._remove_base_url(funder['id'])
         # FUNDERS
-        insert_tuple = (Funder._remove_base_url(funder['id']), funder['display_name'], json.dumps(funder['alternate_names']), json.dumps(funder['country_codes']), json.dumps(funder['types']), funder['works_count'], funder['cited_by_count'], funder['sources_api_url'], funder['updated_date'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        cursor.execute(
-            f"REPLACE INTO funders (id, display_name, alternate_names, country_codes, types, works_count, cited_by_count, sources_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        funders_rows = [(funder_id, funder['display_name'], json_codec.dumps(funder['alternate_titles']), funder['country_code'], funder['description'], funder['homepage_url'], funder['image_url'], funder['image_thumbnail_url'], funder['grants_count'], funder['works_count'], funder['cited_by_count'], funder['updated_date'])]
 
         # FUNDERS_COUNTS_BY_YEAR
-        for count in funder['counts_by_year']:
-            insert_tuple = (Funder._remove_base_url(funder['id']), count['year'], count['works_count'], count['cited_by_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            cursor.execute(
-                f"REPLACE INTO funders_counts_by_year (funder_id, year, works_count, cited_by_count) VALUES ({question_marks})", insert_tuple
-            )
+        funders_counts_by_year_rows = [(funder_id, count['year'], count['works_count'], count['cited_by_count']) for count in funder['counts_by_year']]
 
         # FUNDERS_IDS
-        insert_tuple = (Funder._remove_base_url(funder['id']), funder['ids']['openalex'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        cursor.execute(
-            f"REPLACE INTO funders_ids (funder_id, openalex) VALUES ({question_marks})", insert_tuple
-        )
-        
-        conn.commit()
\ No newline at end of file
+        ids = funder['ids']
+        funders_ids_rows = [(funder_id, ids['openalex'], ids.get('ror'), ids.get('wikidata'), ids.get('crossref'), ids.get('doi'))]
+
+        return {
+            "funders": funders_rows,
+            "funders_counts_by_year": funders_counts_by_year_rows,
+            "funders_ids": funders_ids_rows,
+        }
@@ -1,4 +1,9 @@
-from pyalex import Works, Authors, Sources, Institutions, Concepts, Topics, Publishers, Funders
+import threading
+from typing import Callable, Iterator, List, Optional
+
+import requests
+from pyalex import Works, Authors, Sources, Institutions, Concepts, Topics, Publishers, Funders, config
+from pyalex.api import OpenAlexAuth
 
 first_letter_types_dict = {
     "W": Works,
@@ -11,31 +16,186 @@ first_letter_types_dict = {
     "F": Funders,
 }
 
-def get_entities_by_id(openalex_item_ids: list[str]) -> list:
+# The same classes, keyed by their endpoint name (e.g. "works").
+endpoint_types_dict = {entities_class.__name__.lower(): entities_class for entities_class in first_letter_types_dict.values()}
+
+# The OpenAlex API accepts up to 50 values in a single OR filter (openalex_id:A1|A2|...).
+MAX_IDS_PER_REQUEST = 50
+
+# The largest page the OpenAlex API returns.
+MAX_PER_PAGE = 200
+
+# The seconds requests_transport waits to connect and then between bytes of the response, so that a stalled connection raises
+# requests.Timeout (which FetchEngine retries) instead of blocking forever.
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+# A transport takes the URL of an API endpoint and the query parameters, and returns the decoded JSON response.
+Transport = Callable[[str, dict], dict]
+
+_thread_local = threading.local()
+
+
+class OpenAlexHTTPError(Exception):
+    """Raised by a transport when the OpenAlex API returns an error status code."""
+
+    def __init__(self, status_code: int, url: str, retry_after: Optional[float] = None):
+        super().__init__(f"OpenAlex API returned HTTP {status_code} for {url}")
+        self.status_code = status_code
+        self.url = url
+        self.retry_after = retry_after
+
+
+def requests_transport(url: str, params: dict, timeout: Optional[float] = REQUEST_TIMEOUT_SECONDS) -> dict:
     """
-    Get entities from OpenAlex API by their IDs.
+    Default transport. Sends the GET request with `requests`, using one keep-alive session per thread and the pyalex config (email, api_key, user_agent).
+    Raises requests.Timeout when the server does not answer within timeout seconds (None waits forever).
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    response = session.get(url, params=params, auth=OpenAlexAuth(config), timeout=timeout)
+    if response.status_code >= 400:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                retry_after = float(retry_after)
+            except ValueError:
+                retry_after = None
+        raise OpenAlexHTTPError(response.status_code, response.url, retry_after=retry_after)
+    return response.json()
 
-    Args:
-        openalex_item_ids (list[str]): A list of item IDs.
 
-    Returns:
-        list: A list of entities.
+def short_id(openalex_item_id: str) -> str:
+    """
+    Returns the short form of an OpenAlex ID, e.g. "https://openalex.org/A5023888391" -> "A5023888391".
+    """
+    return openalex_item_id.rstrip("/").rsplit("/", 1)[-1]
+
+
+def chunk_ids(openalex_item_ids: List[str], batch_size: int = MAX_IDS_PER_REQUEST) -> Iterator[List[str]]:
+    """
+    Split a list of IDs into consecutive batches of at most batch_size IDs.
     """
+    for item_count in range(0, len(openalex_item_ids), batch_size):
+        yield openalex_item_ids[item_count:item_count + batch_size]
 
+
+def normalize_ids(openalex_item_ids: List[str]) -> List[str]:
+    """
+    Convert the IDs to their short form, drop duplicates (keeping the first occurrence) and check that they are all of the same entity type.
+    """
     # Check that the openalex_item_ids are not empty
     if not openalex_item_ids:
         raise ValueError("The list of item IDs is empty.")
 
+    item_ids = list(dict.fromkeys(short_id(item_id) for item_id in openalex_item_ids))
+
     # Make sure that the item types are all the same
-    first_letter = openalex_item_ids[0][0]
-    for item_id in openalex_item_ids:
-        if item_id[0] != first_letter:
+    first_letter = item_ids[0][0].upper()
+    if first_letter not in first_letter_types_dict:
+        raise ValueError(f"Unknown OpenAlex ID type: {item_ids[0]}")
+    for item_id in item_ids:
+        if item_id[0].upper() != first_letter:
             raise ValueError("All item IDs must be of the same type in this list.")
+    return item_ids
+
+
+def get_entity_batch(openalex_item_ids: List[str], transport: Optional[Transport] = None, select: Optional[List[str]] = None) -> list:
+    """
+    Get up to MAX_IDS_PER_REQUEST entities of the same type from the OpenAlex API in a single request.
 
+    Args:
+        openalex_item_ids (list[str]): A list of item IDs of the same type.
+        transport (Transport): Optional callable used to send the request. Defaults to requests_transport.
+        select (list[str]): Optional top-level fields to return (the API's select= parameter). Must include "id".
+
+    Returns:
+        list: The pyalex entities, in the order of the requested IDs. IDs unknown to the API are omitted.
+    """
+    item_ids = normalize_ids(openalex_item_ids)
+    if len(item_ids) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_IDS_PER_REQUEST} IDs can be requested at once.")
+    if transport is None:
+        transport = requests_transport
+
+    entities_class = first_letter_types_dict[item_ids[0][0].upper()]
+    url = "{}/{}".format(config.openalex_url.rstrip("/"), entities_class.__name__.lower())
+    params = {
+        "filter": "openalex_id:" + "|".join(item_ids),
+        "per-page": len(item_ids),
+    }
+    if select is not None:
+        params["select"] = ",".join(select)
+    response = transport(url, params)
+
+    results_by_id = {}
+    for result in response["results"]:
+        results_by_id[short_id(result["id"])] = entities_class.resource_class(result)
+    # Return in the requested order. Merged IDs come back under their new ID, so keep those too.
+    entities = [results_by_id.pop(item_id) for item_id in item_ids if item_id in results_by_id]
+    entities.extend(results_by_id.values())
+    return entities
+
+
+def iter_entity_batches(openalex_item_ids: List[str], transport: Optional[Transport] = None, select: Optional[List[str]] = None) -> Iterator[list]:
+    """
+    Yield the entities from the OpenAlex API one request (of up to MAX_IDS_PER_REQUEST IDs) at a time, in the order of the IDs.
+    """
+    item_ids = normalize_ids(openalex_item_ids)
+    for item_batch in chunk_ids(item_ids):
+        yield get_entity_batch(item_batch, transport=transport, select=select)
+
+
+def get_filter_batch(endpoint: str, filter_name: str, values: List[str], transport: Optional[Transport] = None, select: Optional[List[str]] = None) -> list:
+    """
+    Get the entities matching any of up to MAX_IDS_PER_REQUEST values of a filter in a single request,
+    e.g. get_filter_batch("works", "doi", ["10.1038/s41586-020-2649-2", ...]).
+    At most MAX_PER_PAGE entities are returned.
+
+    Args:
+        endpoint (str): The entity type, e.g. "works" or "authors".
+        filter_name (str): The API filter, e.g. "doi", "orcid", "ror", "issn" or "pmid".
+        values (list[str]): The filter values, OR-ed together.
+        transport (Transport): Optional callable used to send the request. Defaults to requests_transport.
+        select (list[str]): Optional top-level fields to return (the API's select= parameter).
+
+    Returns:
+        list: The pyalex entities.
+    """
+    if endpoint not in endpoint_types_dict:
+        raise ValueError(f"Unknown entity type: {endpoint}")
+    if not values:
+        return []
+    if len(values) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_IDS_PER_REQUEST} values can be requested at once.")
+    if transport is None:
+        transport = requests_transport
+
+    entities_class = endpoint_types_dict[endpoint]
+    url = "{}/{}".format(config.openalex_url.rstrip("/"), endpoint)
+    params = {
+        "filter": f"{filter_name}:" + "|".join(values),
+        "per-page": MAX_PER_PAGE,
+    }
+    if select is not None:
+        params["select"] = ",".join(select)
+    response = transport(url, params)
+    return [entities_class.resource_class(result) for result in response["results"]]
+
+
+def get_entities_by_id(openalex_item_ids: List[str], transport: Optional[Transport] = None) -> list:
+    """
+    Get entities from OpenAlex API by their IDs, MAX_IDS_PER_REQUEST IDs per request.
+
+    Args:
+        openalex_item_ids (list[str]): A list of item IDs.
+        transport (Transport): Optional callable used to send the requests. Defaults to requests_transport.
 
-    # Can query the OpenAlex API for up to 50 entities at a time.
+    Returns:
+        list: A list of entities.
+    """
     entities = []
-    for item_count in range(0, len(openalex_item_ids), 50):
-        item_batch = openalex_item_ids[item_count:item_count + 50]
-        entities.append(entities().get(openalex_item_ids=item_batch))
-    return entities
\ No newline at end of file
+    for entity_batch in iter_entity_batches(openalex_item_ids, transport=transport):
+        entities.extend(entity_batch)
+    return entities
@@ -0,0 +1,51 @@
+import re
+from typing import Optional
+
+# Normalized forms of external identifiers, as stored in the external_ids table:
+# doi "10.1038/s41586-020-2649-2" (lower case), orcid "0000-0002-1825-0097", ror "05dxps055", issn "1234-567X", pmid "12345678".
+EXTERNAL_ID_KINDS = ("doi", "orcid", "ror", "issn", "pmid")
+
+_DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:)", re.IGNORECASE)
+_ORCID = re.compile(r"(\d{4}-\d{4}-\d{4}-\d{3}[\dX])$", re.IGNORECASE)
+_ROR = re.compile(r"^(?:https?://ror\.org/)?(0[a-z0-9]{6}\d{2})$", re.IGNORECASE)
+_ISSN = re.compile(r"^(\d{4})-?(\d{3}[\dX])$", re.IGNORECASE)
+_PMID = re.compile(r"^(?:https?://(?:www\.ncbi\.nlm\.nih\.gov/pubmed|pubmed\.ncbi\.nlm\.nih\.gov)/|pmid:)?(\d+)$", re.IGNORECASE)
+
+
+def normalize_external_id(kind: str, value: Optional[str]) -> Optional[str]:
+    """
+    Normalize an external identifier, e.g. normalize_external_id("doi", "https://doi.org/10.1038/S41586-020-2649-2") -> "10.1038/s41586-020-2649-2".
+    Returns None for an empty value, and raises ValueError for a value that is not an identifier of that kind.
+    """
+    if kind not in EXTERNAL_ID_KINDS:
+        raise ValueError(f"Unknown external ID kind: {kind}. Choose from {list(EXTERNAL_ID_KINDS)}")
+    if value is None:
+        return None
+    value = str(value).strip().rstrip("/")
+    if not value:
+        return None
+
+    if kind == "doi":
+        doi = _DOI_PREFIX.sub("", value).lower()
+        if not doi.startswith("10.") or "/" not in doi:
+            raise ValueError(f"Invalid DOI: {value}")
+        return doi
+    if kind == "orcid":
+        match = _ORCID.search(value)
+        if match is None:
+            raise ValueError(f"Invalid ORCID: {value}")
+        return match.group(1).upper()
+    if kind == "ror":
+        match = _ROR.match(value)
+        if match is None:
+            raise ValueError(f"Invalid ROR ID: {value}")
+        return match.group(1).lower()
+    if kind == "issn":
+        match = _ISSN.match(value)
+        if match is None:
+            raise ValueError(f"Invalid ISSN: {value}")
+        return f"{match.group(1)}-{match.group(2).upper()}"
+    match = _PMID.match(value)
+    if match is None:
+        raise ValueError(f"Invalid PMID: {value}")
+    return match.group(1)
@@ -0,0 +1,73 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Secondary indexes for reverse lookups ("works by author", "who cites X") and lookups by external ID, as (table, columns).
+# The indexes on the entity ID of the child tables are part of init_db.sql instead: replacing an entity deletes its child rows
+# by entity ID, so those are needed while loading too.
+SECONDARY_INDEXES: List[Tuple[str, Tuple[str, ...]]] = [
+    # External IDs
+    ("authors", ("orcid",)),
+    ("institutions", ("ror",)),
+    ("sources", ("issn_l",)),
+    ("works", ("doi",)),
+    ("works_ids", ("pmid",)),
+    # Works by author / institution / source
+    ("works_authorships", ("author_id",)),
+    ("works_authorships", ("institution_id",)),
+    ("works_primary_locations", ("source_id",)),
+    ("works_locations", ("source_id",)),
+    # Works by concept / topic, and concept descendants
+    ("works_concepts", ("concept_id",)),
+    ("works_topics", ("topic_id",)),
+    ("concepts_ancestors", ("ancestor_id",)),
+    # Citations
+    ("works_referenced_works", ("referenced_work_id",)),
+    ("works_related_works", ("related_work_id",)),
+    # Institution hierarchy
+    ("institutions_associated_institutions", ("associated_institution_id",)),
+]
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    """
+    The name of an index, following init_db.sql: <table>_<columns>_idx.
+    """
+    return f"{table}_{'_'.join(columns)}_idx"
+
+
+def create_secondary_indexes(conn: sqlite3.Connection, analyze: bool = False):
+    """
+    Create the missing secondary indexes. With analyze=True, also refresh the query planner statistics (useful after a bulk load).
+    """
+    with conn:
+        for table, columns in SECONDARY_INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name(table, columns)} ON {table}({', '.join(columns)})")
+    if analyze:
+        conn.execute("ANALYZE")
+
+
+def drop_secondary_indexes(conn: sqlite3.Connection):
+    """
+    Drop the secondary indexes, e.g. before a bulk load.
+    """
+    with conn:
+        for table, columns in SECONDARY_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index_name(table, columns)}")
+
+
+@contextmanager
+def deferred_secondary_indexes(conn: sqlite3.Connection):
+    """
+    Drop the secondary indexes for the duration of a bulk load, and rebuild them (and ANALYZE) afterwards.
+    Building an index once over the loaded rows is much faster than updating it on every insert.
+    The indexes are rebuilt even if the load fails, so the cache is never left without them.
+
+        with deferred_secondary_indexes(conn):
+            load_snapshot(conn, snapshot_dir)
+    """
+    drop_secondary_indexes(conn)
+    try:
+        yield conn
+    finally:
+        create_secondary_indexes(conn, analyze=True)
@@ -1,26 +1,200 @@
 import os
+import re
 import sqlite3
+from typing import Optional
+
+from openalex_sqlite_cache.cache import table_entity_classes
+from openalex_sqlite_cache.compact_ids import DERIVED_TABLES, compact_derived_table_sql, compact_table_sql
+from openalex_sqlite_cache.indexes import create_secondary_indexes
 
 INIT_DB_SQL_PATH = "init_db.sql"
 
+# PRAGMA settings per connection profile. Negative cache_size values are in KiB.
+# - "balanced": WAL with synchronous=NORMAL (durable across application crashes, and only the last commits can be lost on power loss).
+# - "bulk-load": for loading snapshots, trades durability (synchronous=OFF) for write speed and gives the page cache more memory.
+# - "read-heavy": for serving reads from a warm cache, with a large memory map and page cache.
+PRAGMA_PROFILES = {
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,
+        "mmap_size": 256 * 1024 ** 2,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -512 * 1024,
+        "mmap_size": 256 * 1024 ** 2,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+    "read-heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,
+        "mmap_size": 1024 ** 3,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+# The PRAGMAs that can be set through a profile or as keyword arguments (PRAGMA names cannot be bound as SQL parameters).
+SUPPORTED_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+def apply_pragmas(conn: sqlite3.Connection, profile: Optional[str] = DEFAULT_PROFILE, **pragmas) -> dict:
+    """
+    Set the PRAGMAs of a connection profile (see PRAGMA_PROFILES), with keyword arguments overriding single PRAGMAs,
+    e.g. apply_pragmas(conn, "balanced", cache_size=-1024 * 1024). Pass profile=None to only set the keyword arguments.
+    Returns the PRAGMA settings that were applied.
+    """
+    if profile is not None and profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown PRAGMA profile: {profile}. Choose from {list(PRAGMA_PROFILES)}")
+    settings = dict(PRAGMA_PROFILES[profile]) if profile is not None else {}
+    settings.update(pragmas)
+    for name, value in settings.items():
+        if name not in SUPPORTED_PRAGMAS:
+            raise ValueError(f"Unsupported PRAGMA: {name}")
+        if not isinstance(value, int) and not str(value).isalpha():
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value}")
+        # fetchall() so that PRAGMAs returning a row (e.g. journal_mode) are fully executed.
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+    return settings
+
+
+# An index of init_db.sql, as (table, column).
+INDEX_SQL_PATTERN = re.compile(r"^CREATE INDEX IF NOT EXISTS \w+ ON (\w+)\((\w+)\);$", re.MULTILINE)
+
+
+class OpenAlexConnection(sqlite3.Connection):
+    """
+    The connections opened by open_openalex_db, which know whether their cache uses the compact schema (see compact_ids.py).
+    """
+    compact_ids = False
+
+
+def _compact_schema_sql(sql_commands: str) -> str:
+    """
+    The CREATE TABLE statements of the compact schema (see compact_ids.compact_table_sql), from the tables of init_db.sql.
+    """
+    scratch = sqlite3.connect(":memory:")
+    try:
+        scratch.executescript(sql_commands)
+        statements = []
+        for parent_table, entity_class in table_entity_classes.items():
+            for table in entity_class.TABLES:
+                columns = [(row[1], row[2]) for row in scratch.execute(f"PRAGMA table_info({table})")]
+                statements.append(compact_table_sql(parent_table, table, columns))
+        for table in DERIVED_TABLES:
+            sql = scratch.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+            statements.append(compact_derived_table_sql(table, sql))
+    finally:
+        scratch.close()
+    return "\n\n".join(statements)
+
+
+def _add_missing_columns(conn: sqlite3.Connection, sql_commands: str):
+    """
+    ALTER TABLE ... ADD COLUMN the columns of the schema that the existing tables of the cache lack, e.g. works.updated_date in a cache
+    created by an older version (CREATE TABLE IF NOT EXISTS leaves an existing table unchanged). The existing rows get NULL, or the
+    column's default. A missing primary key column cannot be added: the cache must then be rebuilt.
+    """
+    existing_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not existing_tables:
+        return
+    scratch = sqlite3.connect(":memory:")
+    try:
+        scratch.executescript(sql_commands)
+        tables = [row[0] for row in scratch.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+        for table in tables:
+            if table not in existing_tables:
+                continue
+            existing_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for _, column, declared_type, _, default, pk in scratch.execute(f"PRAGMA table_info({table})").fetchall():
+                if column in existing_columns:
+                    continue
+                if pk:
+                    raise ValueError(f"The {table} table of the cache lacks its primary key column {column}: rebuild the cache")
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declared_type}" + (f" DEFAULT {default}" if default is not None else ""))
+    finally:
+        scratch.close()
+
+
+def _create_schema(conn: sqlite3.Connection, compact_ids: bool = False):
+    """
+    Execute the SQL commands in init_db.sql. Every statement is CREATE ... IF NOT EXISTS, so this is a no-op on an up to date cache.
+    On a cache created by an older version, the missing columns of the existing tables are added first (see _add_missing_columns),
+    then the missing tables and indexes are created.
+    With compact_ids, the tables holding OpenAlex IDs are created first in their compact form, and the indexes on the entity ID of
+    the child tables are left out: their primary key starts with it.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    init_db_sql_path = os.path.join(directory, INIT_DB_SQL_PATH)
+    with open(init_db_sql_path, "r") as f:
+        sql_commands = f.read()
+    if compact_ids:
+        entity_id_columns = {
+            (table, columns[0])
+            for entity_class in table_entity_classes.values()
+            for table, columns in list(entity_class.TABLES.items())[1:]
+        }
+        sql_commands = _compact_schema_sql(sql_commands) + "\n\n" + INDEX_SQL_PATTERN.sub(
+            lambda match: "" if match.groups() in entity_id_columns else match.group(0), sql_commands)
+    _add_missing_columns(conn, sql_commands)
+    conn.executescript(sql_commands)
+
+
+def _has_compact_schema(conn: sqlite3.Connection) -> Optional[bool]:
+    """
+    Whether an existing cache uses the compact schema (works.id is an INTEGER), or None for a new database.
+    """
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(works)")}
+    if not columns:
+        return None
+    return columns["id"].upper() == "INTEGER"
+
+
+def open_openalex_db(file_path: str, profile: Optional[str] = DEFAULT_PROFILE, secondary_indexes: bool = True,
+                     compact_ids: Optional[bool] = None, **pragmas) -> sqlite3.Connection:
+    """
+    Open the OpenAlex SQLite database, keeping its contents if it exists and creating the schema otherwise.
+
+    Args:
+        file_path (str): The database file, or ":memory:".
+        profile (str): The PRAGMA profile, one of PRAGMA_PROFILES ("balanced", "bulk-load", "read-heavy"), or None for SQLite's defaults.
+        secondary_indexes (bool): Create the missing secondary indexes (see indexes.SECONDARY_INDEXES). Pass False before a bulk load.
+        compact_ids (bool): Create the compact schema, storing the OpenAlex IDs as INTEGERs (see compact_ids.py). An existing cache
+            keeps its schema: None (the default) detects it, and a value contradicting it raises a ValueError.
+        **pragmas: PRAGMAs overriding the profile's, e.g. mmap_size=0.
+    """
+    conn = sqlite3.connect(file_path, factory=OpenAlexConnection)
+    existing_schema = _has_compact_schema(conn)
+    if existing_schema is not None and compact_ids is not None and compact_ids != existing_schema:
+        conn.close()
+        raise ValueError(f"{file_path} {'uses' if existing_schema else 'does not use'} the compact schema (compact_ids={existing_schema})")
+    conn.compact_ids = bool(compact_ids) if existing_schema is None else existing_schema
+    apply_pragmas(conn, profile, **pragmas)
+    _create_schema(conn, conn.compact_ids)
+    if secondary_indexes:
+        create_secondary_indexes(conn)
+    return conn
+
+
 # Schema from here: https://docs.openalex.org/download-all-data/upload-to-your-database/load-to-a-relational-database
 #
 # Other API docs:
 # https://docs.openalex.org/api-entities/entities-overview
 # https://docs.openalex.org/how-to-use-the-api/get-single-entities
-def init_openalex_db(file_path: str) -> sqlite3.Connection:
-    """Initialize the OpenAlex SQLite database"""
-    if os.path.exists(file_path) and file_path is not ":memory:":
-        os.remove(file_path)
-    
-    conn = sqlite3.connect(file_path)
-    cursor = conn.cursor()
-
-    # Execute the SQL commands in init_db.sql
-    directory = os.path.dirname(os.path.abspath(__file__))
-    init_db_sql_path = os.path.join(directory, INIT_DB_SQL_PATH)
-    with open(init_db_sql_path, "r") as f:
-        sql_commands = f.read()
+def init_openalex_db(file_path: str, profile: Optional[str] = DEFAULT_PROFILE, overwrite: bool = True, secondary_indexes: bool = True,
+                     compact_ids: Optional[bool] = None, **pragmas) -> sqlite3.Connection:
+    """Initialize the OpenAlex SQLite database. An existing database file is deleted, unless overwrite is False (see open_openalex_db)."""
+    if overwrite and file_path != ":memory:":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(file_path + suffix):
+                os.remove(file_path + suffix)
 
-    cursor.executescript(sql_commands)
-    return conn
\ No newline at end of file
+    return open_openalex_db(file_path, profile, secondary_indexes, compact_ids, **pragmas)
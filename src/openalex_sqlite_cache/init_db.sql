@@ -1,7 +1,7 @@
 -- Schema from here: https://docs.openalex.org/download-all-data/upload-to-your-database/load-to-a-relational-database
 
 -- Authors tables
-CREATE TABLE authors (
+CREATE TABLE IF NOT EXISTS authors (
     id TEXT PRIMARY KEY,
     orcid TEXT,
     display_name TEXT,
@@ -13,7 +13,7 @@ CREATE TABLE authors (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
-CREATE TABLE authors_counts_by_year (
+CREATE TABLE IF NOT EXISTS authors_counts_by_year (
     author_id TEXT,
     year INTEGER,
     works_count INTEGER,
@@ -22,7 +22,7 @@ CREATE TABLE authors_counts_by_year (
     PRIMARY KEY (author_id, year)
 );
 
-CREATE TABLE authors_ids (
+CREATE TABLE IF NOT EXISTS authors_ids (
     author_id TEXT PRIMARY KEY,
     openalex TEXT,
     orcid TEXT,
@@ -33,7 +33,7 @@ CREATE TABLE authors_ids (
 );
 
 -- Topics table
-CREATE TABLE topics (
+CREATE TABLE IF NOT EXISTS topics (
     id TEXT PRIMARY KEY,
     display_name TEXT,
     subfield_id TEXT,
@@ -51,8 +51,36 @@ CREATE TABLE topics (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
+-- Topic taxonomy, normalized from the topics table on topic insert (see topic_taxonomy.py)
+CREATE TABLE IF NOT EXISTS domains (
+    id TEXT PRIMARY KEY,
+    display_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS fields (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    domain_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS subfields (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    field_id TEXT,
+    domain_id TEXT
+);
+
+-- Work counts per taxon and publication year, kept up to date on work and topic insert (see topic_taxonomy.py)
+CREATE TABLE IF NOT EXISTS topic_rollups (
+    level TEXT, -- topic, subfield, field or domain
+    taxon_id TEXT,
+    year INTEGER,
+    works_count INTEGER, -- The number of cached works of the year with a topic in the taxon
+    PRIMARY KEY (level, taxon_id, year)
+) WITHOUT ROWID;
+
 -- Concepts tables
-CREATE TABLE concepts (
+CREATE TABLE IF NOT EXISTS concepts (
     id TEXT PRIMARY KEY,
     wikidata TEXT,
     display_name TEXT,
@@ -66,12 +94,13 @@ CREATE TABLE concepts (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
-CREATE TABLE concepts_ancestors (
+CREATE TABLE IF NOT EXISTS concepts_ancestors (
     concept_id TEXT,
-    ancestor_id TEXT
+    ancestor_id TEXT,
+    ancestor_level INTEGER -- Added: the level of the ancestor in the payload, for the depths of concepts_closure
 );
 
-CREATE TABLE concepts_counts_by_year (
+CREATE TABLE IF NOT EXISTS concepts_counts_by_year (
     concept_id TEXT,
     year INTEGER,
     works_count INTEGER,
@@ -80,7 +109,7 @@ CREATE TABLE concepts_counts_by_year (
     PRIMARY KEY (concept_id, year)
 );
 
-CREATE TABLE concepts_ids (
+CREATE TABLE IF NOT EXISTS concepts_ids (
     concept_id TEXT PRIMARY KEY,
     openalex TEXT,
     wikidata TEXT,
@@ -90,14 +119,23 @@ CREATE TABLE concepts_ids (
     mag INTEGER -- Changed from BIGINT
 );
 
-CREATE TABLE concepts_related_concepts (
+CREATE TABLE IF NOT EXISTS concepts_related_concepts (
     concept_id TEXT,
     related_concept_id TEXT,
     score REAL
 );
 
+-- Transitive closure of concepts_ancestors, kept up to date on concept insert (see concept_hierarchy.py).
+-- One row per (ancestor, descendant) pair, and a (concept, concept, 0) row per cached concept.
+CREATE TABLE IF NOT EXISTS concepts_closure (
+    ancestor_id TEXT,
+    descendant_id TEXT,
+    depth INTEGER, -- The level of the descendant minus the level of the ancestor (the longest chain of ancestor links if a level is unknown)
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
 -- Institutions tables
-CREATE TABLE institutions (
+CREATE TABLE IF NOT EXISTS institutions (
     id TEXT PRIMARY KEY,
     ror TEXT,
     display_name TEXT,
@@ -114,13 +152,13 @@ CREATE TABLE institutions (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
-CREATE TABLE institutions_associated_institutions (
+CREATE TABLE IF NOT EXISTS institutions_associated_institutions (
     institution_id TEXT,
     associated_institution_id TEXT,
     relationship TEXT
 );
 
-CREATE TABLE institutions_counts_by_year (
+CREATE TABLE IF NOT EXISTS institutions_counts_by_year (
     institution_id TEXT,
     year INTEGER,
     works_count INTEGER,
@@ -129,7 +167,7 @@ CREATE TABLE institutions_counts_by_year (
     PRIMARY KEY (institution_id, year)
 );
 
-CREATE TABLE institutions_geo (
+CREATE TABLE IF NOT EXISTS institutions_geo (
     institution_id TEXT PRIMARY KEY,
     city TEXT,
     geonames_city_id TEXT,
@@ -140,7 +178,7 @@ CREATE TABLE institutions_geo (
     longitude REAL
 );
 
-CREATE TABLE institutions_ids (
+CREATE TABLE IF NOT EXISTS institutions_ids (
     institution_id TEXT PRIMARY KEY,
     openalex TEXT,
     ror TEXT,
@@ -151,7 +189,7 @@ CREATE TABLE institutions_ids (
 );
 
 -- Publishers tables
-CREATE TABLE publishers (
+CREATE TABLE IF NOT EXISTS publishers (
     id TEXT PRIMARY KEY,
     display_name TEXT,
     alternate_titles TEXT, -- Changed from JSON
@@ -164,7 +202,7 @@ CREATE TABLE publishers (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
-CREATE TABLE publishers_counts_by_year (
+CREATE TABLE IF NOT EXISTS publishers_counts_by_year (
     publisher_id TEXT,
     year INTEGER,
     works_count INTEGER,
@@ -173,7 +211,7 @@ CREATE TABLE publishers_counts_by_year (
     PRIMARY KEY (publisher_id, year)
 );
 
-CREATE TABLE publishers_ids (
+CREATE TABLE IF NOT EXISTS publishers_ids (
     publisher_id TEXT,
     openalex TEXT,
     ror TEXT,
@@ -181,7 +219,7 @@ CREATE TABLE publishers_ids (
 );
 
 -- Sources tables
-CREATE TABLE sources (
+CREATE TABLE IF NOT EXISTS sources (
     id TEXT PRIMARY KEY,
     issn_l TEXT,
     issn TEXT, -- Changed from JSON
@@ -196,7 +234,7 @@ CREATE TABLE sources (
     updated_date TEXT -- Changed from TIMESTAMP
 );
 
-CREATE TABLE sources_counts_by_year (
+CREATE TABLE IF NOT EXISTS sources_counts_by_year (
     source_id TEXT,
     year INTEGER,
     works_count INTEGER,
@@ -205,7 +243,7 @@ CREATE TABLE sources_counts_by_year (
     PRIMARY KEY (source_id, year)
 );
 
-CREATE TABLE sources_ids (
+CREATE TABLE IF NOT EXISTS sources_ids (
     source_id TEXT,
     openalex TEXT,
     issn_l TEXT,
@@ -216,7 +254,7 @@ CREATE TABLE sources_ids (
 );
 
 -- Works tables
-CREATE TABLE works (
+CREATE TABLE IF NOT EXISTS works (
     id TEXT PRIMARY KEY,
     doi TEXT,
     title TEXT,
@@ -229,10 +267,11 @@ CREATE TABLE works (
     is_paratext INTEGER, -- Changed from BOOLEAN
     cited_by_api_url TEXT,
     abstract_inverted_index TEXT, -- Changed from JSON
-    language TEXT
+    language TEXT,
+    updated_date TEXT -- Added: not in the OpenAlex relational schema, needed to compare with the web API
 );
 
-CREATE TABLE works_primary_locations (
+CREATE TABLE IF NOT EXISTS works_primary_locations (
     work_id TEXT,
     source_id TEXT,
     landing_page_url TEXT,
@@ -242,7 +281,7 @@ CREATE TABLE works_primary_locations (
     license TEXT
 );
 
-CREATE TABLE works_locations (
+CREATE TABLE IF NOT EXISTS works_locations (
     work_id TEXT,
     source_id TEXT,
     landing_page_url TEXT,
@@ -252,7 +291,7 @@ CREATE TABLE works_locations (
     license TEXT
 );
 
-CREATE TABLE works_best_oa_locations (
+CREATE TABLE IF NOT EXISTS works_best_oa_locations (
     work_id TEXT,
     source_id TEXT,
     landing_page_url TEXT,
@@ -262,7 +301,7 @@ CREATE TABLE works_best_oa_locations (
     license TEXT
 );
 
-CREATE TABLE works_authorships (
+CREATE TABLE IF NOT EXISTS works_authorships (
     work_id TEXT,
     author_position TEXT,
     author_id TEXT,
@@ -270,7 +309,7 @@ CREATE TABLE works_authorships (
     -- raw_affiliation_string TEXT # Removed from the schema because it's confusing. Work['authorships'] has authorship['institutions'] and authorship['affiliations']. Omitting this allowed me to use ['institutions'] only.
 );
 
-CREATE TABLE works_biblio (
+CREATE TABLE IF NOT EXISTS works_biblio (
     work_id TEXT PRIMARY KEY,
     volume TEXT,
     issue TEXT,
@@ -278,19 +317,19 @@ CREATE TABLE works_biblio (
     last_page TEXT
 );
 
-CREATE TABLE works_topics (
+CREATE TABLE IF NOT EXISTS works_topics (
     work_id TEXT,
     topic_id TEXT,
     score REAL
 );
 
-CREATE TABLE works_concepts (
+CREATE TABLE IF NOT EXISTS works_concepts (
     work_id TEXT,
     concept_id TEXT,
     score REAL
 );
 
-CREATE TABLE works_ids (
+CREATE TABLE IF NOT EXISTS works_ids (
     work_id TEXT PRIMARY KEY,
     openalex TEXT,
     doi TEXT,
@@ -299,7 +338,7 @@ CREATE TABLE works_ids (
     pmcid TEXT
 );
 
-CREATE TABLE works_mesh (
+CREATE TABLE IF NOT EXISTS works_mesh (
     work_id TEXT,
     descriptor_ui TEXT,
     descriptor_name TEXT,
@@ -308,7 +347,7 @@ CREATE TABLE works_mesh (
     is_major_topic INTEGER -- Changed from BOOLEAN
 );
 
-CREATE TABLE works_open_access (
+CREATE TABLE IF NOT EXISTS works_open_access (
     work_id TEXT PRIMARY KEY,
     is_oa INTEGER, -- Changed from BOOLEAN
     oa_status TEXT,
@@ -316,22 +355,139 @@ CREATE TABLE works_open_access (
     any_repository_has_fulltext INTEGER -- Changed from BOOLEAN
 );
 
-CREATE TABLE works_referenced_works (
+CREATE TABLE IF NOT EXISTS works_referenced_works (
     work_id TEXT,
     referenced_work_id TEXT
 );
 
-CREATE TABLE works_related_works (
+CREATE TABLE IF NOT EXISTS works_related_works (
     work_id TEXT,
     related_work_id TEXT
 );
 
--- TODO: Create tables for funders
+-- Funders tables (not part of the OpenAlex relational schema; columns follow the web API payload)
+CREATE TABLE IF NOT EXISTS funders (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    alternate_titles TEXT, -- JSON
+    country_code TEXT,
+    description TEXT,
+    homepage_url TEXT,
+    image_url TEXT,
+    image_thumbnail_url TEXT,
+    grants_count INTEGER,
+    works_count INTEGER,
+    cited_by_count INTEGER,
+    updated_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS funders_counts_by_year (
+    funder_id TEXT,
+    year INTEGER,
+    works_count INTEGER,
+    cited_by_count INTEGER,
+    PRIMARY KEY (funder_id, year)
+);
+
+CREATE TABLE IF NOT EXISTS funders_ids (
+    funder_id TEXT PRIMARY KEY,
+    openalex TEXT,
+    ror TEXT,
+    wikidata TEXT,
+    crossref TEXT,
+    doi TEXT
+);
+
+-- When each entity was last fetched from (or checked against) the web API, for freshness policies
+CREATE TABLE IF NOT EXISTS refresh_log (
+    entity_type TEXT, -- Name of the entity's parent table, e.g. "authors"
+    id TEXT,
+    refreshed_date TEXT,
+    PRIMARY KEY (entity_type, id)
+) WITHOUT ROWID;
+
+-- Snapshot partitions (data/<entity>/updated_date=YYYY-MM-DD/part_*.gz) that have been loaded
+CREATE TABLE IF NOT EXISTS snapshot_partitions (
+    partition TEXT PRIMARY KEY, -- Path relative to the snapshot's data directory
+    entity_type TEXT,
+    record_count INTEGER,
+    applied_date TEXT
+);
+
+-- Normalized external IDs (DOI, ORCID, ROR, ISSN, PMID) of the cached entities, for resolve_ids
+CREATE TABLE IF NOT EXISTS external_ids (
+    kind TEXT, -- "doi", "orcid", "ror", "issn" or "pmid"
+    value TEXT,
+    openalex_id TEXT,
+    PRIMARY KEY (kind, value)
+) WITHOUT ROWID;
+
+-- The IDs that the web API answered with another entity (merged entities), for get_or_fetch
+CREATE TABLE IF NOT EXISTS merged_ids (
+    id TEXT PRIMARY KEY, -- The requested ID, short form
+    merged_into TEXT -- The short ID of the entity it was merged into
+) WITHOUT ROWID;
+
+-- Full API payloads, compressed (optional, see raw_payloads.py)
+CREATE TABLE IF NOT EXISTS raw_payloads (
+    entity_type TEXT, -- Name of the entity's parent table, e.g. "works"
+    id TEXT,
+    codec TEXT, -- "zlib" or "zstd"
+    dictionary_id INTEGER, -- The raw_payload_dictionaries row the payload was compressed with, if any
+    payload BLOB,
+    PRIMARY KEY (entity_type, id)
+);
+
+CREATE TABLE IF NOT EXISTS raw_payload_dictionaries (
+    dictionary_id INTEGER PRIMARY KEY,
+    entity_type TEXT,
+    codec TEXT,
+    dictionary BLOB
+);
+
+-- The entity types whose raw payloads are stored, and how
+CREATE TABLE IF NOT EXISTS raw_payload_settings (
+    entity_type TEXT PRIMARY KEY,
+    codec TEXT,
+    dictionary_id INTEGER,
+    level INTEGER
+);
 
 -- Indexes
-CREATE INDEX concepts_ancestors_concept_id_idx ON concepts_ancestors(concept_id);
-CREATE INDEX concepts_related_concepts_concept_id_idx ON concepts_related_concepts(concept_id);
-CREATE INDEX concepts_related_concepts_related_concept_id_idx ON concepts_related_concepts(related_concept_id);
-CREATE INDEX works_primary_locations_work_id_idx ON works_primary_locations(work_id);
-CREATE INDEX works_locations_work_id_idx ON works_locations(work_id);
-CREATE INDEX works_best_oa_locations_work_id_idx ON works_best_oa_locations(work_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS refresh_log_refreshed_date_idx ON refresh_log(entity_type, refreshed_date);
+CREATE INDEX IF NOT EXISTS external_ids_openalex_id_idx ON external_ids(openalex_id);
+CREATE INDEX IF NOT EXISTS merged_ids_merged_into_idx ON merged_ids(merged_into);
+CREATE INDEX IF NOT EXISTS concepts_ancestors_concept_id_idx ON concepts_ancestors(concept_id);
+CREATE INDEX IF NOT EXISTS topics_subfield_id_idx ON topics(subfield_id);
+CREATE INDEX IF NOT EXISTS topics_field_id_idx ON topics(field_id);
+CREATE INDEX IF NOT EXISTS topics_domain_id_idx ON topics(domain_id);
+CREATE INDEX IF NOT EXISTS fields_domain_id_idx ON fields(domain_id);
+CREATE INDEX IF NOT EXISTS subfields_field_id_idx ON subfields(field_id);
+CREATE INDEX IF NOT EXISTS concepts_closure_descendant_id_idx ON concepts_closure(descendant_id);
+CREATE INDEX IF NOT EXISTS concepts_related_concepts_concept_id_idx ON concepts_related_concepts(concept_id);
+CREATE INDEX IF NOT EXISTS concepts_related_concepts_related_concept_id_idx ON concepts_related_concepts(related_concept_id);
+CREATE INDEX IF NOT EXISTS works_primary_locations_work_id_idx ON works_primary_locations(work_id);
+CREATE INDEX IF NOT EXISTS works_locations_work_id_idx ON works_locations(work_id);
+CREATE INDEX IF NOT EXISTS works_best_oa_locations_work_id_idx ON works_best_oa_locations(work_id);
+-- Child tables without a primary key on their entity ID, so that replacing an entity can delete its old rows quickly
+CREATE INDEX IF NOT EXISTS institutions_associated_institutions_institution_id_idx ON institutions_associated_institutions(institution_id);
+CREATE INDEX IF NOT EXISTS publishers_ids_publisher_id_idx ON publishers_ids(publisher_id);
+CREATE INDEX IF NOT EXISTS sources_ids_source_id_idx ON sources_ids(source_id);
+CREATE INDEX IF NOT EXISTS works_authorships_work_id_idx ON works_authorships(work_id);
+CREATE INDEX IF NOT EXISTS works_topics_work_id_idx ON works_topics(work_id);
+CREATE INDEX IF NOT EXISTS works_concepts_work_id_idx ON works_concepts(work_id);
+CREATE INDEX IF NOT EXISTS works_mesh_work_id_idx ON works_mesh(work_id);
+CREATE INDEX IF NOT EXISTS works_referenced_works_work_id_idx ON works_referenced_works(work_id);
+CREATE INDEX IF NOT EXISTS works_related_works_work_id_idx ON works_related_works(work_id);
+-- Views joining the tables that analytics read together (see export.py)
+CREATE VIEW IF NOT EXISTS works_authorships_view AS
+SELECT a.work_id, w.publication_year, a.author_position, a.author_id, au.display_name AS author_display_name, a.institution_id
+FROM works_authorships a
+JOIN works w ON w.id = a.work_id
+LEFT JOIN authors au ON au.id = a.author_id;
+
+CREATE VIEW IF NOT EXISTS works_citations_view AS
+SELECT r.work_id, w.publication_year, r.referenced_work_id, rw.publication_year AS referenced_publication_year
+FROM works_referenced_works r
+JOIN works w ON w.id = r.work_id
+LEFT JOIN works rw ON rw.id = r.referenced_work_id;
@@ -1,156 +1,155 @@
 import sqlite3
-from typing import Union, List
-import json
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from openalex_sqlite_cache.entity import Entity
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
 
 class Institution(Entity):
 
+    TABLES = {
+        "institutions": ("id", "ror", "display_name", "country_code", "type", "homepage_url", "image_url", "image_thumbnail_url", "display_name_acronyms", "display_name_alternatives", "works_count", "cited_by_count", "works_api_url", "updated_date"),
+        "institutions_associated_institutions": ("institution_id", "associated_institution_id", "relationship"),
+        "institutions_counts_by_year": ("institution_id", "year", "works_count", "cited_by_count"),
+        "institutions_geo": ("institution_id", "city", "geonames_city_id", "region", "country_code", "country", "latitude", "longitude"),
+        "institutions_ids": ("institution_id", "openalex", "ror", "grid", "wikipedia", "wikidata", "mag"),
+    }
+
+    # Counts by year are read oldest year first.
+    ORDER_BY = {"institutions_counts_by_year": "year DESC"}
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "associated_institutions": "institutions_associated_institutions",
+        "counts_by_year": "institutions_counts_by_year",
+        "geo": "institutions_geo",
+        "ids": "institutions_ids",
+    }
+
+    # The external IDs to index in external_ids, as kind: [(table, column)] (see identifiers.py).
+    EXTERNAL_IDS = {"ror": [("institutions", "ror")]}
+
     def __init__(self, institution: Union[pyalex.Institution, dict]):
         super().__init__(institution)
 
     @staticmethod
-    def create_institutions_from_web_api_by_ids(conn: sqlite3.Connection, institution_ids: Union[List[str], str]) -> "Institution":
+    def create_institutions_from_web_api_by_ids(conn: sqlite3.Connection, institution_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Institution":
         """
         Query the OpenAlex web API for a particular institution(s) to create the pyalex.Institution dict. Insert the institution(s) into the database.
         """
-        if not isinstance(institution_ids, list):
-            institution_ids = [institution_ids]
-        pyalexInstitutions = []
-        for institution_id in institution_ids:
-            tmpInstitution = pyalex.Institutions()[institution_id]
-            pyalexInstitutions.append(tmpInstitution)
-        assert len(pyalexInstitutions) == len(institution_ids)
-        institutions = [Institution(i) for i in pyalexInstitutions]
-        return_institutions = []
-        for institution in institutions:
-            try:
-                institution.insert_or_replace_in_db(conn)
-                return_institutions.append(institution)
-            except sqlite3.IntegrityError as e:
-                # print(f"Error inserting institution {institution.institution_id} into database: {e}")
-                pass
-        return return_institutions
+        return Institution._create_from_web_api_by_ids(conn, institution_ids, transport=transport, engine=engine)
     
     @staticmethod
-    def read_institutions_from_db_by_ids(conn: sqlite3.Connection, institution_ids: Union[List[str], str]) -> "Institution":
+    def iter_institutions_from_db_by_ids(conn: sqlite3.Connection, institution_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Institution"]:
+        """
+        Query the database for institutions to create their pyalex.Institution dicts, in the order of the IDs (unknown IDs are left out).
+        The institutions are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
+        """
+        return Institution._iter_from_db_by_ids(conn, institution_ids, chunk_size, lazy, fields, compact)
+
+    @staticmethod
+    def read_institutions_from_db_by_ids(conn: sqlite3.Connection, institution_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Institution"]:
         """
-        Query the database for a particular institution to create its pyalex.Institution dict. 
+        Query the database for institutions to create their pyalex.Institution dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, only the institutions table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the institutions only have those fields, and only their columns and tables are read.
+        With compact=True, the institutions are compact InstitutionRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
         """
-        if not isinstance(institution_ids, list):
-            institution_ids = [institution_ids]        
-        cursor = conn.cursor()
+        return list(Institution.iter_institutions_from_db_by_ids(conn, institution_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_institution: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Institution":
+        """
+        Build the institution from its row of the institutions table and the child rows grouped by institution ID (see Entity._iter_rows).
+        """
+        institution_id = result_institution[0]
+        institution_dict = {}
+        # Build the institution_dict
         # INSTITUTIONS
-        raw_sql = "SELECT id, ror, display_name, country_code, type, homepage_url, image_url, image_thumbnail_url, display_name_acronyms, display_name_alternatives, works_count, cited_by_count, works_api_url, updated_date FROM institutions WHERE id IN ({})".format(','.join('?' * len(institution_ids)))
-        institution_ids_tuple = tuple([Institution._remove_base_url(institution_id) for institution_id in institution_ids])
-        cursor.execute(raw_sql, institution_ids_tuple)
-        result_institutions = cursor.fetchall()        
+        institution_dict["id"] = Institution._prepend_base_url(institution_id)
+        institution_dict["ror"] = result_institution[1]
+        institution_dict["display_name"] = result_institution[2]
+        institution_dict["country_code"] = result_institution[3]
+        institution_dict["type"] = result_institution[4]
+        institution_dict["homepage_url"] = Institution._prepend_base_url(result_institution[5])
+        institution_dict["image_url"] = Institution._prepend_base_url(result_institution[6])
+        institution_dict["image_thumbnail_url"] = Institution._prepend_base_url(result_institution[7])
+        institution_dict["display_name_acronyms"] = json_codec.loads(result_institution[8]) if result_institution[8] is not None else None
+        institution_dict["display_name_alternatives"] = json_codec.loads(result_institution[9]) if result_institution[9] is not None else None
+        institution_dict["works_count"] = result_institution[10]
+        institution_dict["cited_by_count"] = result_institution[11]
+        institution_dict["works_api_url"] = Institution._prepend_base_url(result_institution[12])
+        institution_dict["updated_date"] = result_institution[13]
 
         # INSTITUTIONS_ASSOCIATED_INSTITUTIONS
-        raw_sql = "SELECT institution_id, associated_institution_id, relationship FROM institutions_associated_institutions WHERE institution_id IN ({})".format(','.join('?' * len(institution_ids)))
-        cursor.execute(raw_sql, institution_ids_tuple)
-        result_institutions_associated_institutions = cursor.fetchall()
+        institution_dict["associated_institutions"] = []
+        for result_associated_institution in child_rows["institutions_associated_institutions"].get(institution_id, []):
+            associated_institution = {}
+            associated_institution["id"] = Institution._prepend_base_url(result_associated_institution[1])
+            associated_institution["relationship"] = result_associated_institution[2]
+            institution_dict["associated_institutions"].append(associated_institution)
 
         # INSTITUTIONS_COUNTS_BY_YEAR
-        raw_sql = "SELECT institution_id, year, works_count, cited_by_count FROM institutions_counts_by_year WHERE institution_id IN ({})".format(','.join('?' * len(institution_ids)))
-        cursor.execute(raw_sql, institution_ids_tuple)
-        result_institutions_counts_by_year = cursor.fetchall()
+        institution_dict["counts_by_year"] = []
+        for count in child_rows["institutions_counts_by_year"].get(institution_id, []):
+            institution_count_by_year = {
+                "year": count[1],
+                "works_count": count[2],
+                "cited_by_count": count[3]
+            }
+            institution_dict["counts_by_year"].append(institution_count_by_year)
 
         # INSTITUTIONS_GEO
-        raw_sql = "SELECT institution_id, city, geonames_city_id, region, country_code, country, latitude, longitude FROM institutions_geo WHERE institution_id IN ({})".format(','.join('?' * len(institution_ids)))
-        cursor.execute(raw_sql, institution_ids_tuple)
-        result_institutions_geo = cursor.fetchall()
+        result_geo = (child_rows["institutions_geo"].get(institution_id) or [(institution_id,) + (None,) * 7])[0]
+        institution_dict["geo"] = {
+            "city": result_geo[1],
+            "geonames_city_id": result_geo[2],
+            "region": result_geo[3],
+            "country_code": result_geo[4],
+            "country": result_geo[5],
+            "latitude": result_geo[6],
+            "longitude": result_geo[7]
+        }
 
         # INSTITUTIONS_IDS
-        raw_sql = "SELECT institution_id, openalex, ror, grid, wikipedia, wikidata, mag FROM institutions_ids WHERE institution_id IN ({})".format(','.join('?' * len(institution_ids)))
-        cursor.execute(raw_sql, institution_ids_tuple)
-        result_institutions_ids = cursor.fetchall()
-
-        assert len(result_institutions) == len(result_institutions_ids)
-        institutions = []
-        for i in range(len(result_institutions)):
-            institution_dict = {}        
-            # Build the institution_dict
-            # INSTITUTIONS
-            institution_dict["id"] = Institution._prepend_base_url(result_institutions[i][0])
-            institution_dict["ror"] = result_institutions[i][1]
-            institution_dict["display_name"] = result_institutions[i][2]
-            institution_dict["country_code"] = result_institutions[i][3]
-            institution_dict["type"] = result_institutions[i][4]
-            institution_dict["homepage_url"] = Institution._prepend_base_url(result_institutions[i][5])
-            institution_dict["image_url"] = Institution._prepend_base_url(result_institutions[i][6])
-            institution_dict["image_thumbnail_url"] = Institution._prepend_base_url(result_institutions[i][7])
-            institution_dict["display_name_acronyms"] = json.loads(result_institutions[i][8])
-            institution_dict["display_name_alternatives"] = json.loads(result_institutions[i][9])            
-            institution_dict["works_count"] = result_institutions[i][10]
-            institution_dict["cited_by_count"] = result_institutions[i][11]
-            institution_dict["works_api_url"] = Institution._prepend_base_url(result_institutions[i][12])
-            institution_dict["updated_date"] = result_institutions[i][13]
-
-            # INSTITUTIONS_ASSOCIATED_INSTITUTIONS
-            institution_dict["associated_institutions"] = []
-            for j in range(len(result_institutions_associated_institutions)):                
-                associated_institution = {}
-                associated_institution["id"] = Institution._prepend_base_url(result_institutions_associated_institutions[j][1])
-                associated_institution["relationship"] = result_institutions_associated_institutions[j][2]
-                institution_dict["associated_institutions"].append(associated_institution)
-
-            # INSTITUTIONS_COUNTS_BY_YEAR
-            institution_dict["counts_by_year"] = []
-            for j in range(len(result_institutions_counts_by_year)):
-                institution_count_by_year = {
-                    "year": result_institutions_counts_by_year[j][1],
-                    "works_count": result_institutions_counts_by_year[j][2],
-                    "cited_by_count": result_institutions_counts_by_year[j][3]
-                }
-                institution_dict["counts_by_year"].append(institution_count_by_year)
-
-            # INSTITUTIONS_GEO
-            institution_dict["geo"] = {
-                "city": result_institutions_geo[i][1],
-                "geonames_city_id": result_institutions_geo[i][2],
-                "region": result_institutions_geo[i][3],
-                "country_code": result_institutions_geo[i][4],
-                "country": result_institutions_geo[i][5],
-                "latitude": result_institutions_geo[i][6],
-                "longitude": result_institutions_geo[i][7]
-            }
-
-            # INSTITUTIONS_IDS
-            institution_dict["ids"] = {}
-            institution_dict["ids"]["openalex"] = result_institutions_ids[i][1]
-            institution_dict["ids"]["ror"] = result_institutions_ids[i][2]
-            institution_dict["ids"]["grid"] = result_institutions_ids[i][3]
-            institution_dict["ids"]["wikipedia"] = result_institutions_ids[i][4]
-            institution_dict["ids"]["wikidata"] = result_institutions_ids[i][5]
-            institution_dict["ids"]["mag"] = result_institutions_ids[i][6]
-
-            institutions.append(Institution(institution_dict))
-        assert len(institutions) == len(institution_ids)
-
-        return institutions
+        institution_dict["ids"] = {}
+        for result_institution_ids in child_rows["institutions_ids"].get(institution_id, [])[:1]:
+            institution_dict["ids"]["openalex"] = result_institution_ids[1]
+            institution_dict["ids"]["ror"] = result_institution_ids[2]
+            institution_dict["ids"]["grid"] = result_institution_ids[3]
+            institution_dict["ids"]["wikipedia"] = result_institution_ids[4]
+            institution_dict["ids"]["wikidata"] = result_institution_ids[5]
+            institution_dict["ids"]["mag"] = result_institution_ids[6]
+
+        return Institution(institution_dict)
     
+    read_from_db_by_ids = read_institutions_from_db_by_ids
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the institution from the database.
         """
         institution_id = self.id
-        conn.execute("DELETE FROM institutions WHERE id=?", (institution_id,))
-        conn.execute("DELETE FROM institutions_associated_institutions WHERE institution_id=?", (institution_id,))
-        conn.execute("DELETE FROM institutions_counts_by_year WHERE institution_id=?", (institution_id,))
-        conn.execute("DELETE FROM institutions_geo WHERE institution_id=?", (institution_id,))
-        conn.execute("DELETE FROM institutions_ids WHERE institution_id=?", (institution_id,))
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [institution_id])
+        conn.execute("DELETE FROM institutions WHERE id=?", (stored_id,))
+        conn.execute("DELETE FROM institutions_associated_institutions WHERE institution_id=?", (stored_id,))
+        conn.execute("DELETE FROM institutions_counts_by_year WHERE institution_id=?", (stored_id,))
+        conn.execute("DELETE FROM institutions_geo WHERE institution_id=?", (stored_id,))
+        conn.execute("DELETE FROM institutions_ids WHERE institution_id=?", (stored_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(institution: dict) -> Dict[str, List[tuple]]:
         """
-        Insert the institution into the database.
+        Flatten the institution into the rows of the institutions tables.
         """
-        institution = self.data
+        institution_id = Institution._remove_base_url(institution['id'])
         # INSTITUTIONS
-        insert_tuple = (
-            Institution._remove_base_url(institution['id']), 
+        institutions_rows = [(
+            institution_id, 
             institution['ror'], 
             institution['display_name'], 
             institution['country_code'], 
@@ -158,68 +157,58 @@ class Institution(Entity):
             institution['homepage_url'], 
             institution['image_url'], 
             institution['image_thumbnail_url'], 
-            json.dumps(institution['display_name_acronyms']),
-            json.dumps(institution['display_name_alternatives']),
+            json_codec.dumps(institution['display_name_acronyms']),
+            json_codec.dumps(institution['display_name_alternatives']),
             institution['works_count'],
             institution['cited_by_count'],
             institution['works_api_url'],
             institution['updated_date']
-        )
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO institutions (id, ror, display_name, country_code, type, homepage_url, image_url, image_thumbnail_url, display_name_acronyms, display_name_alternatives, works_count, cited_by_count, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        )]
 
         # INSTITUTIONS_ASSOCIATED_INSTITUTIONS
-        for associated_institution in institution['associated_institutions']:
-            insert_tuple = (
-                Institution._remove_base_url(institution['id']), 
-                Institution._remove_base_url(associated_institution['id']),
-                associated_institution['relationship']
-            )
-            conn.execute(
-                "REPLACE INTO institutions_associated_institutions (institution_id, associated_institution_id, relationship) VALUES (?, ?, ?)", insert_tuple
-            )
+        institutions_associated_institutions_rows = [(
+            institution_id, 
+            Institution._remove_base_url(associated_institution['id']),
+            associated_institution['relationship']
+        ) for associated_institution in institution['associated_institutions']]
 
         # INSTITUTIONS_COUNTS_BY_YEAR
-        for count_by_year in institution['counts_by_year']:
-            insert_tuple = (
-                Institution._remove_base_url(institution['id']), 
-                count_by_year['year'],
-                count_by_year['works_count'],
-                count_by_year['cited_by_count']
-            )
-            conn.execute(
-                "REPLACE INTO institutions_counts_by_year (institution_id, year, works_count, cited_by_count) VALUES (?, ?, ?, ?)", insert_tuple
-            )
+        institutions_counts_by_year_rows = [(
+            institution_id, 
+            count_by_year['year'],
+            count_by_year['works_count'],
+            count_by_year['cited_by_count']
+        ) for count_by_year in institution['counts_by_year']]
 
         # INSTITUTIONS_GEO
-        insert_tuple = (
-            Institution._remove_base_url(institution['id']), 
-            institution['geo']['city'],
-            institution['geo']['geonames_city_id'],
-            institution['geo']['region'],
-            institution['geo']['country_code'],
-            institution['geo']['country'],
-            institution['geo']['latitude'],
-            institution['geo']['longitude']
-        )
-        conn.execute(
-            "REPLACE INTO institutions_geo (institution_id, city, geonames_city_id, region, country_code, country, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", insert_tuple
-        )
+        geo = institution['geo']
+        institutions_geo_rows = [(
+            institution_id, 
+            geo['city'],
+            geo['geonames_city_id'],
+            geo['region'],
+            geo['country_code'],
+            geo['country'],
+            geo['latitude'],
+            geo['longitude']
+        )]
 
         # INSTITUTIONS_IDS
-        insert_tuple = (
-            Institution._remove_base_url(institution['id']), 
-            institution['ids']['openalex'],
-            institution['ids']['ror'],
-            institution['ids']['grid'],
-            institution['ids']['wikipedia'],
-            institution['ids']['wikidata'],
-            institution['ids']['mag']
-        )
-        conn.execute(
-            "REPLACE INTO institutions_ids (institution_id, openalex, ror, grid, wikipedia, wikidata, mag) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
-        )
-
-        conn.commit()
\ No newline at end of file
+        ids = institution['ids']
+        institutions_ids_rows = [(
+            institution_id, 
+            ids['openalex'],
+            ids.get('ror'),
+            ids.get('grid'),
+            ids.get('wikipedia'),
+            ids.get('wikidata'),
+            ids.get('mag')
+        )]
+
+        return {
+            "institutions": institutions_rows,
+            "institutions_associated_institutions": institutions_associated_institutions_rows,
+            "institutions_counts_by_year": institutions_counts_by_year_rows,
+            "institutions_geo": institutions_geo_rows,
+            "institutions_ids": institutions_ids_rows,
+        }
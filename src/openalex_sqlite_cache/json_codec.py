@@ -0,0 +1,82 @@
+import json
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: pip install orjson
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Optional dependency: pip install msgspec
+    msgspec = None
+
+# The JSON libraries that can encode and decode the JSON columns, raw payloads and snapshot records, fastest first.
+# They all write compact JSON that any of them reads back, so the backend can be changed on an existing cache.
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _stdlib_dumpb(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _make_backend(name: str) -> Tuple[Callable[[Any], str], Callable[[Any], bytes], Callable[[Union[str, bytes]], Any]]:
+    """
+    The (dumps, dumpb, loads) functions of a backend. The fast backends fall back to the json module for the values they cannot encode,
+    e.g. integers larger than 64 bits.
+    """
+    if name == "json":
+        return _stdlib_dumps, _stdlib_dumpb, json.loads
+    if name == "orjson":
+        if orjson is None:
+            raise ImportError("The orjson backend requires the orjson package: pip install orjson")
+
+        def orjson_dumpb(obj: Any) -> bytes:
+            try:
+                return orjson.dumps(obj)
+            except TypeError:
+                return _stdlib_dumpb(obj)
+        return lambda obj: orjson_dumpb(obj).decode("utf-8"), orjson_dumpb, orjson.loads
+    if name == "msgspec":
+        if msgspec is None:
+            raise ImportError("The msgspec backend requires the msgspec package: pip install msgspec")
+        encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+
+        def msgspec_dumpb(obj: Any) -> bytes:
+            try:
+                return encoder.encode(obj)
+            except (TypeError, OverflowError):
+                return _stdlib_dumpb(obj)
+        return lambda obj: msgspec_dumpb(obj).decode("utf-8"), msgspec_dumpb, decoder.decode
+    raise ValueError(f"Unknown JSON backend: {name}. Choose from {list(JSON_BACKENDS)}")
+
+
+def available_json_backends() -> Dict[str, bool]:
+    """Whether each JSON backend can be used, i.e. its package is installed."""
+    return {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+
+
+def set_json_backend(name: Optional[str] = None) -> str:
+    """
+    Use a JSON backend ("orjson", "msgspec" or "json") for all the JSON encoding and decoding of the cache.
+    With no name, use the fastest one installed. Returns the name of the backend in use.
+    Call dumps/loads/dumpb through the module (json_codec.dumps), so that the calls follow the backend.
+    """
+    global backend, dumps, dumpb, loads
+    if name is None:
+        name = next(n for n, available in available_json_backends().items() if available)
+    dumps, dumpb, loads = _make_backend(name)
+    backend = name
+    return backend
+
+
+# Set by set_json_backend: the backend in use, and its functions to encode a value to a JSON string or UTF-8 bytes and to decode JSON.
+backend: str
+dumps: Callable[[Any], str]
+dumpb: Callable[[Any], bytes]
+loads: Callable[[Union[str, bytes]], Any]
+set_json_backend()
@@ -0,0 +1,184 @@
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.get_items_from_api import endpoint_types_dict
+
+# The eviction policies of a memory tier: evict the least recently used entity, or the least frequently used one
+# (the least recently used among them on a tie).
+EVICTION_POLICIES = ("lru", "lfu")
+
+# The memory tier of each connection (see attach_memory_tier), as id(conn): (conn, tier). sqlite3.Connection has no weak references,
+# so the connection is kept alive until detach_memory_tier.
+_memory_tiers = {}
+
+
+class _Store:
+    """
+    The cached entities of one entity type, bounded by a number of entries and/or an estimated size in bytes.
+    """
+
+    def __init__(self, max_entries: Optional[int], max_bytes: Optional[int], policy: str):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        # entity_id: (entity, size), least recently used first.
+        self.entries = OrderedDict()
+        # For LFU: entity_id: use count, and count: entity IDs with that count, least recently used first.
+        self.counts = {}
+        self.ids_by_count = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, entity_id: str):
+        entry = self.entries.get(entity_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(entity_id)
+        if self.policy == "lfu":
+            self._count_use(entity_id)
+        return entry[0]
+
+    def _count_use(self, entity_id: str):
+        count = self.counts[entity_id]
+        self._forget_count(entity_id, count)
+        self.counts[entity_id] = count + 1
+        self.ids_by_count.setdefault(count + 1, OrderedDict())[entity_id] = None
+
+    def _forget_count(self, entity_id: str, count: int):
+        ids = self.ids_by_count[count]
+        del ids[entity_id]
+        if not ids:
+            del self.ids_by_count[count]
+
+    def put(self, entity_id: str, entity):
+        if self.max_entries == 0:
+            return
+        size = len(json_codec.dumpb(entity.data)) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.remove(entity_id)
+        while self.entries and ((self.max_entries is not None and len(self.entries) >= self.max_entries)
+                                or (self.max_bytes is not None and self.size + size > self.max_bytes)):
+            self._evict()
+        self.entries[entity_id] = (entity, size)
+        self.size += size
+        if self.policy == "lfu":
+            self.counts[entity_id] = 1
+            self.ids_by_count.setdefault(1, OrderedDict())[entity_id] = None
+
+    def _evict(self):
+        if self.policy == "lfu":
+            entity_id = next(iter(self.ids_by_count[min(self.ids_by_count)]))
+        else:
+            entity_id = next(iter(self.entries))
+        self.remove(entity_id)
+        self.evictions += 1
+
+    def remove(self, entity_id: str):
+        entry = self.entries.pop(entity_id, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        if self.policy == "lfu":
+            self._forget_count(entity_id, self.counts.pop(entity_id))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries), "bytes": self.size}
+
+
+class MemoryTier:
+    """
+    A bounded in-process cache of assembled entities, consulted by the reads before the database (see attach_memory_tier).
+    Each entity type (the name of its parent table, e.g. "institutions") has its own budget of entries and/or bytes, and the
+    entities over budget are evicted LRU or LFU. The size of an entity is estimated as the length of its JSON encoding.
+
+    The entities are shared between the reads that hit them: treat their data as read-only.
+
+    Args:
+        max_entries (int): The default number of entities per entity type. None for no limit, 0 to not cache the type.
+        max_bytes (int): The default estimated size of the entities per entity type, in bytes. None for no limit.
+        policy (str): "lru" or "lfu" (see EVICTION_POLICIES).
+        budgets (dict): Budgets per entity type replacing the defaults, e.g. {"works": {"max_entries": 0}, "institutions": {"max_entries": 50000}}.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 10000, max_bytes: Optional[int] = None, policy: str = "lru",
+                 budgets: Optional[Dict[str, Dict[str, Optional[int]]]] = None):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}. Choose from {list(EVICTION_POLICIES)}")
+        unknown_types = [entity_type for entity_type in budgets or {} if entity_type not in endpoint_types_dict]
+        if unknown_types:
+            raise ValueError(f"Unknown entity types: {unknown_types}. Choose from {list(endpoint_types_dict)}")
+        self.policy = policy
+        self._stores = {}
+        for entity_type in endpoint_types_dict:
+            budget = {"max_entries": max_entries, "max_bytes": max_bytes, **(budgets or {}).get(entity_type, {})}
+            self._stores[entity_type] = _Store(budget["max_entries"], budget["max_bytes"], policy)
+
+    def caches(self, entity_type: str) -> bool:
+        """Whether entities of the type are kept (a budget of 0 entries turns a type off)."""
+        return self._stores[entity_type].max_entries != 0
+
+    def get(self, entity_type: str, entity_id: str):
+        """The cached entity, or None on a miss."""
+        return self._stores[entity_type].get(entity_id)
+
+    def put(self, entity_type: str, entity_id: str, entity):
+        """Cache an entity read from the database, evicting others if the type is over budget."""
+        self._stores[entity_type].put(entity_id, entity)
+
+    def invalidate(self, entity_type: str, entity_ids: Iterable[str]):
+        """Forget entities, e.g. when they are replaced or deleted in the database."""
+        store = self._stores[entity_type]
+        for entity_id in entity_ids:
+            store.remove(entity_id)
+
+    def clear(self):
+        """Forget all the entities. The counters are kept."""
+        for store in self._stores.values():
+            for entity_id in list(store.entries):
+                store.remove(entity_id)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """The hits, misses, evictions, entries and estimated bytes of each entity type."""
+        return {entity_type: store.stats() for entity_type, store in self._stores.items()}
+
+
+def attach_memory_tier(conn: sqlite3.Connection, tier: Optional[MemoryTier] = None) -> MemoryTier:
+    """
+    Consult a memory tier (a new MemoryTier() by default) before the database in the full reads of the connection
+    (read_*_from_db_by_ids and get_or_fetch, without lazy, fields or compact). The inserts and deletes made through the
+    connection invalidate the entities they change; writes made by other connections to the same file are not seen.
+    """
+    tier = tier if tier is not None else MemoryTier()
+    _memory_tiers[id(conn)] = (conn, tier)
+    return tier
+
+
+def detach_memory_tier(conn: sqlite3.Connection):
+    """
+    Stop using the memory tier of the connection, and release the connection.
+    """
+    _memory_tiers.pop(id(conn), None)
+
+
+def get_memory_tier(conn: sqlite3.Connection) -> Optional[MemoryTier]:
+    """
+    The memory tier of the connection, or None.
+    """
+    entry = _memory_tiers.get(id(conn))
+    return entry[1] if entry is not None and entry[0] is conn else None
+
+
+def invalidate(conn: sqlite3.Connection, entity_type: str, entity_ids: Iterable[str]):
+    """
+    Forget entities from the memory tier of the connection, if it has one.
+    """
+    tier = get_memory_tier(conn)
+    if tier is not None:
+        tier.invalidate(entity_type, entity_ids)
@@ -0,0 +1,263 @@
+import re
+import zlib
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency: pip install zstandard
+    zstandard = None
+
+from openalex_sqlite_cache import entity, json_codec
+from openalex_sqlite_cache.compact_ids import ENTITY_PREFIXES, stored_ids
+from openalex_sqlite_cache.get_items_from_api import chunk_ids, first_letter_types_dict, short_id
+
+CODECS = ("zlib", "zstd")
+
+# zlib only looks back 32 KiB, so a larger preset dictionary would be wasted.
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+ZSTD_DICTIONARY_SIZE = 112 * 1024
+
+# The JSON columns of the parent tables that are stored NULL when the raw payloads of their entity type are stored, and read from
+# the field of the same name of the payloads instead, so that the largest values are not stored twice.
+PAYLOAD_COLUMNS = {"works": ("abstract_inverted_index",)}
+
+# The payload codec (or None) of each entity type, per connection (see get_payload_codec), as id(conn): (conn, {entity_type: codec}).
+# sqlite3.Connection has no weak references, so the entries of closed connections are dropped when a new connection is added.
+_payload_codecs = {}
+
+# JSON keys and short strings, the fragments that repeat across the payloads of an entity type.
+_JSON_TOKEN = re.compile(r'"[^"\\]{1,64}":|"[^"\\]{1,48}"')
+
+
+def _encode(data: dict) -> bytes:
+    return json_codec.dumpb(data)
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("The zstd codec requires the zstandard package: pip install zstandard")
+
+
+def train_dictionary(samples: List[dict], codec: str = "zlib", size: Optional[int] = None) -> bytes:
+    """
+    Train a compression dictionary on sample payloads of one entity type.
+    For zstd, this is zstandard's dictionary trainer. zlib has no trainer, so its preset dictionary is made of the JSON keys and
+    short strings found in most samples, the most frequent ones last (closest to the data, where zlib finds them cheapest).
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}. Choose from {list(CODECS)}")
+    encoded_samples = [_encode(sample) for sample in samples]
+    if codec == "zstd":
+        _require_zstandard()
+        return zstandard.train_dictionary(size or ZSTD_DICTIONARY_SIZE, encoded_samples).as_bytes()
+
+    size = size or ZLIB_DICTIONARY_SIZE
+    document_frequency = Counter()
+    for encoded_sample in encoded_samples:
+        document_frequency.update(set(_JSON_TOKEN.findall(encoded_sample.decode("utf-8"))))
+    tokens = sorted((token for token, count in document_frequency.items() if count > 1 or len(encoded_samples) == 1),
+                    key=lambda token: (document_frequency[token], len(token)))
+    return "".join(tokens).encode("utf-8")[-size:]
+
+
+class PayloadCodec:
+    """
+    Compresses API payloads (JSON) with zlib or zstd, optionally with a dictionary trained on payloads of the same entity type.
+    Only the settings are pickled, so a codec can be sent to worker processes.
+    """
+
+    def __init__(self, codec: str = "zlib", dictionary: Optional[bytes] = None, dictionary_id: Optional[int] = None, level: Optional[int] = None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}. Choose from {list(CODECS)}")
+        if codec == "zstd":
+            _require_zstandard()
+        self.codec = codec
+        self.dictionary = dictionary
+        self.dictionary_id = dictionary_id
+        self.level = level
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_zstd_compressor"] = state["_zstd_decompressor"] = None
+        return state
+
+    def __repr__(self):
+        return f"<PayloadCodec codec={self.codec} dictionary_id={self.dictionary_id}>"
+
+    def compress(self, data: dict) -> bytes:
+        encoded = _encode(data)
+        if self.codec == "zstd":
+            if self._zstd_compressor is None:
+                dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+                self._zstd_compressor = zstandard.ZstdCompressor(level=self.level or 3, dict_data=dict_data)
+            return self._zstd_compressor.compress(encoded)
+        level = self.level if self.level is not None else zlib.Z_DEFAULT_COMPRESSION
+        compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=self.dictionary) if self.dictionary else zlib.compressobj(level)
+        return compressor.compress(encoded) + compressor.flush()
+
+    def decompress(self, payload: bytes) -> dict:
+        if self.codec == "zstd":
+            if self._zstd_decompressor is None:
+                dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+                self._zstd_decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            encoded = self._zstd_decompressor.decompress(payload)
+        else:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+            encoded = decompressor.decompress(payload) + decompressor.flush()
+        return json_codec.loads(encoded)
+
+
+def enable_raw_payloads(conn: sqlite3.Connection, entity_type: str, codec: str = "zlib", samples: Optional[List[dict]] = None,
+                        dictionary_size: Optional[int] = None, level: Optional[int] = None) -> PayloadCodec:
+    """
+    Store the full API payload of every entity of a type (e.g. "works") inserted from now on in raw_payloads, compressed.
+    With samples (e.g. a few hundred payloads from the web API or a snapshot), a dictionary is trained for the entity type first,
+    which is what makes small payloads compress well. Calling it again with new samples trains a new dictionary;
+    payloads compressed with the previous one stay readable.
+    """
+    if entity_type not in {entities_class.__name__.lower() for entities_class in first_letter_types_dict.values()}:
+        raise ValueError(f"Unknown entity type: {entity_type}")
+    payload_codec = PayloadCodec(codec, level=level)
+    _payload_codecs.pop(id(conn), None)
+    with conn:
+        if samples:
+            dictionary = train_dictionary(samples, codec, dictionary_size)
+            cursor = conn.execute(
+                "INSERT INTO raw_payload_dictionaries (entity_type, codec, dictionary) VALUES (?, ?, ?)",
+                (entity_type, codec, dictionary)
+            )
+            payload_codec.dictionary = dictionary
+            payload_codec.dictionary_id = cursor.lastrowid
+        conn.execute(
+            "REPLACE INTO raw_payload_settings (entity_type, codec, dictionary_id, level) VALUES (?, ?, ?, ?)",
+            (entity_type, codec, payload_codec.dictionary_id, level)
+        )
+    return payload_codec
+
+
+def disable_raw_payloads(conn: sqlite3.Connection, entity_type: str, delete_payloads: bool = False):
+    """
+    Stop storing the raw payloads of an entity type. The stored payloads are kept unless delete_payloads is True, in which case
+    their PAYLOAD_COLUMNS values are written back to the parent table first.
+    """
+    _payload_codecs.pop(id(conn), None)
+    with conn:
+        conn.execute("DELETE FROM raw_payload_settings WHERE entity_type = ?", (entity_type,))
+        if delete_payloads:
+            _restore_payload_columns(conn, entity_type)
+            conn.execute("DELETE FROM raw_payloads WHERE entity_type = ?", (entity_type,))
+
+
+def _restore_payload_columns(conn: sqlite3.Connection, entity_type: str):
+    """
+    Write the PAYLOAD_COLUMNS values of the stored payloads of an entity type back to its parent table, where they are NULL.
+    """
+    columns = PAYLOAD_COLUMNS.get(entity_type, ())
+    if not columns:
+        return
+    ids = [row[0] for row in conn.execute("SELECT id FROM raw_payloads WHERE entity_type = ?", (entity_type,))]
+    assignments = ', '.join(f"{column} = COALESCE({column}, ?)" for column in columns)
+    for chunk in chunk_ids(ids, entity.MAX_SQL_VARIABLES):
+        values = payload_column_values(conn, entity_type, chunk)
+        conn.executemany(
+            f"UPDATE {entity_type} SET {assignments} WHERE id = ?",
+            [tuple(values[i][column] for column in columns) + (stored_id,)
+             for i, stored_id in zip(chunk, stored_ids(conn, chunk, ENTITY_PREFIXES[entity_type])) if i in values]
+        )
+
+
+def _load_dictionary(conn: sqlite3.Connection, dictionary_id: Optional[int]) -> Optional[bytes]:
+    if dictionary_id is None:
+        return None
+    row = conn.execute("SELECT dictionary FROM raw_payload_dictionaries WHERE dictionary_id = ?", (dictionary_id,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def get_payload_codec(conn: sqlite3.Connection, entity_type: str) -> Optional[PayloadCodec]:
+    """
+    The codec to store the raw payloads of an entity type with, or None if raw payloads are not enabled for it.
+    It is read once per connection, and read again after enable_raw_payloads or disable_raw_payloads on the same connection
+    (settings changed through another connection are only seen by new connections).
+    """
+    entry = _payload_codecs.get(id(conn))
+    if entry is None or entry[0] is not conn:
+        _forget_closed_connections()
+        entry = _payload_codecs[id(conn)] = (conn, {})
+    codecs = entry[1]
+    if entity_type not in codecs:
+        codecs[entity_type] = _read_payload_codec(conn, entity_type)
+    return codecs[entity_type]
+
+
+def _forget_closed_connections():
+    """
+    Drop the cached payload codecs of the connections that have been closed.
+    """
+    for key, (conn, _) in list(_payload_codecs.items()):
+        try:
+            conn.total_changes
+        except sqlite3.ProgrammingError:
+            del _payload_codecs[key]
+
+
+def _read_payload_codec(conn: sqlite3.Connection, entity_type: str) -> Optional[PayloadCodec]:
+    row = conn.execute("SELECT codec, dictionary_id, level FROM raw_payload_settings WHERE entity_type = ?", (entity_type,)).fetchone()
+    if row is None:
+        return None
+    codec, dictionary_id, level = row
+    return PayloadCodec(codec, _load_dictionary(conn, dictionary_id), dictionary_id, level)
+
+
+def raw_payload_rows(entity_type: str, entities: Iterable[dict], payload_codec: PayloadCodec) -> List[tuple]:
+    """
+    Compress the payloads into rows of raw_payloads: (entity_type, id, codec, dictionary_id, payload).
+    """
+    return [(entity_type, short_id(data["id"]), payload_codec.codec, payload_codec.dictionary_id, payload_codec.compress(data)) for data in entities]
+
+
+def iter_raw_payloads(conn: sqlite3.Connection, ids: Union[List[str], str]) -> Iterator[dict]:
+    """
+    Yield the stored full API payloads of entities of one type, in the order of the IDs. IDs without a stored payload are left out.
+    Each payload is a single-row lookup; the entity tables are not read.
+    """
+    if not isinstance(ids, list):
+        ids = [ids]
+    ids = list(dict.fromkeys(short_id(i) for i in ids))
+    if not ids:
+        return
+    first_letter = ids[0][0].upper()
+    if first_letter not in first_letter_types_dict:
+        raise ValueError(f"Unknown OpenAlex ID type: {ids[0]}")
+    entity_type = first_letter_types_dict[first_letter].__name__.lower()
+    codecs = {}
+    for chunk in chunk_ids(ids, entity.MAX_SQL_VARIABLES):
+        raw_sql = "SELECT id, codec, dictionary_id, payload FROM raw_payloads WHERE entity_type = ? AND id IN ({})".format(','.join('?' * len(chunk)))
+        rows_by_id = {row[0]: row for row in conn.execute(raw_sql, [entity_type] + chunk)}
+        for entity_id in chunk:
+            if entity_id not in rows_by_id:
+                continue
+            _, codec, dictionary_id, payload = rows_by_id[entity_id]
+            if (codec, dictionary_id) not in codecs:
+                codecs[(codec, dictionary_id)] = PayloadCodec(codec, _load_dictionary(conn, dictionary_id), dictionary_id)
+            yield codecs[(codec, dictionary_id)].decompress(payload)
+
+
+def payload_column_values(conn: sqlite3.Connection, entity_type: str, ids: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    The PAYLOAD_COLUMNS values of entities of one type, as stored in the parent table (JSON), from their stored payloads:
+    {short ID: {column: value}}. IDs without a stored payload are left out.
+    """
+    columns = PAYLOAD_COLUMNS.get(entity_type, ())
+    return {short_id(payload["id"]): {column: json_codec.dumps(payload[column]) if payload.get(column) is not None else None for column in columns}
+            for payload in iter_raw_payloads(conn, ids)}
+
+
+def read_raw_payloads(conn: sqlite3.Connection, ids: Union[List[str], str]) -> Dict[str, dict]:
+    """
+    The stored full API payloads of entities of one type, keyed by short ID. IDs without a stored payload are left out.
+    """
+    return {short_id(payload["id"]): payload for payload in iter_raw_payloads(conn, ids)}
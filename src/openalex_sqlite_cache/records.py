@@ -0,0 +1,53 @@
+from collections import namedtuple
+from typing import Dict, List
+
+
+class EntityRecord(tuple):
+    """
+    Mixin of the compact records returned by compact reads (read_*_from_db_by_ids(..., compact=True)).
+    A record is a named tuple with the columns of the entity's parent table (as in init_db.sql), followed by one field per child
+    field of the entity (see Entity.CHILD_FIELDS) holding the rows of its child table, as tuples. It has no instance dict, and
+    the API-shaped dict is only built on demand, with to_dict.
+    """
+    __slots__ = ()
+
+    # Set on each record class (see make_record_class).
+    _entity_class = None
+    _parent_size = 0
+
+    def child_rows(self) -> Dict[str, Dict[str, List[tuple]]]:
+        """
+        The child rows of the record grouped like Entity._read_child_rows does.
+        """
+        entity_id = self[0]
+        child_rows = {}
+        for table, rows in zip(self._entity_class.CHILD_FIELDS.values(), self[self._parent_size:]):
+            child_rows[table] = {entity_id: list(rows)} if rows else {}
+        return child_rows
+
+    def to_entity(self):
+        """
+        Build the entity, as read_*_from_db_by_ids returns it.
+        """
+        return self._entity_class._from_rows(tuple(self[:self._parent_size]), self.child_rows())
+
+    def to_dict(self) -> dict:
+        """
+        Build the API-shaped entity dict. With a compact read with fields, the fields that were not read are empty.
+        """
+        return self.to_entity().data
+
+
+def make_record_class(entity_class: type) -> type:
+    """
+    Create the record class of an entity class, e.g. WorkRecord(id, doi, title, ..., authorships, ...) for Work.
+    """
+    parent_columns = next(iter(entity_class.TABLES.values()))
+    fields = list(parent_columns) + list(entity_class.CHILD_FIELDS)
+    base = namedtuple(f"{entity_class.__name__}Record", fields)
+    return type(base.__name__, (EntityRecord, base), {
+        "__slots__": (),
+        "__doc__": f"Compact {entity_class.__name__} record (see EntityRecord).",
+        "_entity_class": entity_class,
+        "_parent_size": len(parent_columns),
+    })
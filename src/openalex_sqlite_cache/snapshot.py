@@ -0,0 +1,275 @@
+import os
+import re
+import gzip
+import time
+import queue
+import pickle
+import sqlite3
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.cache import table_entity_classes
+from openalex_sqlite_cache.entity import utc_now
+from openalex_sqlite_cache.indexes import deferred_secondary_indexes
+from openalex_sqlite_cache.raw_payloads import PayloadCodec, get_payload_codec, raw_payload_rows
+
+# Snapshot layout: <snapshot_dir>/data/<entity_type>/updated_date=YYYY-MM-DD/part_NNN.gz
+# Changefiles use the same layout, so applying the newer updated_date partitions on top of a loaded snapshot syncs it.
+PARTITION_DIR_PATTERN = re.compile(r"^updated_date=(\d{4}-\d{2}-\d{2})$")
+PART_FILE_PATTERN = re.compile(r"^part_\d+\.gz$")
+
+DEFAULT_BATCH_SIZE = 1000
+
+# How long the writer of load_snapshot_parallel waits for a row batch before checking whether a worker task failed.
+QUEUE_POLL_SECONDS = 1.0
+
+
+class Partition:
+    """One gzipped JSON-lines file of a snapshot."""
+
+    def __init__(self, entity_type: str, updated_date: str, path: str, name: str):
+        self.entity_type = entity_type
+        self.updated_date = updated_date
+        self.path = path
+        self.name = name  # Path relative to the data directory, e.g. "authors/updated_date=2024-01-01/part_000.gz"
+
+    def __repr__(self):
+        return f"<Partition {self.name}>"
+
+
+def iter_partitions(snapshot_dir: str, entity_type: str) -> List[Partition]:
+    """
+    List the partitions of one entity type, oldest updated_date first, so that newer records replace older ones.
+    """
+    entity_dir = os.path.join(snapshot_dir, "data", entity_type)
+    if not os.path.isdir(entity_dir):
+        return []
+    partitions = []
+    for dir_name in sorted(os.listdir(entity_dir)):
+        match = PARTITION_DIR_PATTERN.match(dir_name)
+        if not match:
+            continue
+        partition_dir = os.path.join(entity_dir, dir_name)
+        for file_name in sorted(os.listdir(partition_dir)):
+            if PART_FILE_PATTERN.match(file_name):
+                partitions.append(Partition(entity_type, match.group(1), os.path.join(partition_dir, file_name), f"{entity_type}/{dir_name}/{file_name}"))
+    partitions.sort(key=lambda p: (p.updated_date, p.name))
+    return partitions
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """
+    Stream the non-empty lines of a gzipped JSON-lines file.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """
+    Stream the records of a gzipped JSON-lines file, one dict at a time.
+    """
+    for line in iter_lines(path):
+        yield json_codec.loads(line)
+
+
+def iter_batches(items: Iterator, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[list]:
+    """
+    Group an iterator into lists of at most batch_size items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def applied_partitions(conn: sqlite3.Connection) -> set:
+    """
+    The names of the partitions that have already been loaded.
+    """
+    return {row[0] for row in conn.execute("SELECT partition FROM snapshot_partitions")}
+
+
+def _mark_applied(conn: sqlite3.Connection, partition: Partition, record_count: int):
+    with conn:
+        conn.execute(
+            "REPLACE INTO snapshot_partitions (partition, entity_type, record_count, applied_date) VALUES (?, ?, ?, ?)",
+            (partition.name, partition.entity_type, record_count, utc_now())
+        )
+
+
+def load_snapshot(conn: sqlite3.Connection, snapshot_dir: str, entity_types: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                  defer_indexes: bool = False) -> Dict[str, int]:
+    """
+    Load the partitions of a local OpenAlex snapshot (or changefiles) that have not been loaded yet.
+    Records are streamed and bulk-inserted batch_size at a time, so memory stays flat regardless of the partition size.
+    Each partition is recorded in snapshot_partitions once fully loaded; an interrupted partition is loaded again on the next run.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        snapshot_dir (str): The directory containing data/<entity_type>/updated_date=.../part_*.gz.
+        entity_types (list[str]): The entity types to load, e.g. ["authors", "works"]. Defaults to all of them.
+        batch_size (int): The number of records per bulk insert transaction.
+        defer_indexes (bool): Drop the secondary indexes during the load and rebuild them afterwards (see indexes.deferred_secondary_indexes).
+            Worth it for a full snapshot, not for a few changefiles.
+
+    Returns:
+        dict: The number of partitions loaded and skipped, and of records loaded.
+    """
+    if entity_types is None:
+        entity_types = list(table_entity_classes)
+    for entity_type in entity_types:
+        if entity_type not in table_entity_classes:
+            raise ValueError(f"Unknown entity type: {entity_type}")
+    done = applied_partitions(conn)
+    all_partitions = [p for entity_type in entity_types for p in iter_partitions(snapshot_dir, entity_type)]
+    partitions = [p for p in all_partitions if p.name not in done]
+    stats = {"partitions": 0, "skipped_partitions": len(all_partitions) - len(partitions), "records": 0}
+    with deferred_secondary_indexes(conn) if defer_indexes and partitions else nullcontext():
+        for partition in partitions:
+            entity_class = table_entity_classes[partition.entity_type]
+            record_count = 0
+            for batch in iter_batches(iter_records(partition.path), batch_size):
+                entity_class.bulk_insert(conn, batch, refreshed_date=partition.updated_date)
+                record_count += len(batch)
+            _mark_applied(conn, partition, record_count)
+            stats["partitions"] += 1
+            stats["records"] += record_count
+    return stats
+
+
+# Set in each worker process of load_snapshot_parallel.
+_row_queue = None
+
+
+def _init_worker(row_queue):
+    global _row_queue
+    _row_queue = row_queue
+
+
+def _flatten_partition(entity_type: str, path: str, name: str, batch_size: int, payload_codec: Optional[PayloadCodec] = None):
+    """
+    Worker: decode and flatten one partition (and compress the raw payloads, with a payload_codec), and send its rows to the writer
+    batch_size records at a time.
+    Sends ("rows", name, (rows, raw_payloads)) for every batch, then ("done", name, record_count). A failure is raised, and reaches
+    the writer through the future of the task.
+    """
+    try:
+        entity_class = table_entity_classes[entity_type]
+        record_count = 0
+        for batch in iter_batches(iter_records(path), batch_size):
+            rows = {table: [] for table in entity_class.TABLES}
+            for record in batch:
+                for table, table_rows in entity_class.flatten(record).items():
+                    rows[table].extend(table_rows)
+            raw_payloads = raw_payload_rows(entity_type, batch, payload_codec) if payload_codec is not None else None
+            _row_queue.put(("rows", name, (rows, raw_payloads)))
+            record_count += len(batch)
+        _row_queue.put(("done", name, record_count))
+    except Exception as e:
+        # The exception is pickled to reach the writer: raise a stand-in for one that cannot be.
+        try:
+            pickle.dumps(e)
+        except Exception:
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+        raise
+
+
+def _report_failure(failures: queue.SimpleQueue, future: Future):
+    """
+    Done callback of the worker tasks: pass the exception of a failed task on to the writer.
+    """
+    if not future.cancelled() and future.exception() is not None:
+        failures.put(future.exception())
+
+
+def load_snapshot_parallel(conn: sqlite3.Connection, snapshot_dir: str, entity_types: Optional[List[str]] = None,
+                           batch_size: int = DEFAULT_BATCH_SIZE, processes: Optional[int] = None, defer_indexes: bool = False) -> Dict[str, float]:
+    """
+    Like load_snapshot, but the JSON decoding and flattening run in a pool of worker processes.
+    The workers send flattened row batches over a bounded queue to this process, which is the only one writing to the database.
+    Partitions are processed one updated_date at a time, so that newer records still replace older ones.
+    A worker that raises makes the load raise its exception, and one that dies makes it raise BrokenProcessPool, instead of waiting forever.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        snapshot_dir (str): The directory containing data/<entity_type>/updated_date=.../part_*.gz.
+        entity_types (list[str]): The entity types to load, e.g. ["authors", "works"]. Defaults to all of them.
+        batch_size (int): The number of records per row batch and write transaction.
+        processes (int): The number of worker processes. Defaults to the number of CPUs.
+        defer_indexes (bool): Drop the secondary indexes during the load and rebuild them afterwards.
+
+    Returns:
+        dict: The number of partitions loaded and skipped, of records loaded, the elapsed seconds and the records per second.
+    """
+    start = time.perf_counter()
+    if entity_types is None:
+        entity_types = list(table_entity_classes)
+    for entity_type in entity_types:
+        if entity_type not in table_entity_classes:
+            raise ValueError(f"Unknown entity type: {entity_type}")
+    if processes is None:
+        processes = os.cpu_count() or 1
+    done = applied_partitions(conn)
+    all_partitions = [p for entity_type in entity_types for p in iter_partitions(snapshot_dir, entity_type)]
+    partitions = sorted((p for p in all_partitions if p.name not in done), key=lambda p: (p.updated_date, p.name))
+    stats = {"partitions": 0, "skipped_partitions": len(all_partitions) - len(partitions), "records": 0}
+
+    if partitions:
+        payload_codecs = {entity_type: get_payload_codec(conn, entity_type) for entity_type in entity_types}
+        # Bound the queue so that the workers cannot get far ahead of the writer.
+        row_queue = multiprocessing.Queue(maxsize=2 * processes)
+        # The exceptions of the failed worker tasks. A worker process that dies fails the tasks of the pool with BrokenProcessPool.
+        failures = queue.SimpleQueue()
+        executor = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(row_queue,))
+        futures = []
+        try:
+            with deferred_secondary_indexes(conn) if defer_indexes else nullcontext():
+                for updated_date, date_partitions in groupby(partitions, key=lambda p: p.updated_date):
+                    pending = {p.name: p for p in date_partitions}
+                    for partition in pending.values():
+                        future = executor.submit(_flatten_partition, partition.entity_type, partition.path, partition.name, batch_size,
+                                                 payload_codecs[partition.entity_type])
+                        future.add_done_callback(partial(_report_failure, failures))
+                        futures.append(future)
+                    while pending:
+                        if not failures.empty():
+                            raise failures.get()
+                        try:
+                            kind, name, payload = row_queue.get(timeout=QUEUE_POLL_SECONDS)
+                        except queue.Empty:
+                            continue
+                        partition = pending[name]
+                        if kind == "rows":
+                            rows, raw_payloads = payload
+                            table_entity_classes[partition.entity_type].bulk_insert_rows(conn, rows, refreshed_date=partition.updated_date, raw_payloads=raw_payloads)
+                        else:
+                            _mark_applied(conn, partition, payload)
+                            del pending[name]
+                            stats["partitions"] += 1
+                            stats["records"] += payload
+        finally:
+            # Drain the queue until the running tasks finish (they may be blocked on the full queue), then stop the workers.
+            for future in futures:
+                future.cancel()
+            while not all(future.done() for future in futures):
+                try:
+                    row_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            executor.shutdown()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["records_per_second"] = stats["records"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
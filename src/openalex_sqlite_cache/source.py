@@ -1,83 +1,140 @@
 import sqlite3
-from typing import Union, List
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from .clean import remove_base_url
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
 
-class Source:
+class Source(Entity):
 
-    def __init__(self, source: pyalex.Source):
-        if not isinstance(source, pyalex.Source):
-            raise TypeError("source must be a pyalex.Source object")        
-        self.source = source
-        self.source_id = remove_base_url(source['id'])
+    TABLES = {
+        "sources": ("id", "issn_l", "issn", "display_name", "publisher", "works_count", "cited_by_count", "is_oa", "is_in_doaj", "homepage_url", "works_api_url", "updated_date"),
+        "sources_counts_by_year": ("source_id", "year", "works_count", "cited_by_count", "oa_works_count"),
+        "sources_ids": ("source_id", "openalex", "issn_l", "issn", "mag", "wikidata", "fatcat"),
+    }
+
+    # The parent table columns of the fields that are not stored in a column of the same name.
+    FIELD_COLUMNS = {"host_organization": ("publisher",)}
+
+    # Counts by year are read oldest year first.
+    ORDER_BY = {"sources_counts_by_year": "year DESC"}
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "counts_by_year": "sources_counts_by_year",
+        "ids": "sources_ids",
+    }
+
+    # The external IDs to index in external_ids, as kind: [(table, column)] (see identifiers.py).
+    # The issn column holds a JSON list.
+    EXTERNAL_IDS = {"issn": [("sources", "issn_l"), ("sources", "issn")]}
+
+    def __init__(self, source: Union[pyalex.Source, dict]):
+        super().__init__(source)
 
     @staticmethod
-    def create_sources_from_web_api_by_ids(conn: sqlite3.Connection, source_ids: Union[List[str], str]) -> "Source":
+    def create_sources_from_web_api_by_ids(conn: sqlite3.Connection, source_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Source":
         """
         Query the OpenAlex web API for a particular source(s) to create the pyalex.Source dict. Insert the source(s) into the database.
         """
-        if not isinstance(source_ids, list):
-            source_ids = [source_ids]
-        pyalexSources = pyalex.Sources().get([source_ids])
-        sources = [Source(s) for s in pyalexSources]
-        for source in sources:
-            source.insert_or_replace_in_db(conn)
-        return sources
+        return Source._create_from_web_api_by_ids(conn, source_ids, transport=transport, engine=engine)
     
     @staticmethod
-    def read_sources_from_db_by_ids(conn: sqlite3.Connection, source_ids: Union[List[str], str]) -> "Source":
+    def iter_sources_from_db_by_ids(conn: sqlite3.Connection, source_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Source"]:
+        """
+        Query the database for sources to create their pyalex.Source dicts, in the order of the IDs (unknown IDs are left out).
+        The sources are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
+        """
+        return Source._iter_from_db_by_ids(conn, source_ids, chunk_size, lazy, fields, compact)
+
+    @staticmethod
+    def read_sources_from_db_by_ids(conn: sqlite3.Connection, source_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Source"]:
         """
-        Query the database for a particular source to create its pyalex.Source dict. 
+        Query the database for sources to create their pyalex.Source dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, only the sources table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the sources only have those fields, and only their columns and tables are read.
+        With compact=True, the sources are compact SourceRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
         """
-        if not isinstance(source_ids, list):
-            source_ids = [source_ids]
+        return list(Source.iter_sources_from_db_by_ids(conn, source_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_source: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Source":
+        """
+        Build the source from its row of the sources table and the child rows grouped by source ID (see Entity._iter_rows).
+        """
+        source_id = result_source[0]
         source_dict = {}
-        cursor = conn.cursor()
+        # Build the source_dict
         # SOURCES
-        cursor.execute("SELECT * FROM sources WHERE id=?", (remove_base_url(source_id),))
-        source_id = cursor.fetchone()
+        source_dict['id'] = Source._prepend_base_url(source_id)
+        source_dict['issn_l'] = result_source[1]
+        source_dict['issn'] = json_codec.loads(result_source[2]) if result_source[2] is not None else None
+        source_dict['display_name'] = result_source[3]
+        source_dict['host_organization'] = Source._prepend_base_url(result_source[4])
+        source_dict['works_count'] = result_source[5]
+        source_dict['cited_by_count'] = result_source[6]
+        source_dict['is_oa'] = bool(result_source[7]) if result_source[7] is not None else None
+        source_dict['is_in_doaj'] = bool(result_source[8]) if result_source[8] is not None else None
+        source_dict['homepage_url'] = result_source[9]
+        source_dict['works_api_url'] = result_source[10]
+        source_dict['updated_date'] = result_source[11]
+
         # SOURCES_COUNTS_BY_YEAR
+        source_dict['counts_by_year'] = []
+        for count in child_rows['sources_counts_by_year'].get(source_id, []):
+            year_dict = {}
+            year_dict['year'] = count[1]
+            year_dict['works_count'] = count[2]
+            year_dict['cited_by_count'] = count[3]
+            year_dict['oa_works_count'] = count[4]
+            source_dict['counts_by_year'].append(year_dict)
 
         # SOURCES_IDS
-        return Source(pyalex.Source(source_dict))
+        source_dict['ids'] = {}
+        for result_source_ids in child_rows['sources_ids'].get(source_id, [])[:1]:
+            source_dict['ids']['openalex'] = result_source_ids[1]
+            source_dict['ids']['issn_l'] = result_source_ids[2]
+            source_dict['ids']['issn'] = json_codec.loads(result_source_ids[3]) if result_source_ids[3] is not None else None
+            source_dict['ids']['mag'] = result_source_ids[4]
+            source_dict['ids']['wikidata'] = result_source_ids[5]
+            source_dict['ids']['fatcat'] = result_source_ids[6]
+
+        return Source(source_dict)
     
+    read_from_db_by_ids = read_sources_from_db_by_ids
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the source from the database.
         """
-        source_id = self.source_id
-        conn.execute("DELETE FROM sources WHERE id=?", (source_id,))
-        conn.execute("DELETE FROM sources_counts_by_year WHERE source_id=?", (source_id,))
-        conn.execute("DELETE FROM sources_ids WHERE source_id=?", (source_id,))
+        source_id = self.id
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [source_id])
+        conn.execute("DELETE FROM sources WHERE id=?", (stored_id,))
+        conn.execute("DELETE FROM sources_counts_by_year WHERE source_id=?", (stored_id,))
+        conn.execute("DELETE FROM sources_ids WHERE source_id=?", (stored_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(source: dict) -> Dict[str, List[tuple]]:
         """
-        Insert the source into the database.
+        Flatten the source into the rows of the sources tables.
         """
-        source = self.source
+        source_id = Source._remove_base_url(source['id'])
         # SOURCES
-        insert_tuple = (remove_base_url(source['id']), source['issn_l'], source['issn'], source['display_name'], source['publisher'], source['works_count'], source['cited_by_count'], source['is_oa'], source['is_in_doaj'], source ['homepage_url'], source['works_api_url'], source['updated_date'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO sources (id, issn_l, issn, display_name, publisher, works_count, cited_by_count, is_oa, is_in_doaj, homepage_url, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        sources_rows = [(source_id, source['issn_l'], json_codec.dumps(source['issn']), source['display_name'], Source._remove_base_url(source.get('host_organization')), source['works_count'], source['cited_by_count'], source['is_oa'], source['is_in_doaj'], source['homepage_url'], source['works_api_url'], source['updated_date'])]
 
         # SOURCES_COUNTS_BY_YEAR
-        for year, count in source['counts_by_year'].items():
-            insert_tuple = (remove_base_url(source['id']), year, count, works_count, cited_by_count, oa_works_count)
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO sources_counts_by_year (source_id, year, works_count, cited_by_count, oa_works_count) VALUES ({question_marks})", insert_tuple
-            )
+        sources_counts_by_year_rows = [(source_id, count['year'], count['works_count'], count['cited_by_count'], count.get('oa_works_count')) for count in source['counts_by_year']]
 
         # SOURCES_IDS
-        for ids in source['ids']:
-            insert_tuple = (remove_base_url(source['id']), ids['openalex'], ids['issn_l'], ids['issn'], ids['mag'], ids['wikidata'], ids['fatcat'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO sources_ids (source_id, openalex, issn_l, issn, mag, wikidata, fatcat) VALUES ({question_marks})", insert_tuple
-            )
-
-        conn.commit()
\ No newline at end of file
+        ids = source['ids']
+        sources_ids_rows = [(source_id, ids['openalex'], ids.get('issn_l'), json_codec.dumps(ids.get('issn')), ids.get('mag'), ids.get('wikidata'), ids.get('fatcat'))]
+
+        return {
+            "sources": sources_rows,
+            "sources_counts_by_year": sources_counts_by_year_rows,
+            "sources_ids": sources_ids_rows,
+        }
@@ -1,97 +1,123 @@
 import sqlite3
-from typing import Union, List
-import json
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from .entity import Entity
+from . import json_codec
+from .entity import Entity, MAX_SQL_VARIABLES
+from .get_items_from_api import Transport
+from .fetch_engine import FetchEngine
+from .topic_taxonomy import add_works_to_rollups, remove_works_from_rollups, update_taxonomy, works_with_topics
 
 class Topic(Entity):
 
+    TABLES = {
+        "topics": ("id", "display_name", "subfield_id", "subfield_display_name", "field_id", "field_display_name", "domain_id", "domain_display_name", "description", "keywords", "wikipedia_id", "works_count", "cited_by_count", "updated_date"),
+    }
+
+    # The parent table columns of the fields that are not stored in a column of the same name.
+    FIELD_COLUMNS = {
+        "subfield": ("subfield_id", "subfield_display_name"),
+        "field": ("field_id", "field_display_name"),
+        "domain": ("domain_id", "domain_display_name"),
+        "ids": ("wikipedia_id",),
+    }
+
     def __init__(self, topic: Union[pyalex.Topic, dict]):
         super().__init__(topic)
 
     @staticmethod
-    def create_topics_from_web_api_by_ids(conn: sqlite3.Connection, topic_ids: Union[List[str], str]) -> "Topic":
+    def create_topics_from_web_api_by_ids(conn: sqlite3.Connection, topic_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Topic":
         """
         Query the OpenAlex web API for a particular topic(s) to create the pyalex.Topic dict. Insert the topic(s) into the database.
         The only Topics returned are those that were successfully inserted into the database.
         If a topic already exists in the database, it will not be inserted again, and will not be returned here.
         """
-        if not isinstance(topic_ids, list):
-            topic_ids = [topic_ids]
-        pyalexTopics = []
-        for topic_id in topic_ids:
-            tmpTopic = pyalex.Topics()[topic_id]
-            pyalexTopics.append(tmpTopic)
-        assert len(pyalexTopics) == len(topic_ids)
-        topics = [Topic(t) for t in pyalexTopics]
-        return_topics = []
-        for topic in topics:
-            try:
-                topic.insert_or_replace_in_db(conn)
-                return_topics.append(topic)
-            except sqlite3.IntegrityError as e:
-                # print(f"Error inserting topic {topic.topic_id} into database: {e}")
-                pass
-        return return_topics
+        return Topic._create_from_web_api_by_ids(conn, topic_ids, transport=transport, engine=engine)
 
     @staticmethod
-    def read_topics_from_db_by_ids(conn: sqlite3.Connection, topic_ids: Union[List[str], str]) -> "Topic":
+    def iter_topics_from_db_by_ids(conn: sqlite3.Connection, topic_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Topic"]:
         """
-        Query the database for a particular topic to create its pyalex.Topic dict. 
+        Query the database for topics to create their pyalex.Topic dicts, in the order of the IDs (unknown IDs are left out).
+        The topics are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
         """
-        if not isinstance(topic_ids, list):
-            topic_ids = [topic_ids]        
-        cursor = conn.cursor()
-        # TOPICS
-        topic_ids_tuple = tuple([Topic._remove_base_url(topic_id) for topic_id in topic_ids])
-        raw_sql = "SELECT id, display_name, subfield_id, subfield_display_name, field_id, field_display_name, domain_id, domain_display_name, description, keywords, wikipedia_id, works_count, cited_by_count, updated_date FROM topics WHERE id=?"
-        cursor.execute(raw_sql, topic_ids_tuple)
-        result_topics = cursor.fetchall()
-        topics = []
-        for i in range(len(result_topics)):
-            topic_dict = {}
-            # Build the topic_dict
-            topic_dict["id"] = Topic._prepend_base_url(result_topics[i][0])
-            topic_dict["display_name"] = result_topics[i][1]
-            topic_dict["subfield"] = {}
-            topic_dict["subfield"]["id"] = Topic._prepend_base_url(result_topics[i][2])
-            topic_dict["subfield"]["display_name"] = result_topics[i][3]
-            topic_dict["field"] = {}
-            topic_dict["field"]["id"] = Topic._prepend_base_url(result_topics[i][4])
-            topic_dict["field"]["display_name"] = result_topics[i][5]
-            topic_dict["domain"] = {}
-            topic_dict["domain"]["id"] = Topic._prepend_base_url(result_topics[i][6])
-            topic_dict["domain"]["display_name"] = result_topics[i][7]
-            topic_dict["description"] = result_topics[i][8]
-            topic_dict["keywords"] = json.loads(result_topics[i][9])
-            topic_dict["ids"] = {}
-            topic_dict["ids"]["wikipedia"] = result_topics[i][10]
-            topic_dict["ids"]["openalex"] = topic_dict["id"]
-            topic_dict["works_count"] = result_topics[i][11]
-            topic_dict["cited_by_count"] = result_topics[i][12]            
-            topic_dict["updated_date"] = result_topics[i][13]
-            topics.append(Topic(topic_dict))  
-        return topics
+        return Topic._iter_from_db_by_ids(conn, topic_ids, chunk_size, lazy, fields, compact)
+
+    @staticmethod
+    def read_topics_from_db_by_ids(conn: sqlite3.Connection, topic_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Topic"]:
+        """
+        Query the database for topics to create their pyalex.Topic dicts, in the order of the IDs (unknown IDs are left out).
+        With lazy=True, the topics are LazyEntity proxies (topics have no child tables, so nothing is deferred).
+        With fields (e.g. ["display_name", "cited_by_count"]), the topics only have those fields, and only their columns and tables are read.
+        With compact=True, the topics are compact TopicRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
+        """
+        return list(Topic.iter_topics_from_db_by_ids(conn, topic_ids, lazy=lazy, fields=fields, compact=compact))
+
+    @staticmethod
+    def _from_rows(result_topic: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Topic":
+        """
+        Build the topic from its row of the topics table and the child rows grouped by topic ID (see Entity._iter_rows).
+        """
+        topic_dict = {}
+        # Build the topic_dict
+        topic_dict["id"] = Topic._prepend_base_url(result_topic[0])
+        topic_dict["display_name"] = result_topic[1]
+        topic_dict["subfield"] = {}
+        topic_dict["subfield"]["id"] = Topic._prepend_base_url(result_topic[2])
+        topic_dict["subfield"]["display_name"] = result_topic[3]
+        topic_dict["field"] = {}
+        topic_dict["field"]["id"] = Topic._prepend_base_url(result_topic[4])
+        topic_dict["field"]["display_name"] = result_topic[5]
+        topic_dict["domain"] = {}
+        topic_dict["domain"]["id"] = Topic._prepend_base_url(result_topic[6])
+        topic_dict["domain"]["display_name"] = result_topic[7]
+        topic_dict["description"] = result_topic[8]
+        topic_dict["keywords"] = json_codec.loads(result_topic[9]) if result_topic[9] is not None else None
+        topic_dict["ids"] = {}
+        topic_dict["ids"]["wikipedia"] = result_topic[10]
+        topic_dict["ids"]["openalex"] = topic_dict["id"]
+        topic_dict["works_count"] = result_topic[11]
+        topic_dict["cited_by_count"] = result_topic[12]
+        topic_dict["updated_date"] = result_topic[13]
+        return Topic(topic_dict)
     
+    read_from_db_by_ids = read_topics_from_db_by_ids
+
+    @classmethod
+    def _before_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Uncount the works tagged with the topics from the topic rollups, since the taxa of the topics may change (see topic_taxonomy.py).
+        """
+        remove_works_from_rollups(conn, works_with_topics(conn, entity_ids))
+
+    @classmethod
+    def _after_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Update the taxonomy tables from the inserted topics, and count the works tagged with them again in the topic rollups.
+        """
+        update_taxonomy(conn, entity_ids)
+        add_works_to_rollups(conn, works_with_topics(conn, entity_ids))
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the topic from the database.
         """
         topic_id = self.id
-        conn.execute("DELETE FROM topics WHERE id=?", (topic_id,))
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [topic_id])
+        work_ids = works_with_topics(conn, [topic_id])
+        remove_works_from_rollups(conn, work_ids)
+        conn.execute("DELETE FROM topics WHERE id=?", (stored_id,))
+        add_works_to_rollups(conn, work_ids)
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def flatten(topic: dict) -> Dict[str, List[tuple]]:
         """
-        Insert the topic into the database.
+        Flatten the topic into the rows of the topics table.
         """
-        topic = self.data
         # TOPICS
-        insert_tuple = (Topic._remove_base_url(topic['id']),topic['display_name'], Topic._remove_base_url(topic['subfield']['id']), topic['subfield']['display_name'], Topic._remove_base_url(topic['field']['id']),topic['field']['display_name'], Topic._remove_base_url(topic['domain']['id']), topic['domain']['display_name'], topic['description'], json.dumps(topic['keywords']), topic['ids']['wikipedia'], topic['works_count'], topic['cited_by_count'], topic['updated_date'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO topics (id, display_name, subfield_id, subfield_display_name, field_id, field_display_name, domain_id, domain_display_name, description, keywords, wikipedia_id, works_count, cited_by_count, updated_date) VALUES ({question_marks})", insert_tuple
-        )
+        topics_rows = [(Topic._remove_base_url(topic['id']),topic['display_name'], Topic._remove_base_url(topic['subfield']['id']), topic['subfield']['display_name'], Topic._remove_base_url(topic['field']['id']),topic['field']['display_name'], Topic._remove_base_url(topic['domain']['id']), topic['domain']['display_name'], topic['description'], json_codec.dumps(topic['keywords']), topic['ids'].get('wikipedia'), topic['works_count'], topic['cited_by_count'], topic['updated_date'])]
 
-        conn.commit()
\ No newline at end of file
+        return {
+            "topics": topics_rows,
+        }
@@ -0,0 +1,128 @@
+import sqlite3
+from typing import Dict, List, Optional
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.compact_ids import read_ids, stored_ids
+from openalex_sqlite_cache.entity import BASE_URL
+
+# The levels of the topic taxonomy that topic_rollups counts works for, from the most specific.
+ROLLUP_LEVELS = ("topic", "subfield", "field", "domain")
+
+# The prefix of the taxon IDs of each level, e.g. "T10017" or "fields/17" (see compact_ids.py).
+LEVEL_PREFIXES = {"topic": "T", "subfield": "subfields/", "field": "fields/", "domain": "domains/"}
+
+# The cached works with a publication year, with the taxa of their topics. Topics missing from the cache have no taxa,
+# so their works only count at the topic level until the topic is inserted.
+_TAGGED_WORKS_SQL = (
+    "SELECT DISTINCT w.id AS work_id, w.publication_year AS year, wt.topic_id, tp.subfield_id, tp.field_id, tp.domain_id "
+    "FROM works w JOIN works_topics wt ON wt.work_id = w.id LEFT JOIN topics tp ON tp.id = wt.topic_id "
+    "WHERE w.publication_year IS NOT NULL"
+)
+
+
+def _taxon_id(taxon_id: str) -> str:
+    """
+    The ID of a taxon as stored, e.g. "https://openalex.org/fields/17" -> "fields/17".
+    """
+    return taxon_id.replace(BASE_URL, "")
+
+
+def update_taxonomy(conn: sqlite3.Connection, topic_ids: List[str]):
+    """
+    REPLACE the domains, fields and subfields of inserted topics from their rows of the topics table.
+    Called by Topic.bulk_insert_rows, in its transaction.
+    """
+    params = (json_codec.dumps(stored_ids(conn, topic_ids, "T")),)
+    topics = "FROM topics WHERE id IN (SELECT value FROM json_each(?))"
+    conn.execute(f"REPLACE INTO domains (id, display_name) SELECT DISTINCT domain_id, domain_display_name {topics} AND domain_id IS NOT NULL", params)
+    conn.execute(f"REPLACE INTO fields (id, display_name, domain_id) SELECT DISTINCT field_id, field_display_name, domain_id {topics} AND field_id IS NOT NULL", params)
+    conn.execute(f"REPLACE INTO subfields (id, display_name, field_id, domain_id) SELECT DISTINCT subfield_id, subfield_display_name, field_id, domain_id {topics} AND subfield_id IS NOT NULL", params)
+
+
+def _rollup_rows(conn: sqlite3.Connection, work_ids: Optional[List[str]]) -> List[tuple]:
+    """
+    The (level, taxon_id, year, works_count) contributions of works (all the cached works for None) to topic_rollups.
+    A work counts once per taxon, however many of its topics are in it.
+    """
+    tagged_sql, params = _TAGGED_WORKS_SQL, []
+    if work_ids is not None:
+        tagged_sql += " AND w.id IN (SELECT value FROM json_each(?))"
+        params.append(json_codec.dumps(stored_ids(conn, work_ids, "W")))
+    rollup_sql = " UNION ALL ".join(
+        f"SELECT '{level}', {level}_id, year, COUNT(DISTINCT work_id) FROM tagged WHERE {level}_id IS NOT NULL GROUP BY {level}_id, year"
+        for level in ROLLUP_LEVELS
+    )
+    return conn.execute(f"WITH tagged AS ({tagged_sql}) {rollup_sql}", params).fetchall()
+
+
+def _add_to_rollups(conn: sqlite3.Connection, work_ids: List[str], sign: int):
+    rows = _rollup_rows(conn, work_ids)
+    if not rows:
+        return
+    conn.executemany("INSERT OR IGNORE INTO topic_rollups (level, taxon_id, year, works_count) VALUES (?, ?, ?, 0)", (row[:3] for row in rows))
+    conn.executemany("UPDATE topic_rollups SET works_count = works_count + ? WHERE level = ? AND taxon_id = ? AND year = ?",
+                     ((sign * works_count, level, taxon_id, year) for level, taxon_id, year, works_count in rows))
+    if sign < 0:
+        conn.executemany("DELETE FROM topic_rollups WHERE level = ? AND taxon_id = ? AND year = ? AND works_count <= 0", (row[:3] for row in rows))
+
+
+def add_works_to_rollups(conn: sqlite3.Connection, work_ids: List[str]):
+    """
+    Count cached works in topic_rollups, e.g. after inserting them. Called by Work.bulk_insert_rows, in its transaction.
+    """
+    _add_to_rollups(conn, work_ids, 1)
+
+
+def remove_works_from_rollups(conn: sqlite3.Connection, work_ids: List[str]):
+    """
+    Uncount cached works from topic_rollups, e.g. before replacing or deleting them. Called by Work.bulk_insert_rows, in its transaction,
+    and by Work.delete.
+    """
+    _add_to_rollups(conn, work_ids, -1)
+
+
+def works_with_topics(conn: sqlite3.Connection, topic_ids: List[str]) -> List[str]:
+    """
+    The cached works tagged with any of the topics. The lookup is indexed once the secondary indexes are created (see indexes.py).
+    """
+    raw_sql = "SELECT DISTINCT work_id FROM works_topics WHERE topic_id IN (SELECT value FROM json_each(?))"
+    rows = conn.execute(raw_sql, (json_codec.dumps(stored_ids(conn, topic_ids, "T")),))
+    return read_ids(conn, (row[0] for row in rows), "W")
+
+
+def rebuild_topic_rollups(conn: sqlite3.Connection):
+    """
+    Rebuild the taxonomy tables and topic_rollups from all the cached topics and works, e.g. for a cache created before they existed.
+    """
+    with conn:
+        update_taxonomy(conn, [row[0] for row in conn.execute("SELECT id FROM topics")])
+        conn.execute("DELETE FROM topic_rollups")
+        conn.executemany("INSERT INTO topic_rollups (level, taxon_id, year, works_count) VALUES (?, ?, ?, ?)", _rollup_rows(conn, None))
+
+
+def work_counts_by_year(conn: sqlite3.Connection, level: str = "field", taxon_ids: Optional[List[str]] = None,
+                        years: Optional[List[int]] = None) -> Dict[str, Dict[int, int]]:
+    """
+    The number of cached works per taxon and publication year, read from topic_rollups: {taxon_id: {year: works_count}}, e.g.
+    work_counts_by_year(conn, "field", ["fields/17"]) -> {"fields/17": {2019: 120, 2020: 135}}.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        level (str): "topic", "subfield", "field" or "domain".
+        taxon_ids (list[str]): Only count these taxa. Defaults to all of them.
+        years (list[int]): Only count these years. Defaults to all of them.
+    """
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown level: {level}. Choose from {list(ROLLUP_LEVELS)}")
+    raw_sql, params = "SELECT taxon_id, year, works_count FROM topic_rollups WHERE level = ?", [level]
+    if taxon_ids is not None:
+        raw_sql += " AND taxon_id IN (SELECT value FROM json_each(?))"
+        params.append(json_codec.dumps(stored_ids(conn, [_taxon_id(taxon_id) for taxon_id in taxon_ids], LEVEL_PREFIXES[level])))
+    if years is not None:
+        raw_sql += " AND year IN (SELECT value FROM json_each(?))"
+        params.append(json_codec.dumps(list(years)))
+    counts = {}
+    rows = conn.execute(raw_sql + " ORDER BY taxon_id, year", params).fetchall()
+    for taxon_id, (_, year, works_count) in zip(read_ids(conn, (row[0] for row in rows), LEVEL_PREFIXES[level]), rows):
+        counts.setdefault(taxon_id, {})[year] = works_count
+    return counts
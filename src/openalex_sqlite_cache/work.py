@@ -1,163 +1,286 @@
 import sqlite3
-import json
-from typing import Union, List
+from typing import Union, List, Optional, Dict, Iterable, Iterator
 
 import pyalex
 
-from .clean import remove_base_url
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.entity import Entity, MAX_SQL_VARIABLES
+from openalex_sqlite_cache.get_items_from_api import Transport
+from openalex_sqlite_cache.fetch_engine import FetchEngine
+from openalex_sqlite_cache.topic_taxonomy import add_works_to_rollups, remove_works_from_rollups
+
+def _int_or_none(value) -> Optional[int]:
+    """
+    Convert a boolean from the API payload to an INTEGER column value, keeping None.
+    """
+    if value is None:
+        return None
+    return int(value)
+
+def _bool_or_none(value) -> Optional[bool]:
+    """
+    Convert an INTEGER column value back to the API's boolean, keeping None.
+    """
+    if value is None:
+        return None
+    return bool(value)
+
+class Work(Entity):
+
+    TABLES = {
+        "works": ("id", "doi", "title", "display_name", "publication_year", "publication_date", "type", "cited_by_count", "is_retracted", "is_paratext", "cited_by_api_url", "abstract_inverted_index", "language", "updated_date"),
+        "works_primary_locations": ("work_id", "source_id", "landing_page_url", "pdf_url", "is_oa", "version", "license"),
+        "works_locations": ("work_id", "source_id", "landing_page_url", "pdf_url", "is_oa", "version", "license"),
+        "works_best_oa_locations": ("work_id", "source_id", "landing_page_url", "pdf_url", "is_oa", "version", "license"),
+        "works_authorships": ("work_id", "author_position", "author_id", "institution_id"),
+        "works_biblio": ("work_id", "volume", "issue", "first_page", "last_page"),
+        "works_topics": ("work_id", "topic_id", "score"),
+        "works_concepts": ("work_id", "concept_id", "score"),
+        "works_ids": ("work_id", "openalex", "doi", "mag", "pmid", "pmcid"),
+        "works_mesh": ("work_id", "descriptor_ui", "descriptor_name", "qualifier_ui", "qualifier_name", "is_major_topic"),
+        "works_open_access": ("work_id", "is_oa", "oa_status", "oa_url", "any_repository_has_fulltext"),
+        "works_referenced_works": ("work_id", "referenced_work_id"),
+        "works_related_works": ("work_id", "related_work_id"),
+    }
+
+    # The fields built from a child table, and their table (lazy reads load them on first access, and fields= reads only query their tables).
+    CHILD_FIELDS = {
+        "primary_location": "works_primary_locations",
+        "locations": "works_locations",
+        "best_oa_location": "works_best_oa_locations",
+        "authorships": "works_authorships",
+        "biblio": "works_biblio",
+        "topics": "works_topics",
+        "concepts": "works_concepts",
+        "ids": "works_ids",
+        "mesh": "works_mesh",
+        "open_access": "works_open_access",
+        "referenced_works": "works_referenced_works",
+        "related_works": "works_related_works",
+    }
+
+    # The external IDs to index in external_ids, as kind: [(table, column)] (see identifiers.py).
+    EXTERNAL_IDS = {"doi": [("works", "doi")], "pmid": [("works_ids", "pmid")]}
+
+    def __init__(self, work: Union[pyalex.Work, dict]):
+        super().__init__(work)
 
-class Work:
+    @staticmethod
+    def create_works_from_web_api_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str], transport: Optional[Transport] = None, engine: Optional[FetchEngine] = None) -> "Work":
+        """
+        Query the OpenAlex web API for a particular work(s) to create the pyalex.Work dict. Insert the work(s) into the database.
+        """
+        return Work._create_from_web_api_by_ids(conn, work_ids, transport=transport, engine=engine)
 
-    def __init__(self, work: pyalex.Work):
-        if not isinstance(work, pyalex.Work):
-            raise TypeError("work must be a pyalex.Work object")
-        self.work = work
-        self.work_id = remove_base_url(work['id'])
+    @staticmethod
+    def iter_works_from_db_by_ids(conn: sqlite3.Connection, work_ids: Union[Iterable[str], str], chunk_size: int = MAX_SQL_VARIABLES, lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> Iterator["Work"]:
+        """
+        Query the database for works to create their pyalex.Work dicts, in the order of the IDs (unknown IDs are left out).
+        Each table is read with one IN (...) query for all the works, and the child rows are grouped by work ID in a single pass.
+        The works are yielded as they are assembled, reading chunk_size IDs at a time, so memory stays flat for any number of IDs.
+        """
+        return Work._iter_from_db_by_ids(conn, work_ids, chunk_size, lazy, fields, compact)
 
     @staticmethod
-    def create_works_from_web_api_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str]) -> "Work":
+    def read_works_from_db_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str], lazy: bool = False, fields: Optional[List[str]] = None, compact: bool = False) -> List["Work"]:
         """
-        Query the OpenAlex web API for a particular work(s) to create the pyalex.Work dict. Insert the work(s) into the database.
+        Query the database for works to create their pyalex.Work dicts, in the order of the IDs (unknown IDs are left out).
+        Each table is read with one IN (...) query for all the works, and the child rows are grouped by work ID in a single pass.
+        With lazy=True, only the works table is read, and the child tables on first access to a child field (see LazyEntity).
+        With fields (e.g. ["display_name", "cited_by_count"]), the works only have those fields, and only their columns and tables are read.
+        With compact=True, the works are compact WorkRecord tuples of their rows, converted to dicts on demand (see records.EntityRecord).
         """
-        if not isinstance(work_ids, list):
-            work_ids = [work_ids]
-        pyalexWorks = pyalex.Works().get([work_ids]) # I think this may be the syntax for just one work. How to do this for a list of works at once?
-        works = [Work(w) for w in pyalexWorks]
-        for work in works:
-            work.insert_or_replace_in_db(conn)
-        return works
+        return list(Work.iter_works_from_db_by_ids(conn, work_ids, lazy=lazy, fields=fields, compact=compact))
 
     @staticmethod
-    def read_works_from_db_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str]) ->  "Work":
+    def _from_rows(result_work: tuple, child_rows: Dict[str, Dict[str, List[tuple]]]) -> "Work":
         """
-        Query the database for a particular work to create its pyalex.Work dict. 
+        Build the work from its row of the works table and the child rows grouped by work ID (see Entity._iter_rows).
         """
-        if not isinstance(work_ids, list):
-            work_ids = [work_ids]
+        work_id = result_work[0]
         work_dict = {}
-        cursor = conn.cursor()
-
         # WORKS
-        cursor.execute("SELECT * FROM works WHERE id=?", (remove_base_url(work_id),))
-        work_id = cursor.fetchone()
+        work_dict["id"] = Work._prepend_base_url(work_id)
+        work_dict["doi"] = result_work[1]
+        work_dict["title"] = result_work[2]
+        work_dict["display_name"] = result_work[3]
+        work_dict["publication_year"] = result_work[4]
+        work_dict["publication_date"] = result_work[5]
+        work_dict["type"] = result_work[6]
+        work_dict["cited_by_count"] = result_work[7]
+        work_dict["is_retracted"] = _bool_or_none(result_work[8])
+        work_dict["is_paratext"] = _bool_or_none(result_work[9])
+        work_dict["cited_by_api_url"] = result_work[10]
+        work_dict["abstract_inverted_index"] = json_codec.loads(result_work[11]) if result_work[11] is not None else None
+        work_dict["language"] = result_work[12]
+        work_dict["updated_date"] = result_work[13]
 
         # WORKS_PRIMARY_LOCATIONS
+        primary_locations = child_rows["works_primary_locations"].get(work_id, [])
+        work_dict["primary_location"] = Work._location_dict(primary_locations[0]) if primary_locations else None
 
         # WORKS_LOCATIONS
+        work_dict["locations"] = [Work._location_dict(row) for row in child_rows["works_locations"].get(work_id, [])]
 
         # WORKS_BEST_OA_LOCATIONS
+        best_oa_locations = child_rows["works_best_oa_locations"].get(work_id, [])
+        work_dict["best_oa_location"] = Work._location_dict(best_oa_locations[0]) if best_oa_locations else None
 
         # WORKS_AUTHORSHIPS
+        # One row per (author, institution): consecutive rows of the same author make up one authorship.
+        work_dict["authorships"] = []
+        for row in child_rows["works_authorships"].get(work_id, []):
+            author_id = Work._prepend_base_url(row[2])
+            authorships = work_dict["authorships"]
+            if not authorships or authorships[-1]["author"]["id"] != author_id or authorships[-1]["author_position"] != row[1]:
+                authorships.append({"author_position": row[1], "author": {"id": author_id}, "institutions": []})
+            if row[3] is not None:
+                authorships[-1]["institutions"].append({"id": Work._prepend_base_url(row[3])})
 
         # WORKS_BIBLIO
+        biblio = child_rows["works_biblio"].get(work_id)
+        if biblio:
+            work_dict["biblio"] = {"volume": biblio[0][1], "issue": biblio[0][2], "first_page": biblio[0][3], "last_page": biblio[0][4]}
+        else:
+            work_dict["biblio"] = {"volume": None, "issue": None, "first_page": None, "last_page": None}
 
         # WORKS_TOPICS
+        work_dict["topics"] = [{"id": Work._prepend_base_url(row[1]), "score": row[2]} for row in child_rows["works_topics"].get(work_id, [])]
 
         # WORKS_CONCEPTS
+        work_dict["concepts"] = [{"id": Work._prepend_base_url(row[1]), "score": row[2]} for row in child_rows["works_concepts"].get(work_id, [])]
 
         # WORKS_IDS
+        ids = child_rows["works_ids"].get(work_id)
+        work_dict["ids"] = {}
+        if ids:
+            for column, value in zip(Work.TABLES["works_ids"][1:], ids[0][1:]):
+                if value is not None:
+                    # The API returns the MAG ID as a string, the INTEGER column stores it as a number.
+                    work_dict["ids"][column] = str(value) if column == "mag" else value
 
         # WORKS_MESH
+        work_dict["mesh"] = [
+            {"descriptor_ui": row[1], "descriptor_name": row[2], "qualifier_ui": row[3], "qualifier_name": row[4], "is_major_topic": _bool_or_none(row[5])}
+            for row in child_rows["works_mesh"].get(work_id, [])
+        ]
 
         # WORKS_OPEN_ACCESS
+        open_access = child_rows["works_open_access"].get(work_id)
+        if open_access:
+            work_dict["open_access"] = {"is_oa": _bool_or_none(open_access[0][1]), "oa_status": open_access[0][2], "oa_url": open_access[0][3], "any_repository_has_fulltext": _bool_or_none(open_access[0][4])}
 
         # WORKS_REFERENCED_WORKS
+        work_dict["referenced_works"] = [Work._prepend_base_url(row[1]) for row in child_rows["works_referenced_works"].get(work_id, [])]
 
         # WORKS_RELATED_WORKS
+        work_dict["related_works"] = [Work._prepend_base_url(row[1]) for row in child_rows["works_related_works"].get(work_id, [])]
+
         return Work(pyalex.Work(work_dict))
     
+    read_from_db_by_ids = read_works_from_db_by_ids
+
+    @classmethod
+    def _before_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Uncount the cached versions of the works from the topic rollups (see topic_taxonomy.py).
+        """
+        remove_works_from_rollups(conn, entity_ids)
+
+    @classmethod
+    def _after_insert(cls, conn: sqlite3.Connection, entity_ids: List[str]):
+        """
+        Count the inserted works in the topic rollups (see topic_taxonomy.py).
+        """
+        add_works_to_rollups(conn, entity_ids)
+
     def delete(self, conn: sqlite3.Connection):
         """
         Delete the work from the database.
         """
-        work_id = self.work_id
-        conn.execute("DELETE FROM works WHERE id=?", (work_id,))
-        conn.execute("DELETE FROM works_primary_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_best_oa_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_authorships WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_biblio WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_topics WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_concepts WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_ids WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_mesh WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_open_access WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_referenced_works WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_related_works WHERE work_id=?", (work_id,))
+        work_id = self.id
+        stored_id = self._stored_id(conn)
+        self._delete_derived(conn, [work_id])
+        remove_works_from_rollups(conn, [work_id])
+        conn.execute("DELETE FROM works WHERE id=?", (stored_id,))
+        conn.execute("DELETE FROM works_primary_locations WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_locations WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_best_oa_locations WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_authorships WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_biblio WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_topics WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_concepts WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_ids WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_mesh WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_open_access WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_referenced_works WHERE work_id=?", (stored_id,))
+        conn.execute("DELETE FROM works_related_works WHERE work_id=?", (stored_id,))
         conn.commit()
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    @staticmethod
+    def _location_row(work_id: str, location: dict) -> tuple:
+        """
+        Flatten a location (primary, best OA or any other) into a row of the works_*locations tables.
+        """
+        source = location.get('source') or {}
+        return (work_id, Work._remove_base_url(source.get('id')), location['landing_page_url'], location['pdf_url'],
+                _int_or_none(location['is_oa']), location['version'], location['license'])
+
+    @staticmethod
+    def _location_dict(row: tuple) -> dict:
+        """
+        Rebuild a location from a row of the works_*locations tables (see _location_row).
+        """
+        return {
+            "source": {"id": Work._prepend_base_url(row[1])} if row[1] is not None else None,
+            "landing_page_url": row[2],
+            "pdf_url": row[3],
+            "is_oa": _bool_or_none(row[4]),
+            "version": row[5],
+            "license": row[6],
+        }
+
+    @staticmethod
+    def flatten(work: dict) -> Dict[str, List[tuple]]:
         """
-        Insert the work into the database.
+        Flatten the work into the rows of the works tables.
         """
-        work = self.work
-        work_id = self.work_id
+        work_id = Work._remove_base_url(work['id'])
         # WORKS
-        insert_tuple = (work_id, str(work['doi']), work['title'], work['display_name'], work['publication_year'], work['publication_date'], work['type'], work['cited_by_count'], int(work['is_retracted']), int(work['is_paratext']), work['cited_by_api_url'], json.dumps(work['abstract_inverted_index']), work['language'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works (id, doi, title, display_name, publication_year, publication_date, type, cited_by_count, is_retracted, is_paratext, cited_by_api_url, abstract_inverted_index, language) VALUES ({question_marks})", insert_tuple
-        )
+        works_rows = [(work_id, work['doi'], work['title'], work['display_name'], work['publication_year'], work['publication_date'], work['type'], work['cited_by_count'], _int_or_none(work['is_retracted']), _int_or_none(work['is_paratext']), work['cited_by_api_url'], json_codec.dumps(work['abstract_inverted_index']), work['language'], work.get('updated_date'))]
 
         # WORKS_PRIMARY_LOCATIONS
-        insert_tuple = (work_id, remove_base_url(work['primary_location']['source']['id']), work['primary_location']['landing_page_url'], 
-                       work['primary_location']['pdf_url'], int(work['primary_location']['is_oa']), work['primary_location']['version'], 
-                       work['primary_location']['license'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works_primary_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES ({question_marks})", insert_tuple
-        )
+        works_primary_locations_rows = []
+        if work.get('primary_location'):
+            works_primary_locations_rows.append(Work._location_row(work_id, work['primary_location']))
 
         # WORKS_LOCATIONS
-        for location in work['locations']:
-            insert_tuple = (work_id, remove_base_url(location['source']['id']), location['landing_page_url'], location['pdf_url'], 
-                          int(location['is_oa']), location['version'], location['license'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO works_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES ({question_marks})", insert_tuple
-            )
+        works_locations_rows = [Work._location_row(work_id, location) for location in work['locations']]
 
         # WORKS_BEST_OA_LOCATIONS
-        insert_tuple = (work_id, remove_base_url(work['best_oa_location']['source']['id']), work['best_oa_location']['landing_page_url'],
-                       work['best_oa_location']['pdf_url'], int(work['best_oa_location']['is_oa']), work['best_oa_location']['version'],
-                       work['best_oa_location']['license'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works_best_oa_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES ({question_marks})", insert_tuple
-        )
+        works_best_oa_locations_rows = []
+        if work.get('best_oa_location'):
+            works_best_oa_locations_rows.append(Work._location_row(work_id, work['best_oa_location']))
 
         # WORKS_AUTHORSHIPS
+        works_authorships_rows = []
         for authorship in work['authorships']:
+            author_id = Work._remove_base_url(authorship['author']['id'])
             for institution in authorship['institutions']:
-                insert_tuple = (work_id, authorship['author_position'], remove_base_url(authorship['author']['id']), 
-                              remove_base_url(institution['id']))
-                question_marks = ', '.join(['?'] * len(insert_tuple))
-                conn.execute(
-                    f"REPLACE INTO works_authorships (work_id, author_position, author_id, institution_id) VALUES ({question_marks})", insert_tuple
-                )
+                works_authorships_rows.append((work_id, authorship['author_position'], author_id, Work._remove_base_url(institution['id'])))
+            if not authorship['institutions']:
+                # Keep the authors without an institution too.
+                works_authorships_rows.append((work_id, authorship['author_position'], author_id, None))
 
         # WORKS_BIBLIO
-        insert_tuple = (work_id, work['biblio']['volume'], work['biblio']['issue'], work['biblio']['first_page'], work['biblio']['last_page'])
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works_biblio (work_id, volume, issue, first_page, last_page) VALUES ({question_marks})", insert_tuple
-        )
+        biblio = work['biblio']
+        works_biblio_rows = [(work_id, biblio['volume'], biblio['issue'], biblio['first_page'], biblio['last_page'])]
 
         # WORKS_TOPICS
-        for topic in work['topics']:
-            insert_tuple = (work_id, remove_base_url(topic['id']), topic['score'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO works_topics (work_id, topic_id, score) VALUES ({question_marks})", insert_tuple
-            )
+        works_topics_rows = [(work_id, Work._remove_base_url(topic['id']), topic['score']) for topic in work['topics']]
 
         # WORKS_CONCEPTS
-        for concept in work['concepts']:
-            insert_tuple = (work_id, remove_base_url(concept['id']), concept['score'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO works_concepts (work_id, concept_id, score) VALUES ({question_marks})", insert_tuple
-            )
+        works_concepts_rows = [(work_id, Work._remove_base_url(concept['id']), concept['score']) for concept in work['concepts']]
 
         # WORKS_IDS
         work_ids = work['ids']
@@ -166,43 +289,33 @@ class Work:
         mag = work_ids.get('mag')
         pmid = work_ids.get('pmid')
         pmcid = work_ids.get('pmcid')
-        insert_tuple = (work_id, openalex_id, doi, mag, pmid, pmcid)
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works_ids (work_id, openalex, doi, mag, pmid, pmcid) VALUES ({question_marks})", insert_tuple
-        )
+        works_ids_rows = [(work_id, openalex_id, doi, mag, pmid, pmcid)]
 
         # WORKS_MESH
-        for mesh in work['mesh']:
-            insert_tuple = (work_id, mesh['descriptor_ui'], mesh['descriptor_name'], 
-                          mesh['qualifier_ui'], mesh['qualifier_name'], mesh['is_major_topic'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO works_mesh (work_id, descriptor_ui, descriptor_name, qualifier_ui, qualifier_name, is_major_topic) VALUES ({question_marks})", insert_tuple
-            )
+        works_mesh_rows = [(work_id, mesh['descriptor_ui'], mesh['descriptor_name'], mesh['qualifier_ui'], mesh['qualifier_name'], _int_or_none(mesh['is_major_topic'])) for mesh in work['mesh']]
 
         # WORKS_OPEN_ACCESS
-        insert_tuple = (work_id, int(work['open_access']['is_oa']), work['open_access']['oa_status'], 
-                       work['open_access']['oa_url'], int(work['open_access']['any_repository_has_fulltext']))
-        question_marks = ', '.join(['?'] * len(insert_tuple))
-        conn.execute(
-            f"REPLACE INTO works_open_access (work_id, is_oa, oa_status, oa_url, any_repository_has_fulltext) VALUES ({question_marks})", insert_tuple
-        )
+        open_access = work['open_access']
+        works_open_access_rows = [(work_id, _int_or_none(open_access['is_oa']), open_access['oa_status'], open_access['oa_url'], _int_or_none(open_access['any_repository_has_fulltext']))]
 
         # WORKS_REFERENCED_WORKS
-        for referenced_work_id in work['referenced_works']:
-            insert_tuple = (work_id, remove_base_url(referenced_work_id))
-            question_marks = ', '.join(['?'] * len(insert_tuple))            
-            conn.execute(
-                f"REPLACE INTO works_referenced_works (work_id, referenced_work_id) VALUES ({question_marks})", insert_tuple
-            )
+        works_referenced_works_rows = [(work_id, Work._remove_base_url(referenced_work_id)) for referenced_work_id in work['referenced_works']]
 
         # WORKS_RELATED_WORKS
-        for related_work_id in work['related_works']:
-            insert_tuple = (work['id'], remove_base_url(related_work_id))
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO works_related_works (work_id, related_work_id) VALUES ({question_marks})", insert_tuple
-            )
-
-        conn.commit()
\ No newline at end of file
+        works_related_works_rows = [(work_id, Work._remove_base_url(related_work_id)) for related_work_id in work['related_works']]
+
+        return {
+            "works": works_rows,
+            "works_primary_locations": works_primary_locations_rows,
+            "works_locations": works_locations_rows,
+            "works_best_oa_locations": works_best_oa_locations_rows,
+            "works_authorships": works_authorships_rows,
+            "works_biblio": works_biblio_rows,
+            "works_topics": works_topics_rows,
+            "works_concepts": works_concepts_rows,
+            "works_ids": works_ids_rows,
+            "works_mesh": works_mesh_rows,
+            "works_open_access": works_open_access_rows,
+            "works_referenced_works": works_referenced_works_rows,
+            "works_related_works": works_related_works_rows,
+        }
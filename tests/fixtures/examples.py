@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+def _restore_literals(value):
+    """Some examples were saved with True/False/None quoted as strings (see Entity._clean_string). Turn them back into literals."""
+    if isinstance(value, dict):
+        return {k: _restore_literals(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore_literals(v) for v in value]
+    return {"True": True, "False": False, "None": None}.get(value, value) if isinstance(value, str) else value
+
+def load_web_api_example(name: str) -> dict:
+    """Load tests/examples_from_web_API/example_<name>.json as the web API would return it."""
+    with open(f'tests/examples_from_web_API/example_{name}.json', 'r') as f:
+        return _restore_literals(json.load(f))
+
+def copies_with_ids(example: dict, n: int) -> list:
+    """Make n copies of an example, each with its own OpenAlex ID."""
+    prefix, number = example["id"].rsplit("/", 1)[-1][0], int(example["id"].rsplit("/", 1)[-1][1:])
+    # Decoding a JSON string is much faster than deepcopy for these nested dicts.
+    encoded = json.dumps(example)
+    copies = []
+    for i in range(n):
+        entity = json.loads(encoded)
+        entity["id"] = f"https://openalex.org/{prefix}{number + i}"
+        entity["ids"]["openalex"] = entity["id"]
+        copies.append(entity)
+    return copies
+
+@pytest.fixture
+def mock_author_response_from_web_api():
+    """Fixture to mock response from the OpenAlex API."""
+    return load_web_api_example("author")
@@ -2,9 +2,14 @@ import pytest
 
 from openalex_sqlite_cache.init_db import init_openalex_db
 
-@pytest.fixture(scope="session")
-def conn():
+def _memory_conn():
     """Fixture to provide a SQLite in-memory database connection."""
-    conn = init_openalex_db(":memory:")    
+    conn = init_openalex_db(":memory:")
     yield conn
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+# One connection shared by the tests of a session (the network tests read what the previous test inserted)...
+conn = pytest.fixture(scope="session", name="conn")(_memory_conn)
+
+# ...and a fresh one per test, for the tests that count or compare the rows they insert.
+db_conn = pytest.fixture(name="db_conn")(_memory_conn)
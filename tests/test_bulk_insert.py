@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.funder import Funder
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.work import Work
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+def count_rows(conn: sqlite3.Connection, table: str) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_bulk_insert_works_uses_one_statement_per_table(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 200)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    Work.bulk_insert(db_conn, works)
+
+    db_conn.set_trace_callback(None)
+    distinct_statements = {s.split(" VALUES")[0].split(" WHERE")[0] for s in statements}
+    # BEGIN, COMMIT, one DELETE per child table, one REPLACE per non-empty table (the example has no MeSH terms), one for refresh_log
+    # one DELETE and one REPLACE for external_ids, one SELECT of the raw payload settings, and the topic rollup update
+    # (one SELECT of the rollup rows of the works, before and after, then one INSERT and one UPDATE of topic_rollups)
+    assert len(distinct_statements) == 2 + (len(Work.TABLES) - 1) + (len(Work.TABLES) - 1) + 1 + 2 + 1 + 3
+    assert statements.count("COMMIT") == 1
+    assert count_rows(db_conn, "works") == 200
+    assert count_rows(db_conn, "works_referenced_works") == 200 * len(works[0]["referenced_works"])
+    assert count_rows(db_conn, "works_locations") == 200 * len(works[0]["locations"])
+
+def test_bulk_insert_replaces_child_rows(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 3)
+    Work.bulk_insert(db_conn, works)
+    works[0]["referenced_works"] = works[0]["referenced_works"][:2]
+    Work.bulk_insert(db_conn, [Work(w) for w in works])
+    referenced = db_conn.execute("SELECT COUNT(*) FROM works_referenced_works WHERE work_id=?", (Work._remove_base_url(works[0]["id"]),)).fetchone()[0]
+    assert referenced == 2
+    assert count_rows(db_conn, "works") == 3
+    assert count_rows(db_conn, "works_locations") == 3 * len(works[0]["locations"])
+
+def test_bulk_insert_other_entity_types(db_conn: sqlite3.Connection):
+    Author.bulk_insert(db_conn, copies_with_ids(load_web_api_example("author"), 10))
+    Funder.bulk_insert(db_conn, copies_with_ids(load_web_api_example("funder"), 10))
+    Source.bulk_insert(db_conn, copies_with_ids(load_web_api_example("source"), 10))
+    assert count_rows(db_conn, "authors") == 10
+    assert count_rows(db_conn, "authors_ids") == 10
+    assert count_rows(db_conn, "funders_counts_by_year") == 10 * len(load_web_api_example("funder")["counts_by_year"])
+    assert count_rows(db_conn, "sources_ids") == 10
+    funder = Funder.read_funders_from_db_by_ids(db_conn, ["https://openalex.org/F4320332161"])[0]
+    assert funder.data["ids"]["ror"] == "https://ror.org/01cwqze88"
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
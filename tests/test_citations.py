@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import entity
+from openalex_sqlite_cache.citations import cited_by, co_citation, k_hop, references, related
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+# W1 -> W2 -> W4, W1 -> W3 -> W4, W5 -> W2, W5 -> W3
+GRAPH = {1: [2, 3], 2: [4], 3: [4], 4: [], 5: [2, 3]}
+
+def make_works(graph: dict) -> list:
+    template = load_web_api_example("work")
+    template["id"] = "https://openalex.org/W1"
+    works = copies_with_ids(template, max(graph))
+    for work in works:
+        number = int(work["id"].rsplit("W", 1)[-1])
+        work["doi"] = None
+        work["ids"] = {"openalex": work["id"]}
+        work["referenced_works"] = [f"https://openalex.org/W{n}" for n in graph.get(number, [])]
+        work["related_works"] = [f"https://openalex.org/W{n}" for n in graph.get(number, [])][:1]
+    return works
+
+@pytest.fixture
+def db_conn():
+    """Fixture to provide a fresh SQLite in-memory database connection with the works of GRAPH."""
+    conn = init_openalex_db(":memory:")
+    Work.bulk_insert(conn, make_works(GRAPH))
+    yield conn
+    conn.close()
+
+def test_references_and_cited_by(db_conn: sqlite3.Connection):
+    assert references(db_conn, ["https://openalex.org/W1", "W4", "W9"]) == {"W1": ["W2", "W3"], "W4": [], "W9": []}
+    assert cited_by(db_conn, ["W2", "W4"]) == {"W2": ["W1", "W5"], "W4": ["W2", "W3"]}
+    assert related(db_conn, "W1") == {"W1": ["W2"]}
+
+@pytest.mark.parametrize("direction, depth, expected", [
+    ("references", 1, {"W1": 0, "W2": 1, "W3": 1}),
+    ("references", 5, {"W1": 0, "W2": 1, "W3": 1, "W4": 2}),
+    ("cited_by", 2, {"W1": 0}),
+    ("both", 2, {"W1": 0, "W2": 1, "W3": 1, "W4": 2, "W5": 2}),
+])
+def test_k_hop(db_conn: sqlite3.Connection, direction: str, depth: int, expected: dict):
+    assert k_hop(db_conn, ["W1"], depth, direction) == expected
+
+def test_k_hop_is_one_query_per_hop(db_conn: sqlite3.Connection):
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    k_hop(db_conn, ["W1", "W5"], 3, "references")
+    db_conn.set_trace_callback(None)
+    assert len(statements) == 3
+
+def test_neighbors_with_temp_table(db_conn: sqlite3.Connection, monkeypatch):
+    expected = references(db_conn, ["W1", "W2", "W3", "W4", "W5", "W6"])
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", 3)
+    assert references(db_conn, ["W1", "W2", "W3", "W4", "W5", "W6"]) == expected
+
+def test_co_citation(db_conn: sqlite3.Connection):
+    assert co_citation(db_conn, "W2", "https://openalex.org/W3") == 2
+    assert co_citation(db_conn, "W2", "W4") == 0
+
+def test_k_hop_fetches_missing_works(db_conn: sqlite3.Connection):
+    missing_works = {w["id"].rsplit("/", 1)[-1]: w for w in make_works({6: [7], 7: [1]})[5:]}
+    requested = []
+
+    def transport(url, params):
+        ids = params["filter"].split(":", 1)[1].split("|")
+        requested.extend(ids)
+        return {"results": [missing_works[i] for i in ids if i in missing_works]}
+
+    hops = k_hop(db_conn, ["W6"], 3, "references", fetch_missing=True, transport=transport)
+
+    assert hops == {"W6": 0, "W7": 1, "W1": 2, "W2": 3, "W3": 3}
+    # W1 is cached; W2 and W3 are never expanded.
+    assert requested == ["W6", "W7"]
+
+def test_unknown_direction(db_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        k_hop(db_conn, ["W1"], 1, "sideways")
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
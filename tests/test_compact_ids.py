@@ -0,0 +1,167 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import entity
+from openalex_sqlite_cache.citations import cited_by, co_citation, k_hop, references
+from openalex_sqlite_cache.compact_ids import decode_id, encode_id
+from openalex_sqlite_cache.concept_hierarchy import ancestors, descendants, works_with_descendants
+from openalex_sqlite_cache.freshness import find_stale_ids
+from openalex_sqlite_cache.topic_taxonomy import work_counts_by_year, works_with_topics
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.concept import Concept
+from openalex_sqlite_cache.funder import Funder
+from openalex_sqlite_cache.institution import Institution
+from openalex_sqlite_cache.publisher import Publisher
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.topic import Topic
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db, open_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+ENTITY_EXAMPLES = [
+    (Author, "author"),
+    (Concept, "concept"),
+    (Funder, "funder"),
+    (Institution, "institution"),
+    (Publisher, "publisher"),
+    (Source, "source"),
+    (Topic, "topic"),
+    (Work, "work"),
+]
+
+# W1 -> W2 -> W4, W1 -> W3 -> W4, W5 -> W2, W5 -> W3
+GRAPH = {1: [2, 3], 2: [4], 3: [4], 4: [], 5: [2, 3]}
+
+def make_works(graph: dict) -> list:
+    template = load_web_api_example("work")
+    template["id"] = "https://openalex.org/W1"
+    works = copies_with_ids(template, max(graph))
+    for work in works:
+        number = int(work["id"].rsplit("W", 1)[-1])
+        work["doi"] = None
+        work["ids"] = {"openalex": work["id"]}
+        work["referenced_works"] = [f"https://openalex.org/W{n}" for n in graph[number]]
+        work["concepts"] = [{"id": f"https://openalex.org/C{number % 3 + 1}", "score": 0.5}]
+    return works
+
+def make_concepts() -> list:
+    """C1 -> C2 -> C3."""
+    template = load_web_api_example("concept")
+    template["id"] = "https://openalex.org/C1"
+    concepts = copies_with_ids(template, 3)
+    for number, concept in enumerate(concepts, 1):
+        concept["level"] = number - 1
+        concept["ancestors"] = [{"id": f"https://openalex.org/C{n}", "level": n - 1} for n in range(number - 1, 0, -1)]
+    return concepts
+
+@pytest.fixture
+def db_conns():
+    """Fixture to provide a regular and a compact in-memory cache."""
+    conns = init_openalex_db(":memory:"), init_openalex_db(":memory:", compact_ids=True)
+    yield conns
+    for conn in conns:
+        conn.close()
+
+def test_encode_id():
+    assert encode_id("W2741809807", "W") == 2741809807
+    assert decode_id(2741809807, "W") == "W2741809807"
+    assert encode_id("fields/17", "fields/") == 17
+    # Values that would not survive the round trip are stored as they are.
+    for value in ["W012", "A1", "W", "W1x", None]:
+        assert encode_id(value, "W") == value
+        assert decode_id(encode_id(value, "W"), "W") == value
+
+@pytest.mark.parametrize("entity_class, name", ENTITY_EXAMPLES)
+@pytest.mark.parametrize("temp_table_threshold", [entity.TEMP_TABLE_THRESHOLD, 0])
+def test_reads_match_a_regular_cache(db_conns, monkeypatch, entity_class, name: str, temp_table_threshold: int):
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", temp_table_threshold)
+    entities = copies_with_ids(load_web_api_example(name), 3)
+    ids = [e["id"] for e in reversed(entities)]
+    regular, compact = [], []
+    for conn, read in zip(db_conns, (regular, compact)):
+        entity_class.bulk_insert(conn, entities)
+        read.append([e.data for e in entity_class.read_from_db_by_ids(conn, ids)])
+        read.append([e.data for e in entity_class.read_from_db_by_ids(conn, ids, lazy=True)])
+        read.append([e.data for e in entity_class.read_from_db_by_ids(conn, ids, fields=["id", "display_name"])])
+        read.append(entity_class._existing_ids(conn, [i.rsplit("/", 1)[-1] for i in ids] + [name[0].upper() + "0"]))
+    assert compact == regular
+    assert [data["id"] for data in compact[0]] == ids
+
+def test_schema(db_conns):
+    _, conn = db_conns
+    Work.bulk_insert(conn, make_works(GRAPH))
+    assert conn.execute("SELECT DISTINCT typeof(id) FROM works").fetchall() == [("integer",)]
+    assert conn.execute("SELECT DISTINCT typeof(work_id), typeof(referenced_work_id) FROM works_referenced_works").fetchall() == [("integer", "integer")]
+    assert conn.execute("SELECT DISTINCT typeof(id) FROM refresh_log").fetchall() == [("integer",)]
+    assert conn.execute("SELECT work_id, referenced_work_id, position FROM works_referenced_works WHERE work_id = 1").fetchall() == [(1, 2, 0), (1, 3, 1)]
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'works_referenced_works'").fetchone()[0]
+    assert "PRIMARY KEY (work_id, position)" in sql and sql.endswith("WITHOUT ROWID")
+    # The primary key of the child tables replaces their index on the entity ID.
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'works_referenced_works_work_id_idx'").fetchall() == []
+
+def test_derived_tables_match_a_regular_cache(db_conns):
+    results = []
+    for conn in db_conns:
+        Concept.bulk_insert(conn, make_concepts())
+        Topic.bulk_insert(conn, [load_web_api_example("topic")])
+        works = make_works(GRAPH)
+        for work in works:
+            work["topics"] = [{"id": "https://openalex.org/T11636", "score": 0.9}]
+        Work.bulk_insert(conn, works)
+        results.append([
+            references(conn, ["W1", "W4", "W9"]),
+            cited_by(conn, ["W2", "W4"]),
+            co_citation(conn, "W2", "W3"),
+            k_hop(conn, "W1", depth=2),
+            descendants(conn, "C1"),
+            ancestors(conn, "C3", include_self=True),
+            works_with_descendants(conn, "C2"),
+            work_counts_by_year(conn, "field", ["fields/27"]),
+            work_counts_by_year(conn, "topic"),
+            sorted(works_with_topics(conn, ["T11636"])),
+            sorted(find_stale_ids(conn, "works", now="2100-01-01T00:00:00")),
+        ])
+    assert results[1] == results[0]
+    assert results[1][0] == {"W1": ["W2", "W3"], "W4": [], "W9": []}
+    assert results[1][7] == {"fields/27": {2018: 5}}
+
+def test_delete(db_conns):
+    _, conn = db_conns
+    Work.bulk_insert(conn, make_works(GRAPH))
+    Work.read_from_db_by_ids(conn, "W2")[0].delete(conn)
+    assert Work.read_from_db_by_ids(conn, ["W1", "W2"])[0].id == "W1"
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works WHERE work_id = 2").fetchone()[0] == 0
+    assert cited_by(conn, "W4") == {"W4": ["W3"]}
+
+def test_reopen(tmp_path):
+    file_path = str(tmp_path / "compact.db")
+    conn = init_openalex_db(file_path, compact_ids=True)
+    Work.bulk_insert(conn, make_works(GRAPH))
+    conn.close()
+    conn = open_openalex_db(file_path)
+    assert conn.compact_ids
+    assert references(conn, "W5") == {"W5": ["W2", "W3"]}
+    conn.close()
+    with pytest.raises(ValueError):
+        open_openalex_db(file_path, compact_ids=False)
+    conn = init_openalex_db(str(tmp_path / "regular.db"))
+    conn.close()
+    with pytest.raises(ValueError):
+        open_openalex_db(str(tmp_path / "regular.db"), compact_ids=True)
+
+def test_smaller_file(tmp_path):
+    sizes = []
+    for name, compact_ids in [("regular.db", False), ("compact.db", True)]:
+        conn = init_openalex_db(str(tmp_path / name), compact_ids=compact_ids)
+        Work.bulk_insert(conn, copies_with_ids(load_web_api_example("work"), 200))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        conn.execute("VACUUM")
+        sizes.append(conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0])
+        conn.close()
+    assert sizes[1] < sizes[0]
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
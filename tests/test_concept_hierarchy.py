@@ -0,0 +1,112 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.concept import Concept
+from openalex_sqlite_cache.concept_hierarchy import ancestors, descendants, rebuild_concept_closure, works_with_descendants
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+# C1 -> C2 -> C3 and C1 -> C4, as {concept: (level, ancestors)}. OpenAlex lists all the ancestors of a concept, not only its parents.
+HIERARCHY = {1: (0, []), 2: (1, [1]), 3: (2, [2, 1]), 4: (1, [1])}
+
+# The concepts each work is tagged with.
+WORK_CONCEPTS = {1: [3], 2: [4], 3: [1], 4: [5]}
+
+def make_concepts(hierarchy: dict) -> dict:
+    template = load_web_api_example("concept")
+    template["id"] = "https://openalex.org/C1"
+    concepts = {}
+    for concept in copies_with_ids(template, max(hierarchy)):
+        number = int(concept["id"].rsplit("C", 1)[-1])
+        if number in hierarchy:
+            level, ancestor_numbers = hierarchy[number]
+            concept["level"] = level
+            concept["ancestors"] = [{"id": f"https://openalex.org/C{n}", "level": hierarchy[n][0]} for n in ancestor_numbers]
+            concepts[number] = concept
+    return concepts
+
+def make_works(work_concepts: dict) -> list:
+    template = load_web_api_example("work")
+    template["id"] = "https://openalex.org/W1"
+    works = copies_with_ids(template, max(work_concepts))
+    for work in works:
+        number = int(work["id"].rsplit("W", 1)[-1])
+        work["doi"] = None
+        work["ids"] = {"openalex": work["id"]}
+        work["concepts"] = [{"id": f"https://openalex.org/C{n}", "score": 0.5} for n in work_concepts[number]]
+    return works
+
+def closure_rows(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT ancestor_id, descendant_id, depth FROM concepts_closure ORDER BY ancestor_id, descendant_id").fetchall()
+
+@pytest.fixture
+def db_conn():
+    """Fixture to provide a fresh SQLite in-memory database connection with the concepts of HIERARCHY and the works of WORK_CONCEPTS."""
+    conn = init_openalex_db(":memory:")
+    Concept.bulk_insert(conn, make_concepts(HIERARCHY).values())
+    Work.bulk_insert(conn, make_works(WORK_CONCEPTS))
+    yield conn
+    conn.close()
+
+def test_descendants_and_ancestors(db_conn: sqlite3.Connection):
+    assert descendants(db_conn, "https://openalex.org/C1") == {"C2": 1, "C4": 1, "C3": 2}
+    assert descendants(db_conn, "C1", max_depth=1, include_self=True) == {"C1": 0, "C2": 1, "C4": 1}
+    assert descendants(db_conn, "C3") == {}
+    assert ancestors(db_conn, "C3") == {"C2": 1, "C1": 2}
+
+def test_works_with_descendants(db_conn: sqlite3.Connection):
+    assert works_with_descendants(db_conn, "C1") == ["W1", "W2", "W3"]
+    assert works_with_descendants(db_conn, "C1", include_self=False) == ["W1", "W2"]
+    assert works_with_descendants(db_conn, "C2") == ["W1"]
+    assert works_with_descendants(db_conn, "C1", min_score=0.9) == []
+
+def test_closure_does_not_depend_on_insert_order(db_conn: sqlite3.Connection):
+    expected = closure_rows(db_conn)
+    conn = init_openalex_db(":memory:")
+    concepts = make_concepts(HIERARCHY)
+    # Descendants first, one at a time: each insert updates the concepts already below it.
+    for number in [3, 4, 2, 1]:
+        Concept.bulk_insert(conn, [concepts[number]])
+    assert closure_rows(conn) == expected
+    rebuild_concept_closure(conn)
+    assert closure_rows(conn) == expected
+
+def test_reinserting_a_concept_moves_its_descendants(db_conn: sqlite3.Connection):
+    # C2 moves below C4, so C3 (below C2) is now below C4 too, before C3 itself is re-inserted.
+    concepts = make_concepts({**HIERARCHY, 2: (2, [4, 1])})
+    Concept.bulk_insert(db_conn, [concepts[2]])
+    assert ancestors(db_conn, "C2") == {"C4": 1, "C1": 2}
+    assert set(ancestors(db_conn, "C3")) == {"C2", "C4", "C1"}
+    assert set(descendants(db_conn, "C4")) == {"C2", "C3"}
+    # The depths follow the levels once C3 is re-inserted at its new level.
+    concepts = make_concepts({**HIERARCHY, 2: (2, [4, 1]), 3: (3, [2, 4, 1])})
+    Concept.bulk_insert(db_conn, [concepts[3]])
+    assert ancestors(db_conn, "C3") == {"C2": 1, "C4": 2, "C1": 3}
+    assert descendants(db_conn, "C4") == {"C2": 1, "C3": 2}
+
+def test_depth_follows_levels_when_parents_are_not_cached():
+    conn = init_openalex_db(":memory:")
+    concepts = make_concepts(HIERARCHY)
+    # C3 lists both C2 and C1 as ancestors: C1 is 2 levels up even though C2 is not cached.
+    Concept.bulk_insert(conn, [concepts[1], concepts[3]])
+    assert descendants(conn, "C1") == {"C3": 2}
+    assert descendants(conn, "C1", max_depth=1) == {}
+    assert ancestors(conn, "C3") == {"C2": 1, "C1": 2}
+    conn.close()
+
+def test_delete_removes_closure_rows(db_conn: sqlite3.Connection):
+    concepts = make_concepts(HIERARCHY)
+    Concept(concepts[2]).delete(db_conn)
+    assert "C2" not in descendants(db_conn, "C1")
+    assert "C2" not in ancestors(db_conn, "C3")
+    assert db_conn.execute("SELECT COUNT(*) FROM concepts_closure WHERE ancestor_id = 'C2' OR descendant_id = 'C2'").fetchone()[0] == 0
+    # Re-inserting the concept restores its rows on both sides, from the ancestors its descendants list.
+    Concept.bulk_insert(db_conn, [concepts[2]])
+    assert ancestors(db_conn, "C3") == {"C2": 1, "C1": 2}
+    assert descendants(db_conn, "C2") == {"C3": 1}
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
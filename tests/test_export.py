@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import export
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.export import iter_chunks, source_columns
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+@pytest.fixture
+def db_conn():
+    """Fixture to provide a fresh SQLite in-memory database connection with works and authors."""
+    conn = init_openalex_db(":memory:")
+    Work.bulk_insert(conn, copies_with_ids(load_web_api_example("work"), 10))
+    Author.bulk_insert(conn, copies_with_ids(load_web_api_example("author"), 3))
+    yield conn
+    conn.close()
+
+def test_iter_chunks(db_conn: sqlite3.Connection):
+    chunks = list(iter_chunks(db_conn, "works", ["id", "publication_year"], chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert all(len(row) == 2 for chunk in chunks for row in chunk)
+
+def test_iter_chunks_filters(db_conn: sqlite3.Connection):
+    work_ids = [row[0] for row in db_conn.execute("SELECT id FROM works LIMIT 3")]
+    rows = [row for chunk in iter_chunks(db_conn, "works_referenced_works", filters={"work_id": work_ids}) for row in chunk]
+    assert {row[0] for row in rows} == set(work_ids)
+    assert len(rows) == db_conn.execute("SELECT COUNT(*) FROM works_referenced_works WHERE work_id IN (?, ?, ?)", work_ids).fetchone()[0]
+    assert list(iter_chunks(db_conn, "works", ["id"], filters={"id": work_ids[0]})) == [[(work_ids[0],)]]
+
+def test_views_join_tables(db_conn: sqlite3.Connection):
+    assert source_columns(db_conn, "works_citations_view") == {
+        "work_id": "TEXT", "publication_year": "INTEGER", "referenced_work_id": "TEXT", "referenced_publication_year": "INTEGER",
+    }
+    rows = [row for chunk in iter_chunks(db_conn, "works_authorships_view", ["work_id", "publication_year", "author_id"]) for row in chunk]
+    assert len(rows) == db_conn.execute("SELECT COUNT(*) FROM works_authorships").fetchone()[0]
+
+@pytest.mark.parametrize("source, columns, filters", [
+    ("works; DROP TABLE works", None, None),
+    ("works", ["id", "nope"], None),
+    ("works", None, {"1=1 OR id": "W1"}),
+])
+def test_names_are_checked(db_conn: sqlite3.Connection, source, columns, filters):
+    with pytest.raises(ValueError):
+        next(iter_chunks(db_conn, source, columns, filters))
+
+@pytest.mark.skipif(export.pyarrow is not None, reason="pyarrow is installed")
+def test_arrow_export_requires_pyarrow(db_conn: sqlite3.Connection):
+    with pytest.raises(ImportError):
+        next(export.iter_record_batches(db_conn, "works"))
+
+@pytest.mark.skipif(export.pyarrow is None, reason="pyarrow is not installed")
+def test_record_batches_and_parquet(db_conn: sqlite3.Connection, tmp_path):
+    batches = list(export.iter_record_batches(db_conn, "authors_counts_by_year", chunk_size=5))
+    assert sum(batch.num_rows for batch in batches) == db_conn.execute("SELECT COUNT(*) FROM authors_counts_by_year").fetchone()[0]
+    assert all(batch.schema == batches[0].schema for batch in batches)
+    path = str(tmp_path / "works.parquet")
+    assert export.write_parquet(db_conn, path, "works", ["id", "publication_year", "cited_by_count"], chunk_size=4) == 10
+    table = export.pyarrow.parquet.read_table(path)
+    assert table.num_rows == 10
+    assert str(table.schema.field("publication_year").type) == "int64"
+
+@pytest.mark.skipif(export.numpy is None, reason="numpy is not installed")
+def test_numpy_chunks(db_conn: sqlite3.Connection):
+    chunks = list(export.iter_numpy_chunks(db_conn, "works", ["id", "publication_year", "cited_by_count"], chunk_size=6))
+    assert [len(chunk) for chunk in chunks] == [6, 4]
+    assert chunks[0].dtype["publication_year"] == export.numpy.dtype("i8")
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
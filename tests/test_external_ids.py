@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.identifiers import normalize_external_id
+from openalex_sqlite_cache.external_ids import resolve_ids
+from openalex_sqlite_cache.raw_payloads import enable_raw_payloads
+
+from fixtures.examples import load_web_api_example
+from fixtures.test_conn import db_conn
+
+class FilterTransport:
+    """Serves the example work for the doi and pmid filters, and records the filters requested."""
+
+    def __init__(self):
+        self.work = load_web_api_example("work")
+        self.filters = []
+
+    def __call__(self, url: str, params: dict) -> dict:
+        self.filters.append(params["filter"])
+        filter_name, values = params["filter"].split(":", 1)
+        known = {"doi": "10.7717/peerj.4375", "pmid": "29456894"}[filter_name]
+        return {"results": [self.work] if known in values.split("|") else []}
+
+@pytest.mark.parametrize("kind, value, expected", [
+    ("doi", "https://doi.org/10.7717/PEERJ.4375", "10.7717/peerj.4375"),
+    ("doi", "doi:10.7717/peerj.4375", "10.7717/peerj.4375"),
+    ("orcid", "https://orcid.org/0000-0001-6187-661x", "0000-0001-6187-661X"),
+    ("ror", "https://ror.org/00JMFR291", "00jmfr291"),
+    ("issn", "14764687", "1476-4687"),
+    ("pmid", "https://pubmed.ncbi.nlm.nih.gov/29456894", "29456894"),
+    ("pmid", None, None),
+])
+def test_normalize_external_id(kind, value, expected):
+    assert normalize_external_id(kind, value) == expected
+
+def test_normalize_invalid_external_id():
+    with pytest.raises(ValueError):
+        normalize_external_id("doi", "peerj.4375")
+    with pytest.raises(ValueError):
+        normalize_external_id("isbn", "978-3-16-148410-0")
+
+def test_resolve_cached_ids(db_conn: sqlite3.Connection):
+    Author.bulk_insert(db_conn, [load_web_api_example("author")])
+    Source.bulk_insert(db_conn, [load_web_api_example("source")])
+
+    def no_network(url, params):
+        raise AssertionError("The cache should have answered")
+
+    assert resolve_ids(db_conn, "orcid", ["0000-0001-6187-6610"], transport=no_network) == {"0000-0001-6187-6610": "A5023888391"}
+    # Both the ISSN-L and the other ISSNs of a source resolve to it.
+    assert resolve_ids(db_conn, "issn", ["0028-0836", "1476-4687"], transport=no_network) == {"0028-0836": "S137773608", "1476-4687": "S137773608"}
+
+def test_resolve_ids_fetches_missing_and_caches_them(db_conn: sqlite3.Connection):
+    transport = FilterTransport()
+    dois = ["https://doi.org/10.7717/peerj.4375", "10.1000/unknown"]
+
+    resolved = resolve_ids(db_conn, "doi", dois, transport=transport)
+
+    assert resolved == {"https://doi.org/10.7717/peerj.4375": "W2741809807", "10.1000/unknown": None}
+    assert transport.filters == ["doi:10.7717/peerj.4375|10.1000/unknown"]
+    assert db_conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 1
+    # The work's PMID was cached along with it.
+    assert resolve_ids(db_conn, "pmid", ["29456894"], transport=transport) == {"29456894": "W2741809807"}
+    assert resolve_ids(db_conn, "doi", ["10.7717/PEERJ.4375"], transport=transport) == {"10.7717/PEERJ.4375": "W2741809807"}
+    assert len(transport.filters) == 1
+
+def test_resolve_ids_without_fetching(db_conn: sqlite3.Connection):
+    transport = FilterTransport()
+    assert resolve_ids(db_conn, "doi", "10.7717/peerj.4375", fetch_missing=False, transport=transport) == {"10.7717/peerj.4375": None}
+    assert transport.filters == []
+
+def test_resolve_ids_with_malformed_values(db_conn: sqlite3.Connection):
+    transport = FilterTransport()
+    resolved = resolve_ids(db_conn, "doi", ["peerj.4375", "10.7717/peerj.4375", ""], transport=transport)
+    assert resolved == {"peerj.4375": None, "10.7717/peerj.4375": "W2741809807", "": None}
+    # Only the well-formed value is looked up.
+    assert transport.filters == ["doi:10.7717/peerj.4375"]
+
+def test_delete_forgets_derived_rows(db_conn: sqlite3.Connection):
+    enable_raw_payloads(db_conn, "authors")
+    author = load_web_api_example("author")
+    Author.bulk_insert(db_conn, [author])
+    Author(author).delete(db_conn)
+    for table in ["external_ids", "refresh_log", "raw_payloads"]:
+        assert db_conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    requested = []
+
+    def transport(url, params):
+        requested.append(params["filter"])
+        return {"results": []}
+
+    assert resolve_ids(db_conn, "orcid", ["0000-0001-6187-6610"], transport=transport) == {"0000-0001-6187-6610": None}
+    assert requested == ["orcid:0000-0001-6187-6610"]
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
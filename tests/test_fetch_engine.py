@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+import sqlite3
+
+import pytest
+import requests
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.fetch_engine import FetchEngine, TokenBucket
+from openalex_sqlite_cache import get_items_from_api
+from openalex_sqlite_cache.get_items_from_api import OpenAlexHTTPError
+from fixtures.test_conn import db_conn
+from fixtures.examples import mock_author_response_from_web_api
+
+class SlowTransport:
+    """Answers every requested ID after a random delay, and tracks how many requests run at the same time.
+    failures maps the first ID of a request to the status code (or the exception) of its first attempt."""
+
+    def __init__(self, template: dict, failures: dict = None):
+        self.template = template
+        self.failures = dict(failures or {})
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    def __call__(self, url: str, params: dict) -> dict:
+        requested_ids = params["filter"].split(":", 1)[1].split("|")
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failure = self.failures.pop(requested_ids[0], None)
+        try:
+            time.sleep(random.uniform(0, 0.01))
+            if isinstance(failure, Exception):
+                raise failure
+            if failure is not None:
+                raise OpenAlexHTTPError(failure, url)
+            return {"results": [dict(self.template, id="https://openalex.org/" + i) for i in requested_ids]}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def test_token_bucket_limits_rate():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=10, clock=lambda: now[0], sleep=sleep)
+    for _ in range(30):
+        bucket.acquire()
+    # The first 10 tokens are available immediately, the next 20 take 2 seconds.
+    assert now[0] == pytest.approx(2.0)
+
+def test_engine_keeps_order_and_bounds_concurrency(mock_author_response_from_web_api):
+    transport = SlowTransport(mock_author_response_from_web_api)
+    engine = FetchEngine(max_workers=3, requests_per_second=1000, transport=transport)
+    author_ids = [f"A{i}" for i in range(1000)]
+
+    batches = list(engine.iter_batches(author_ids))
+
+    assert len(batches) == 20
+    assert [short["id"].rsplit("/", 1)[-1] for batch in batches for short in batch] == author_ids
+    assert 1 < transport.max_in_flight <= 3
+
+def test_engine_retries_transient_errors(mock_author_response_from_web_api):
+    transport = SlowTransport(mock_author_response_from_web_api, failures={"A0": 429, "A50": 503})
+    sleeps = []
+    engine = FetchEngine(max_workers=2, requests_per_second=1000, transport=transport, sleep=sleeps.append)
+
+    authors = engine.get_entities_by_id([f"A{i}" for i in range(100)])
+
+    assert len(authors) == 100
+    assert transport.calls == 4
+    assert sorted(s for s in sleeps if s >= 0.5) == [0.5, 0.5]
+
+def test_engine_retries_timeouts(mock_author_response_from_web_api):
+    transport = SlowTransport(mock_author_response_from_web_api, failures={"A0": requests.Timeout()})
+    engine = FetchEngine(max_workers=2, requests_per_second=1000, transport=transport, sleep=lambda s: None)
+
+    assert len(engine.get_entities_by_id([f"A{i}" for i in range(50)])) == 50
+    assert transport.calls == 2
+
+def test_requests_transport_times_out(monkeypatch):
+    timeouts = []
+
+    class Session:
+        def get(self, url, params, auth, timeout):
+            timeouts.append(timeout)
+            raise requests.Timeout()
+
+    monkeypatch.setattr(get_items_from_api._thread_local, "session", Session(), raising=False)
+    engine = FetchEngine(max_retries=2, timeout=2.5, sleep=lambda s: None)
+    with pytest.raises(requests.Timeout):
+        engine.fetch_batch(["A1"])
+    assert timeouts == [2.5, 2.5, 2.5]
+
+def test_engine_does_not_retry_client_errors(mock_author_response_from_web_api):
+    transport = SlowTransport(mock_author_response_from_web_api, failures={"A0": 404})
+    engine = FetchEngine(max_workers=2, requests_per_second=1000, transport=transport, sleep=lambda s: None)
+    with pytest.raises(OpenAlexHTTPError):
+        engine.get_entities_by_id(["A0"])
+
+def test_create_authors_with_engine(db_conn: sqlite3.Connection, mock_author_response_from_web_api):
+    transport = SlowTransport(mock_author_response_from_web_api)
+    engine = FetchEngine(max_workers=4, requests_per_second=1000, transport=transport)
+    author_ids = [f"https://openalex.org/A{i}" for i in range(120)]
+
+    authors = Author.create_authors_from_web_api_by_ids(db_conn, author_ids, engine=engine)
+
+    assert [a.data["id"] for a in authors] == author_ids
+    count = db_conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0]
+    assert count == 120
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
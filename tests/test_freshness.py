@@ -0,0 +1,91 @@
+import sqlite3
+from datetime import timedelta
+
+import pytest
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.freshness import FreshnessPolicy, find_stale_ids, refresh_stale
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+class UpdatedDateTransport:
+    """Serves authors whose updated_date in the web API is given per ID."""
+
+    def __init__(self, api_updated_dates: dict):
+        self.template = load_web_api_example("author")
+        self.api_updated_dates = api_updated_dates
+        self.requests = []
+
+    def __call__(self, url: str, params: dict) -> dict:
+        requested_ids = params["filter"].split(":", 1)[1].split("|")
+        self.requests.append((params.get("select"), requested_ids))
+        results = []
+        for i in requested_ids:
+            if i not in self.api_updated_dates:
+                continue
+            result = dict(self.template, id="https://openalex.org/" + i, updated_date=self.api_updated_dates[i])
+            result["ids"] = dict(self.template["ids"], openalex=result["id"])
+            if params.get("select"):
+                result = {key: result[key] for key in params["select"].split(",")}
+            results.append(result)
+        return {"results": results}
+
+def insert_authors(conn: sqlite3.Connection, refreshed_date: str, n: int = 3) -> list:
+    authors = copies_with_ids(load_web_api_example("author"), n)
+    for author in authors:
+        author["updated_date"] = "2025-01-01T00:00:00"
+    Author.bulk_insert(conn, authors, refreshed_date=refreshed_date)
+    return [Author._remove_base_url(a["id"]) for a in authors]
+
+def test_find_stale_ids_uses_max_age(db_conn: sqlite3.Connection):
+    old_ids = insert_authors(db_conn, "2025-01-01T00:00:00")
+    policy = FreshnessPolicy(max_age=timedelta(days=30))
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-01-15T00:00:00") == []
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-03-01T00:00:00") == old_ids
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-03-01T00:00:00", limit=1) == old_ids[:1]
+    plan = " ".join(row[3] for row in db_conn.execute(
+        "EXPLAIN QUERY PLAN SELECT r.id FROM refresh_log r JOIN authors e ON e.id = r.id "
+        "WHERE r.entity_type = ? AND r.refreshed_date < ? ORDER BY r.refreshed_date LIMIT ?", ("authors", "x", 1)))
+    assert "refresh_log_refreshed_date_idx" in plan
+
+def test_refresh_stale_redownloads_everything_without_api_check(db_conn: sqlite3.Connection):
+    author_ids = insert_authors(db_conn, "2025-01-01T00:00:00")
+    transport = UpdatedDateTransport({i: "2025-02-01T00:00:00" for i in author_ids})
+    policy = FreshnessPolicy(max_age=timedelta(days=30))
+
+    refreshed = refresh_stale(db_conn, "authors", policy=policy, transport=transport, now="2025-03-01T00:00:00")
+
+    assert refreshed == author_ids
+    assert [select for select, _ in transport.requests] == [None]
+    dates = db_conn.execute("SELECT DISTINCT updated_date FROM authors").fetchall()
+    assert dates == [("2025-02-01T00:00:00",)]
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-03-02T00:00:00") == []
+
+def test_refresh_stale_only_redownloads_entities_updated_in_the_api(db_conn: sqlite3.Connection):
+    author_ids = insert_authors(db_conn, "2025-01-01T00:00:00")
+    transport = UpdatedDateTransport({author_ids[0]: "2025-01-01T00:00:00", author_ids[1]: "2025-02-01T00:00:00", author_ids[2]: "2025-01-01T00:00:00"})
+    policy = FreshnessPolicy(max_age=timedelta(days=30), check_api_updated_date=True)
+
+    refreshed = refresh_stale(db_conn, "authors", policy=policy, transport=transport, now="2025-03-01T00:00:00")
+
+    assert refreshed == [author_ids[1]]
+    assert transport.requests == [("id,updated_date", author_ids), (None, [author_ids[1]])]
+    # The unchanged authors were checked, so they are not due again.
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-03-02T00:00:00") == []
+
+@pytest.mark.parametrize("check_api_updated_date", [False, True])
+def test_refresh_stale_logs_ids_gone_from_the_api(db_conn: sqlite3.Connection, check_api_updated_date: bool):
+    author_ids = insert_authors(db_conn, "2025-01-01T00:00:00")
+    # The first author was deleted from the web API.
+    transport = UpdatedDateTransport({i: "2025-02-01T00:00:00" for i in author_ids[1:]})
+    policy = FreshnessPolicy(max_age=timedelta(days=30), check_api_updated_date=check_api_updated_date)
+    assert refresh_stale(db_conn, "authors", policy=policy, transport=transport, now="2025-03-01T00:00:00") == author_ids[1:]
+    assert find_stale_ids(db_conn, "authors", policy=policy, now="2025-03-02T00:00:00") == []
+
+def test_refresh_stale_rejects_unknown_entity_type(db_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        refresh_stale(db_conn, "grants")
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,88 @@
+import json
+import threading
+import sqlite3
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import pyalex
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.get_items_from_api import get_entities_by_id, get_entity_batch, MAX_IDS_PER_REQUEST
+from fixtures.test_conn import db_conn
+from fixtures.examples import mock_author_response_from_web_api
+
+class FakeTransport:
+    """Records the requests and answers them with copies of a template entity, one per requested ID."""
+
+    def __init__(self, template: dict):
+        self.template = template
+        self.requests = []
+
+    def __call__(self, url: str, params: dict) -> dict:
+        self.requests.append((url, params))
+        requested_ids = params["filter"].split(":", 1)[1].split("|")
+        # Answer in reverse order to check that the results are re-ordered.
+        results = [dict(self.template, id="https://openalex.org/" + i) for i in reversed(requested_ids)]
+        return {"meta": {"count": len(results)}, "results": results}
+
+def test_get_entities_by_id_batches_requests(mock_author_response_from_web_api):
+    """
+    120 IDs are fetched with 3 filter requests of at most 50 IDs each, and returned in the requested order.
+    """
+    transport = FakeTransport(mock_author_response_from_web_api)
+    author_ids = [f"https://openalex.org/A{i}" for i in range(120)]
+
+    authors = get_entities_by_id(author_ids, transport=transport)
+
+    assert len(transport.requests) == 3
+    for url, params in transport.requests:
+        assert url.endswith("/authors")
+        assert params["filter"].startswith("openalex_id:A")
+        assert len(params["filter"].split("|")) <= MAX_IDS_PER_REQUEST
+    assert [a["id"] for a in authors] == author_ids
+    assert all(isinstance(a, pyalex.Author) for a in authors)
+
+def test_get_entities_by_id_rejects_mixed_types():
+    with pytest.raises(ValueError):
+        get_entities_by_id(["A1", "W1"], transport=FakeTransport({}))
+    with pytest.raises(ValueError):
+        get_entity_batch([f"A{i}" for i in range(MAX_IDS_PER_REQUEST + 1)], transport=FakeTransport({}))
+
+def test_create_authors_from_stub_http_server(db_conn: sqlite3.Connection, mock_author_response_from_web_api, monkeypatch):
+    """
+    The default transport talks to whatever server pyalex.config.openalex_url points at.
+    """
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            requests_seen.append((urlparse(self.path).path, query))
+            body = json.dumps({"meta": {"count": 1}, "results": [mock_author_response_from_web_api]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setitem(pyalex.config, "openalex_url", f"http://127.0.0.1:{server.server_port}")
+    try:
+        authors = Author.create_authors_from_web_api_by_ids(db_conn, ["https://openalex.org/A5023888391"])
+    finally:
+        server.shutdown()
+
+    assert requests_seen == [("/authors", {"filter": ["openalex_id:A5023888391"], "per-page": ["1"]})]
+    assert len(authors) == 1
+    assert authors[0].data == mock_author_response_from_web_api
+    count = db_conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0]
+    assert count == 1
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
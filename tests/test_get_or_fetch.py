@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.cache import get_or_fetch
+
+from fixtures.examples import load_web_api_example
+from fixtures.test_conn import db_conn
+
+class ExampleTransport:
+    """Answers every requested ID with a copy of the example of its entity type, and records the requested IDs."""
+
+    def __init__(self):
+        self.templates = {
+            "authors": load_web_api_example("author"),
+            "institutions": load_web_api_example("institution"),
+            "topics": load_web_api_example("topic"),
+        }
+        self.requested_ids = []
+
+    def __call__(self, url: str, params: dict) -> dict:
+        template = self.templates[url.rsplit("/", 1)[-1]]
+        requested_ids = params["filter"].split(":", 1)[1].split("|")
+        self.requested_ids.extend(requested_ids)
+        results = []
+        for i in requested_ids:
+            result = dict(template, id="https://openalex.org/" + i)
+            result["ids"] = dict(template["ids"], openalex=result["id"])
+            if "select" in params:
+                result = {key: value for key, value in result.items() if key in params["select"].split(",")}
+            results.append(result)
+        return {"results": results}
+
+def test_get_or_fetch_only_fetches_missing_ids(db_conn: sqlite3.Connection):
+    transport = ExampleTransport()
+    first_ids = [f"A{i}" for i in range(60)]
+    authors = Author.get_or_fetch(db_conn, first_ids, transport=transport)
+    assert [a.id for a in authors] == first_ids
+    assert transport.requested_ids == first_ids
+
+    transport.requested_ids = []
+    requested_ids = ["A70", "https://openalex.org/A3", "A71", "A0", "A3"]
+    authors = Author.get_or_fetch(db_conn, requested_ids, transport=transport)
+    assert transport.requested_ids == ["A70", "A71"]
+    assert [a.id for a in authors] == ["A70", "A3", "A71", "A0", "A3"]
+    assert authors[0].origin == "db"
+
+    transport.requested_ids = []
+    Author.get_or_fetch(db_conn, first_ids, transport=transport)
+    assert transport.requested_ids == []
+
+def test_get_or_fetch_skips_ids_unknown_to_the_api(db_conn: sqlite3.Connection):
+    def empty_transport(url, params):
+        return {"results": []}
+    assert Author.get_or_fetch(db_conn, ["A1"], transport=empty_transport) == []
+
+def test_get_or_fetch_dispatches_on_first_letter(db_conn: sqlite3.Connection):
+    transport = ExampleTransport()
+    requested_ids = ["I1", "A1", "T1", "https://openalex.org/A2", "I1"]
+    entities = get_or_fetch(db_conn, requested_ids, transport=transport)
+    assert [(type(e).__name__, e.id) for e in entities] == [
+        ("Institution", "I1"), ("Author", "A1"), ("Topic", "T1"), ("Author", "A2"), ("Institution", "I1")
+    ]
+    with pytest.raises(ValueError):
+        get_or_fetch(db_conn, ["X1"], transport=transport)
+
+def test_get_or_fetch_with_fields_selects_and_does_not_cache(db_conn: sqlite3.Connection):
+    transport = ExampleTransport()
+    Author.get_or_fetch(db_conn, ["A1"], transport=transport)
+
+    authors = Author.get_or_fetch(db_conn, ["A2", "A1"], transport=transport, fields=["display_name", "cited_by_count"])
+
+    assert [a.data for a in authors] == [
+        {"id": "https://openalex.org/A2", "display_name": authors[0].data["display_name"], "cited_by_count": authors[0].data["cited_by_count"]},
+        {"id": "https://openalex.org/A1", "display_name": authors[0].data["display_name"], "cited_by_count": authors[0].data["cited_by_count"]},
+    ]
+    assert transport.requested_ids == ["A1", "A2"]
+    assert Author._existing_ids(db_conn, ["A1", "A2"]) == {"A1"}
+
+class MergingTransport(ExampleTransport):
+    """Answers the IDs of MERGED under the ID they were merged into, like the web API does."""
+
+    MERGED = {"A1": "A101", "A2": "A102"}
+
+    def __call__(self, url: str, params: dict) -> dict:
+        requested_ids = params["filter"].split(":", 1)[1].split("|")
+        answered_ids = dict.fromkeys(self.MERGED.get(i, i) for i in requested_ids)
+        return super().__call__(url, dict(params, filter="openalex_id:" + "|".join(answered_ids)))
+
+@pytest.mark.parametrize("requested_ids, expected_ids", [
+    # One merged ID per batch is paired with the unrequested entity.
+    (["A0", "A1"], ["A0", "A101"]),
+    # Several are requested again one at a time.
+    (["A1", "A0", "A2", "A1"], ["A101", "A0", "A102", "A101"]),
+])
+def test_get_or_fetch_returns_merged_entities(db_conn: sqlite3.Connection, requested_ids: list, expected_ids: list):
+    transport = MergingTransport()
+    assert [a.id for a in Author.get_or_fetch(db_conn, requested_ids, transport=transport)] == expected_ids
+    assert [a.id for a in Author.get_or_fetch(db_conn, requested_ids, transport=transport, fields=["id"])] == expected_ids
+
+def test_get_or_fetch_answers_merged_ids_from_the_database(db_conn: sqlite3.Connection):
+    transport = MergingTransport()
+    Author.get_or_fetch(db_conn, ["A0", "A1", "A2"], transport=transport)
+    transport.requested_ids = []
+
+    assert [a.id for a in Author.get_or_fetch(db_conn, ["A2", "A1", "A0"], transport=transport)] == ["A102", "A101", "A0"]
+    assert transport.requested_ids == []
+
+    Author.read_from_db_by_ids(db_conn, "A101")[0].delete(db_conn)
+    assert db_conn.execute("SELECT id, merged_into FROM merged_ids").fetchall() == [("A2", "A102")]
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.init_db import init_openalex_db
+from openalex_sqlite_cache.indexes import SECONDARY_INDEXES, deferred_secondary_indexes, index_name
+from fixtures.test_conn import db_conn
+
+def index_names(conn: sqlite3.Connection) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def query_plan(conn: sqlite3.Connection, sql: str, params=()) -> str:
+    return " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+def test_secondary_indexes_are_created(db_conn: sqlite3.Connection):
+    assert {index_name(table, columns) for table, columns in SECONDARY_INDEXES} <= index_names(db_conn)
+
+@pytest.mark.parametrize("sql", [
+    "SELECT work_id FROM works_authorships WHERE author_id = ?",
+    "SELECT work_id FROM works_referenced_works WHERE referenced_work_id = ?",
+    "SELECT work_id FROM works_concepts WHERE concept_id = ?",
+    "SELECT work_id FROM works_topics WHERE topic_id = ?",
+    "SELECT id FROM works WHERE doi = ?",
+    "SELECT id FROM authors WHERE orcid = ?",
+])
+def test_reverse_lookups_use_an_index(db_conn: sqlite3.Connection, sql: str):
+    assert "USING INDEX" in query_plan(db_conn, sql, ("x",))
+
+def test_init_without_secondary_indexes():
+    conn = init_openalex_db(":memory:", secondary_indexes=False)
+    assert not {index_name(table, columns) for table, columns in SECONDARY_INDEXES} & index_names(conn)
+    # The entity ID indexes of the child tables stay, since replacing an entity deletes its child rows by entity ID.
+    assert "works_authorships_work_id_idx" in index_names(conn)
+    conn.close()
+
+def test_deferred_secondary_indexes(db_conn: sqlite3.Connection):
+    secondary = {index_name(table, columns) for table, columns in SECONDARY_INDEXES}
+    with deferred_secondary_indexes(db_conn):
+        assert not secondary & index_names(db_conn)
+        db_conn.executemany("INSERT INTO works_authorships (work_id, author_id) VALUES (?, ?)", [(f"W{i}", f"A{i % 10}") for i in range(100)])
+    assert secondary <= index_names(db_conn)
+    assert db_conn.execute("SELECT COUNT(*) FROM works_authorships WHERE author_id = 'A1'").fetchone()[0] == 10
+
+def test_deferred_secondary_indexes_rebuilds_on_error(db_conn: sqlite3.Connection):
+    with pytest.raises(RuntimeError):
+        with deferred_secondary_indexes(db_conn):
+            raise RuntimeError("load failed")
+    assert {index_name(table, columns) for table, columns in SECONDARY_INDEXES} <= index_names(db_conn)
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
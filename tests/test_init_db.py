@@ -0,0 +1,77 @@
+import pytest
+
+import sqlite3
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import PRAGMA_PROFILES, apply_pragmas, init_openalex_db, open_openalex_db
+
+from fixtures.examples import load_web_api_example
+
+def pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+@pytest.mark.parametrize("profile", list(PRAGMA_PROFILES))
+def test_profiles_set_pragmas(tmp_path, profile):
+    conn = init_openalex_db(str(tmp_path / "cache.db"), profile=profile)
+    settings = PRAGMA_PROFILES[profile]
+    assert pragma(conn, "journal_mode") == "wal"
+    assert pragma(conn, "synchronous") == {"OFF": 0, "NORMAL": 1}[settings["synchronous"]]
+    assert pragma(conn, "cache_size") == settings["cache_size"]
+    assert pragma(conn, "busy_timeout") == settings["busy_timeout"]
+    assert pragma(conn, "temp_store") == 2
+    conn.close()
+
+def test_pragma_overrides(tmp_path):
+    conn = open_openalex_db(str(tmp_path / "cache.db"), profile="read-heavy", cache_size=-2048)
+    assert pragma(conn, "cache_size") == -2048
+    assert pragma(conn, "mmap_size") in (0, PRAGMA_PROFILES["read-heavy"]["mmap_size"])  # 0 where mmap is unavailable
+    conn.close()
+
+def test_invalid_pragmas(tmp_path):
+    conn = open_openalex_db(str(tmp_path / "cache.db"), profile=None)
+    with pytest.raises(ValueError):
+        apply_pragmas(conn, "fastest")
+    with pytest.raises(ValueError):
+        apply_pragmas(conn, None, foreign_keys=1)
+    with pytest.raises(ValueError):
+        apply_pragmas(conn, None, journal_mode="WAL; DROP TABLE authors")
+    conn.close()
+
+def test_reopen_existing_cache(tmp_path):
+    file_path = str(tmp_path / "cache.db")
+    conn = init_openalex_db(file_path)
+    Author.bulk_insert(conn, [load_web_api_example("author")])
+    conn.close()
+
+    conn = open_openalex_db(file_path)
+    assert conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 1
+    conn.close()
+
+    conn = init_openalex_db(file_path, overwrite=False)
+    assert conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 1
+    conn.close()
+
+    conn = init_openalex_db(file_path)
+    assert conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 0
+    conn.close()
+
+def test_open_adds_missing_columns(tmp_path):
+    file_path = str(tmp_path / "cache.db")
+    # A works table from before updated_date was added.
+    conn = sqlite3.connect(file_path)
+    conn.execute("CREATE TABLE works (id TEXT PRIMARY KEY, doi TEXT, title TEXT, display_name TEXT, publication_year INTEGER, publication_date TEXT, "
+                 "type TEXT, cited_by_count INTEGER, is_retracted INTEGER, is_paratext INTEGER, cited_by_api_url TEXT, abstract_inverted_index TEXT, language TEXT)")
+    conn.execute("INSERT INTO works (id, title) VALUES ('W1', 'Old')")
+    conn.commit()
+    conn.close()
+
+    conn = open_openalex_db(file_path)
+    assert conn.execute("SELECT id, title, updated_date FROM works").fetchall() == [("W1", "Old", None)]
+    work = load_web_api_example("work")
+    Work.bulk_insert(conn, [work])
+    assert Work.read_from_db_by_ids(conn, work["id"])[0].data["updated_date"] == work["updated_date"]
+    conn.close()
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
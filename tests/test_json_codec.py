@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.author import Author
+
+from fixtures.examples import load_web_api_example
+from fixtures.test_conn import db_conn
+
+BACKENDS = [name for name, available in json_codec.available_json_backends().items() if available]
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    backend = json_codec.backend
+    yield
+    json_codec.set_json_backend(backend)
+
+def test_default_backend_is_the_fastest_installed():
+    assert json_codec.set_json_backend() == BACKENDS[0]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_trip(backend: str):
+    json_codec.set_json_backend(backend)
+    work = load_web_api_example("work")
+    assert json_codec.loads(json_codec.dumps(work)) == work
+    assert json_codec.loads(json_codec.dumpb(work)) == work
+    assert json_codec.dumps(["a", "é"]) == '["a","é"]'
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_large_integers_fall_back_to_json(backend: str):
+    json_codec.set_json_backend(backend)
+    assert json_codec.loads(json_codec.dumps({"n": 2 ** 70})) == {"n": 2 ** 70}
+
+@pytest.mark.parametrize("writer", BACKENDS)
+@pytest.mark.parametrize("reader", BACKENDS)
+def test_backends_read_each_others_columns(db_conn: sqlite3.Connection, writer: str, reader: str):
+    author = load_web_api_example("author")
+    json_codec.set_json_backend(writer)
+    Author.bulk_insert(db_conn, [author])
+    json_codec.set_json_backend(reader)
+    assert Author.read_authors_from_db_by_ids(db_conn, author["id"])[0].data["display_name_alternatives"] == author["display_name_alternatives"]
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        json_codec.set_json_backend("simplejson")
+
+@pytest.mark.skipif(json_codec.msgspec is not None, reason="msgspec is installed")
+def test_missing_backend():
+    with pytest.raises(ImportError):
+        json_codec.set_json_backend("msgspec")
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
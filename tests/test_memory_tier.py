@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import json_codec
+from openalex_sqlite_cache.institution import Institution
+from openalex_sqlite_cache.memory_tier import MemoryTier, attach_memory_tier, detach_memory_tier, get_memory_tier
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+@pytest.fixture
+def db_conn():
+    """Fixture to provide a fresh SQLite in-memory database connection with 5 institutions."""
+    conn = init_openalex_db(":memory:")
+    Institution.bulk_insert(conn, copies_with_ids(load_web_api_example("institution"), 5))
+    yield conn
+    detach_memory_tier(conn)
+    conn.close()
+
+def institution_ids(conn: sqlite3.Connection) -> list:
+    return [row[0] for row in conn.execute("SELECT id FROM institutions ORDER BY rowid")]
+
+def test_hits_do_not_query_the_database(db_conn: sqlite3.Connection):
+    tier = attach_memory_tier(db_conn)
+    ids = institution_ids(db_conn)
+    first = Institution.read_institutions_from_db_by_ids(db_conn, ids)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    second = Institution.read_institutions_from_db_by_ids(db_conn, list(reversed(ids)) + ["I0"])
+    db_conn.set_trace_callback(None)
+    # Only the unknown ID goes to the database.
+    assert [s for s in statements if "I0" not in s] == []
+    assert [i.id for i in second] == list(reversed(ids))
+    assert [i.data for i in second] == [i.data for i in reversed(first)]
+    assert tier.stats()["institutions"] == {"hits": 5, "misses": 6, "evictions": 0, "entries": 5, "bytes": 0}
+
+def test_projected_reads_bypass_the_tier(db_conn: sqlite3.Connection):
+    tier = attach_memory_tier(db_conn)
+    ids = institution_ids(db_conn)
+    Institution.read_institutions_from_db_by_ids(db_conn, ids, fields=["display_name"])
+    Institution.read_institutions_from_db_by_ids(db_conn, ids, lazy=True)
+    Institution.read_institutions_from_db_by_ids(db_conn, ids, compact=True)
+    assert tier.stats()["institutions"]["entries"] == 0
+
+def test_insert_and_delete_invalidate(db_conn: sqlite3.Connection):
+    tier = attach_memory_tier(db_conn)
+    institution = Institution.read_institutions_from_db_by_ids(db_conn, institution_ids(db_conn)[0])[0]
+    data = dict(institution.data, display_name="Renamed")
+    Institution(data).insert_or_replace_in_db(db_conn)
+    assert tier.stats()["institutions"]["entries"] == 0
+    assert Institution.read_institutions_from_db_by_ids(db_conn, institution.id)[0].data["display_name"] == "Renamed"
+    Institution(data).delete(db_conn)
+    assert Institution.read_institutions_from_db_by_ids(db_conn, institution.id) == []
+
+@pytest.mark.parametrize("policy, expected", [
+    # The first institution is read twice before the third is cached: LRU evicts it (the least recently used), LFU the second one.
+    ("lru", [1, 2]),
+    ("lfu", [0, 2]),
+])
+def test_eviction(db_conn: sqlite3.Connection, policy: str, expected: list):
+    tier = attach_memory_tier(db_conn, MemoryTier(max_entries=2, policy=policy))
+    ids = institution_ids(db_conn)
+    for i in [0, 0, 1, 2]:
+        Institution.read_institutions_from_db_by_ids(db_conn, ids[i])
+    assert [i for i in range(5) if tier.get("institutions", ids[i]) is not None] == expected
+    assert tier.stats()["institutions"]["evictions"] == 1
+
+def test_budgets(db_conn: sqlite3.Connection):
+    ids = institution_ids(db_conn)
+    size = len(json_codec.dumpb(Institution.read_institutions_from_db_by_ids(db_conn, ids[0])[0].data))
+    tier = attach_memory_tier(db_conn, MemoryTier(max_entries=None, budgets={"institutions": {"max_bytes": 2 * size}}))
+    Institution.read_institutions_from_db_by_ids(db_conn, ids)
+    stats = tier.stats()["institutions"]
+    assert stats["entries"] == 2 and stats["bytes"] == 2 * size and stats["evictions"] == 3
+    tier = attach_memory_tier(db_conn, MemoryTier(budgets={"institutions": {"max_entries": 0}}))
+    assert len(Institution.read_institutions_from_db_by_ids(db_conn, ids)) == 5
+    assert tier.stats()["institutions"] == {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+    with pytest.raises(ValueError):
+        MemoryTier(budgets={"institution": {"max_entries": 1}})
+
+def test_detach(db_conn: sqlite3.Connection):
+    attach_memory_tier(db_conn)
+    assert get_memory_tier(db_conn) is not None
+    detach_memory_tier(db_conn)
+    assert get_memory_tier(db_conn) is None
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import entity, raw_payloads
+from openalex_sqlite_cache.raw_payloads import PayloadCodec, disable_raw_payloads, enable_raw_payloads, read_raw_payloads, train_dictionary
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+def stored_payload_sizes(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT SUM(LENGTH(payload)) FROM raw_payloads").fetchone()[0]
+
+def test_raw_payloads_are_not_stored_by_default(db_conn: sqlite3.Connection):
+    Work.bulk_insert(db_conn, copies_with_ids(load_web_api_example("work"), 3))
+    assert db_conn.execute("SELECT COUNT(*) FROM raw_payloads").fetchone()[0] == 0
+
+@pytest.mark.parametrize("trained", [False, True])
+def test_raw_payloads_round_trip(db_conn: sqlite3.Connection, trained: bool):
+    works = copies_with_ids(load_web_api_example("work"), 20)
+    enable_raw_payloads(db_conn, "works", samples=works[10:] if trained else None)
+    Work.bulk_insert(db_conn, works[:10])
+
+    ids = [w["id"] for w in works[:10]]
+    assert [w.data for w in Work.read_raw_from_db_by_ids(db_conn, list(reversed(ids)))] == list(reversed(works[:10]))
+    assert read_raw_payloads(db_conn, ids[0]) == {Work._remove_base_url(ids[0]): works[0]}
+
+def test_trained_dictionary_compresses_better(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 40)
+    json_size = sum(len(json.dumps(w, separators=(",", ":"))) for w in works[:20])
+
+    enable_raw_payloads(db_conn, "works")
+    Work.bulk_insert(db_conn, works[:20])
+    plain_size = stored_payload_sizes(db_conn)
+
+    enable_raw_payloads(db_conn, "works", samples=works[20:])
+    Work.bulk_insert(db_conn, works[:20])
+    trained_size = stored_payload_sizes(db_conn)
+
+    assert plain_size < json_size
+    assert trained_size < plain_size
+
+def test_raw_reads_do_not_touch_entity_tables(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 3)
+    enable_raw_payloads(db_conn, "works")
+    Work.bulk_insert(db_conn, works)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    Work.read_raw_from_db_by_ids(db_conn, [w["id"] for w in works])
+
+    db_conn.set_trace_callback(None)
+    assert statements and all(" works" not in s for s in statements)
+
+def test_retraining_keeps_old_payloads_readable(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 30)
+    enable_raw_payloads(db_conn, "works", samples=works[10:20])
+    Work.bulk_insert(db_conn, works[:5])
+    enable_raw_payloads(db_conn, "works", samples=works[20:])
+    Work.bulk_insert(db_conn, works[5:10])
+
+    assert db_conn.execute("SELECT COUNT(DISTINCT dictionary_id) FROM raw_payloads").fetchone()[0] == 2
+    assert [w.data for w in Work.read_raw_from_db_by_ids(db_conn, [w["id"] for w in works[:10]])] == works[:10]
+
+def test_disable_raw_payloads(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 4)
+    enable_raw_payloads(db_conn, "works")
+    Work.bulk_insert(db_conn, works[:2])
+    disable_raw_payloads(db_conn, "works")
+    Work.bulk_insert(db_conn, works[2:])
+    assert len(Work.read_raw_from_db_by_ids(db_conn, [w["id"] for w in works])) == 2
+
+    disable_raw_payloads(db_conn, "works", delete_payloads=True)
+    assert Work.read_raw_from_db_by_ids(db_conn, [w["id"] for w in works]) == []
+
+@pytest.mark.parametrize("compact_ids", [False, True])
+@pytest.mark.parametrize("temp_table_threshold", [entity.TEMP_TABLE_THRESHOLD, 0])
+def test_payload_columns_are_read_from_the_payloads(monkeypatch, compact_ids: bool, temp_table_threshold: int):
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", temp_table_threshold)
+    conn = init_openalex_db(":memory:", compact_ids=compact_ids)
+    works = copies_with_ids(load_web_api_example("work"), 4)
+    works[1]["abstract_inverted_index"] = None
+    ids = [w["id"] for w in works]
+    enable_raw_payloads(conn, "works")
+    Work.bulk_insert(conn, works[:3])
+    disable_raw_payloads(conn, "works")
+    Work.bulk_insert(conn, works[3:])
+
+    assert works[0]["abstract_inverted_index"] is not None
+    assert conn.execute("SELECT COUNT(*) FROM works WHERE abstract_inverted_index IS NULL").fetchone()[0] == 3
+    read_from_payloads = [w.data for w in Work.read_works_from_db_by_ids(conn, ids)]
+    for kwargs in [{}, {"fields": ["abstract_inverted_index"]}, {"lazy": True}]:
+        assert [w.data["abstract_inverted_index"] for w in Work.read_works_from_db_by_ids(conn, ids, **kwargs)] == [w["abstract_inverted_index"] for w in works]
+    assert [w.to_dict()["abstract_inverted_index"] for w in Work.read_works_from_db_by_ids(conn, ids, compact=True)] == [w["abstract_inverted_index"] for w in works]
+
+    disable_raw_payloads(conn, "works", delete_payloads=True)
+    assert conn.execute("SELECT COUNT(*) FROM works WHERE abstract_inverted_index IS NULL").fetchone()[0] == 1
+    assert [w.data for w in Work.read_works_from_db_by_ids(conn, ids)] == read_from_payloads
+    conn.close()
+
+def test_payload_codec_is_read_once(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 4)
+    enable_raw_payloads(db_conn, "works", samples=works)
+    Work.bulk_insert(db_conn, works[:2])
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    Work.bulk_insert(db_conn, works[2:])
+
+    db_conn.set_trace_callback(None)
+    assert statements and not any("raw_payload_settings" in s or "raw_payload_dictionaries" in s for s in statements)
+    disable_raw_payloads(db_conn, "works")
+    Work.bulk_insert(db_conn, works)
+    assert db_conn.execute("SELECT COUNT(*) FROM works WHERE abstract_inverted_index IS NULL").fetchone()[0] == 0
+
+def test_raw_payloads_with_a_plain_connection(tmp_path):
+    file_path = str(tmp_path / "cache.db")
+    init_openalex_db(file_path).close()
+    conn = sqlite3.connect(file_path)
+    works = copies_with_ids(load_web_api_example("work"), 2)
+    Work.bulk_insert(conn, works[:1])
+    enable_raw_payloads(conn, "works")
+    Work.bulk_insert(conn, works[1:])
+    assert [w.data["abstract_inverted_index"] for w in Work.read_works_from_db_by_ids(conn, [w["id"] for w in works])] == [w["abstract_inverted_index"] for w in works]
+    assert len(Work.read_raw_from_db_by_ids(conn, [w["id"] for w in works])) == 1
+    conn.close()
+
+def test_enable_raw_payloads_rejects_unknown_types(db_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        enable_raw_payloads(db_conn, "papers")
+    with pytest.raises(ValueError):
+        enable_raw_payloads(db_conn, "works", codec="lzma")
+
+def test_zlib_dictionary_fits_the_window():
+    works = copies_with_ids(load_web_api_example("work"), 5)
+    assert 0 < len(train_dictionary(works, "zlib")) <= raw_payloads.ZLIB_DICTIONARY_SIZE
+    assert len(train_dictionary(works, "zlib", size=100)) == 100
+
+def test_payload_codec_can_be_pickled():
+    import pickle
+    work = load_web_api_example("work")
+    codec = pickle.loads(pickle.dumps(PayloadCodec("zlib", train_dictionary([work]), 1)))
+    assert codec.decompress(codec.compress(work)) == work
+
+@pytest.mark.skipif(raw_payloads.zstandard is not None, reason="zstandard is installed")
+def test_zstd_requires_zstandard(db_conn: sqlite3.Connection):
+    with pytest.raises(ImportError):
+        enable_raw_payloads(db_conn, "works", codec="zstd")
+
+@pytest.mark.skipif(raw_payloads.zstandard is None, reason="zstandard is not installed")
+def test_zstd_round_trip(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 20)
+    enable_raw_payloads(db_conn, "works", codec="zstd", samples=works[10:], dictionary_size=4096)
+    Work.bulk_insert(db_conn, works[:10])
+    assert [w.data for w in Work.read_raw_from_db_by_ids(db_conn, [w["id"] for w in works[:10]])] == works[:10]
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
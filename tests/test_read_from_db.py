@@ -0,0 +1,219 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache import entity
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.concept import Concept
+from openalex_sqlite_cache.funder import Funder
+from openalex_sqlite_cache.institution import Institution
+from openalex_sqlite_cache.publisher import Publisher
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.topic import Topic
+from openalex_sqlite_cache.work import Work
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+@pytest.mark.parametrize("entity_class, name, child_key", [
+    (Author, "author", "counts_by_year"),
+    (Institution, "institution", "associated_institutions"),
+    (Publisher, "publisher", "counts_by_year"),
+])
+def test_child_rows_belong_to_their_entity(db_conn: sqlite3.Connection, entity_class, name: str, child_key: str):
+    entities = copies_with_ids(load_web_api_example(name), 20)
+    for i, entity in enumerate(entities):
+        # A different number of child rows per entity.
+        entity[child_key] = entity[child_key][:i % 4]
+    entity_class.bulk_insert(db_conn, entities)
+    requested_ids = [e["id"] for e in reversed(entities)]
+
+    read_entities = entity_class.read_from_db_by_ids(db_conn, requested_ids + ["https://openalex.org/X0"])
+
+    assert [e.data["id"] for e in read_entities] == requested_ids
+    for read_entity in read_entities:
+        entity = next(e for e in entities if e["id"] == read_entity.data["id"])
+        assert len(read_entity.data[child_key]) == len(entity[child_key])
+        assert read_entity.data["ids"]["openalex"] == entity["ids"]["openalex"]
+
+def test_read_many_authors_is_one_query_per_table_chunk(db_conn: sqlite3.Connection):
+    authors = copies_with_ids(load_web_api_example("author"), 2000)
+    Author.bulk_insert(db_conn, authors)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    read_authors = Author.read_authors_from_db_by_ids(db_conn, [a["id"] for a in authors])
+
+    db_conn.set_trace_callback(None)
+    assert len(read_authors) == 2000
+    assert all(len(a.data["counts_by_year"]) == len(authors[0]["counts_by_year"]) for a in read_authors)
+    # One query per table for every chunk of IDs that fits in the SQL variables limit.
+    assert len(statements) == len(Author.TABLES) * 3
+
+@pytest.mark.parametrize("entity_class, name", [(Concept, "concept"), (Topic, "topic"), (Funder, "funder"), (Source, "source")])
+def test_read_many_ids(db_conn: sqlite3.Connection, entity_class, name: str):
+    entities = copies_with_ids(load_web_api_example(name), 5)
+    entity_class.bulk_insert(db_conn, entities)
+
+    read_entities = entity_class.read_from_db_by_ids(db_conn, [e["id"] for e in entities])
+
+    assert [e.data["id"] for e in read_entities] == [e["id"] for e in entities]
+    for read_entity, entity in zip(read_entities, entities):
+        assert read_entity.data["display_name"] == entity["display_name"]
+        assert read_entity.data["works_count"] == entity["works_count"]
+
+def test_read_source_round_trip(db_conn: sqlite3.Connection):
+    source = load_web_api_example("source")
+    Source.bulk_insert(db_conn, [source])
+
+    read_source = Source.read_sources_from_db_by_ids(db_conn, source["id"])[0].data
+
+    for key in ("issn_l", "issn", "is_oa", "is_in_doaj", "homepage_url", "works_api_url", "updated_date"):
+        assert read_source[key] == source[key], key
+    assert read_source["host_organization"] == source["host_organization"]
+    assert [c["year"] for c in read_source["counts_by_year"]] == [c["year"] for c in source["counts_by_year"]]
+
+def test_iter_authors_streams_chunks(db_conn: sqlite3.Connection):
+    authors = copies_with_ids(load_web_api_example("author"), 10)
+    Author.bulk_insert(db_conn, authors)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    # Any iterable of IDs, consumed lazily.
+    author_iter = Author.iter_authors_from_db_by_ids(db_conn, (a["id"] for a in authors), chunk_size=3)
+    first_author = next(author_iter)
+
+    assert first_author.data["id"] == authors[0]["id"]
+    assert len(statements) == len(Author.TABLES)
+    assert [a.data["id"] for a in author_iter] == [a["id"] for a in authors[1:]]
+    assert len(statements) == len(Author.TABLES) * 4
+    db_conn.set_trace_callback(None)
+
+def temp_tables(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table'").fetchall()
+
+@pytest.mark.parametrize("entity_class, name", [(Author, "author"), (Institution, "institution"), (Concept, "concept")])
+def test_temp_table_reads_match_chunked_reads(db_conn: sqlite3.Connection, monkeypatch, entity_class, name: str):
+    entities = copies_with_ids(load_web_api_example(name), 12)
+    entity_class.bulk_insert(db_conn, entities)
+    # An orphan child row, and unknown and duplicate IDs.
+    db_conn.execute("INSERT INTO {} VALUES ({})".format(list(entity_class.TABLES)[1], ", ".join(["'X1'"] + ["NULL"] * (len(list(entity_class.TABLES.values())[1]) - 1))))
+    requested_ids = ["X1"] + [e["id"] for e in reversed(entities)] + ["X2", entities[0]["id"]]
+    chunked = [e.data for e in entity_class.read_from_db_by_ids(db_conn, requested_ids)]
+
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", 5)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+    joined = [e.data for e in entity_class.read_from_db_by_ids(db_conn, requested_ids)]
+    db_conn.set_trace_callback(None)
+
+    assert joined == chunked
+    assert sum(s.startswith("SELECT") for s in statements) == len(entity_class.TABLES)
+    assert temp_tables(db_conn) == []
+
+def test_temp_table_is_dropped_when_iteration_stops(db_conn: sqlite3.Connection, monkeypatch):
+    authors = copies_with_ids(load_web_api_example("author"), 10)
+    Author.bulk_insert(db_conn, authors)
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", 5)
+
+    author_iter = Author.iter_authors_from_db_by_ids(db_conn, [a["id"] for a in authors])
+    assert next(author_iter).data["id"] == authors[0]["id"]
+    assert len(temp_tables(db_conn)) == 1
+    author_iter.close()
+
+    assert temp_tables(db_conn) == []
+    assert not db_conn.in_transaction
+
+def test_get_or_fetch_with_temp_table(db_conn: sqlite3.Connection, monkeypatch):
+    authors = copies_with_ids(load_web_api_example("author"), 10)
+    Author.bulk_insert(db_conn, authors)
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", 5)
+
+    def no_network(url, params):
+        raise AssertionError("All the authors are cached")
+
+    read_authors = Author.get_or_fetch(db_conn, [a["id"] for a in authors], transport=no_network)
+    assert [a.data["id"] for a in read_authors] == [a["id"] for a in authors]
+
+@pytest.mark.parametrize("entity_class, name", [(Author, "author"), (Institution, "institution"), (Work, "work"), (Topic, "topic")])
+def test_lazy_reads_match_eager_reads(db_conn: sqlite3.Connection, entity_class, name: str):
+    entities = copies_with_ids(load_web_api_example(name), 5)
+    entity_class.bulk_insert(db_conn, entities)
+    ids = [e["id"] for e in entities]
+
+    lazy_entities = entity_class.read_from_db_by_ids(db_conn, ids, lazy=True)
+
+    assert all(isinstance(e, entity_class) for e in lazy_entities)
+    assert [e.data for e in lazy_entities] == [e.data for e in entity_class.read_from_db_by_ids(db_conn, ids)]
+
+def test_lazy_parent_fields_need_no_query(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 10)
+    Work.bulk_insert(db_conn, works)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    lazy_works = Work.read_works_from_db_by_ids(db_conn, [w["id"] for w in works], lazy=True)
+    assert [(w.display_name, w.cited_by_count) for w in lazy_works] == [(w["display_name"], w["cited_by_count"]) for w in works]
+
+    db_conn.set_trace_callback(None)
+    assert len(statements) == 1
+    assert not any(w.loaded for w in lazy_works)
+
+def test_lazy_child_fields_load_the_whole_batch(db_conn: sqlite3.Connection):
+    authors = copies_with_ids(load_web_api_example("author"), 10)
+    Author.bulk_insert(db_conn, authors)
+    lazy_authors = Author.read_authors_from_db_by_ids(db_conn, [a["id"] for a in authors], lazy=True)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    assert len(lazy_authors[3].counts_by_year) == len(authors[3]["counts_by_year"])
+    assert [a.ids["openalex"] for a in lazy_authors] == [a["ids"]["openalex"] for a in authors]
+
+    db_conn.set_trace_callback(None)
+    # One query per child table, for all the authors of the read.
+    assert len(statements) == len(Author.TABLES) - 1
+    assert all(a.loaded for a in lazy_authors)
+    with pytest.raises(AttributeError):
+        lazy_authors[0].no_such_field
+
+@pytest.mark.parametrize("entity_class, name, fields", [
+    (Author, "author", ["display_name", "counts_by_year"]),
+    (Source, "source", ["host_organization", "ids"]),
+    (Topic, "topic", ["subfield", "works_count"]),
+    (Work, "work", ["title", "authorships", "open_access"]),
+])
+def test_read_fields_matches_full_read(db_conn: sqlite3.Connection, monkeypatch, entity_class, name: str, fields: list):
+    entities = copies_with_ids(load_web_api_example(name), 8)
+    entity_class.bulk_insert(db_conn, entities)
+    ids = [e["id"] for e in entities]
+    expected = [{key: value for key, value in e.data.items() if key in ["id"] + fields} for e in entity_class.read_from_db_by_ids(db_conn, ids)]
+
+    assert [e.data for e in entity_class.read_from_db_by_ids(db_conn, ids, fields=fields)] == expected
+    assert [e.data for e in entity_class.read_from_db_by_ids(db_conn, ids, lazy=True, fields=fields)] == expected
+    monkeypatch.setattr(entity, "TEMP_TABLE_THRESHOLD", 5)
+    assert [e.data for e in entity_class.read_from_db_by_ids(db_conn, ids, fields=fields)] == expected
+
+def test_read_fields_only_queries_their_tables(db_conn: sqlite3.Connection):
+    works = copies_with_ids(load_web_api_example("work"), 5)
+    Work.bulk_insert(db_conn, works)
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    read_works = Work.read_works_from_db_by_ids(db_conn, [w["id"] for w in works], fields=["display_name", "cited_by_count"])
+
+    db_conn.set_trace_callback(None)
+    assert [w.data["display_name"] for w in read_works] == [w["display_name"] for w in works]
+    assert len(statements) == 1
+    assert "abstract_inverted_index" not in statements[0]
+
+def test_read_unknown_fields(db_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        Work.read_works_from_db_by_ids(db_conn, ["W1"], fields=["display_name", "no_such_field"])
+
+def test_child_fields_cover_the_child_tables():
+    for entity_class in (Author, Concept, Funder, Institution, Publisher, Source, Topic, Work):
+        assert sorted(entity_class.CHILD_FIELDS.values()) == sorted(list(entity_class.TABLES)[1:])
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,66 @@
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.concept import Concept
+from openalex_sqlite_cache.funder import Funder
+from openalex_sqlite_cache.institution import Institution
+from openalex_sqlite_cache.publisher import Publisher
+from openalex_sqlite_cache.records import EntityRecord
+from openalex_sqlite_cache.source import Source
+from openalex_sqlite_cache.topic import Topic
+from openalex_sqlite_cache.work import Work
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+@pytest.mark.parametrize("entity_class, name", [
+    (Author, "author"), (Concept, "concept"), (Funder, "funder"), (Institution, "institution"),
+    (Publisher, "publisher"), (Source, "source"), (Topic, "topic"), (Work, "work"),
+])
+def test_records_convert_to_the_read_dicts(db_conn: sqlite3.Connection, entity_class, name: str):
+    entities = copies_with_ids(load_web_api_example(name), 3)
+    entity_class.bulk_insert(db_conn, entities)
+    ids = [e["id"] for e in entities]
+
+    records = entity_class.read_from_db_by_ids(db_conn, ids, compact=True)
+
+    assert all(isinstance(r, EntityRecord) and type(r).__name__ == f"{entity_class.__name__}Record" for r in records)
+    assert [r.to_dict() for r in records] == [e.data for e in entity_class.read_from_db_by_ids(db_conn, ids)]
+
+def test_record_fields_mirror_the_columns(db_conn: sqlite3.Connection):
+    work = load_web_api_example("work")
+    Work.bulk_insert(db_conn, [work])
+
+    record = Work.read_works_from_db_by_ids(db_conn, work["id"], compact=True)[0]
+
+    assert record._fields[:len(Work.TABLES["works"])] == Work.TABLES["works"]
+    assert record.id == Work._remove_base_url(work["id"])
+    assert record.display_name == work["display_name"]
+    assert len({row[2] for row in record.authorships}) == len({a["author"]["id"] for a in work["authorships"]})
+    assert record.referenced_works[0] == (record.id, Work._remove_base_url(work["referenced_works"][0]))
+    assert not hasattr(record, "__dict__")
+
+def test_records_use_less_memory_than_entities(db_conn: sqlite3.Connection):
+    authors = copies_with_ids(load_web_api_example("author"), 200)
+    Author.bulk_insert(db_conn, authors)
+    ids = [a["id"] for a in authors]
+
+    def allocated(read):
+        tracemalloc.start()
+        result = read()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert len(result) == 200
+        return size
+
+    assert allocated(lambda: Author.read_authors_from_db_by_ids(db_conn, ids, compact=True)) < allocated(lambda: Author.read_authors_from_db_by_ids(db_conn, ids))
+
+def test_compact_reads_cannot_be_lazy(db_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        Author.read_authors_from_db_by_ids(db_conn, ["A1"], lazy=True, compact=True)
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
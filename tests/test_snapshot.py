@@ -0,0 +1,136 @@
+import os
+import gzip
+import json
+import sqlite3
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from openalex_sqlite_cache import snapshot
+from openalex_sqlite_cache.author import Author
+from openalex_sqlite_cache.init_db import init_openalex_db
+from openalex_sqlite_cache.snapshot import iter_partitions, load_snapshot, load_snapshot_parallel
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+def write_partition(snapshot_dir, entity_type: str, updated_date: str, part: int, records: list):
+    """Write records as a gzipped JSON-lines partition, the way the OpenAlex snapshot lays them out."""
+    partition_dir = os.path.join(snapshot_dir, "data", entity_type, f"updated_date={updated_date}")
+    os.makedirs(partition_dir, exist_ok=True)
+    with gzip.open(os.path.join(partition_dir, f"part_{part:03d}.gz"), "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    """A small snapshot with two author partitions and one topic partition."""
+    authors = copies_with_ids(load_web_api_example("author"), 25)
+    write_partition(tmp_path, "authors", "2024-01-01", 0, authors[:10])
+    write_partition(tmp_path, "authors", "2024-01-01", 1, authors[10:])
+    write_partition(tmp_path, "topics", "2024-01-01", 0, copies_with_ids(load_web_api_example("topic"), 5))
+    return tmp_path
+
+def test_iter_partitions_is_ordered(snapshot_dir):
+    write_partition(snapshot_dir, "authors", "2023-06-01", 0, [])
+    partitions = iter_partitions(snapshot_dir, "authors")
+    assert [p.name for p in partitions] == [
+        "authors/updated_date=2023-06-01/part_000.gz",
+        "authors/updated_date=2024-01-01/part_000.gz",
+        "authors/updated_date=2024-01-01/part_001.gz",
+    ]
+
+def test_load_snapshot(db_conn: sqlite3.Connection, snapshot_dir):
+    stats = load_snapshot(db_conn, snapshot_dir, batch_size=4)
+
+    assert stats == {"partitions": 3, "skipped_partitions": 0, "records": 30}
+    assert db_conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 25
+    assert db_conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0] == 5
+    refreshed_dates = db_conn.execute("SELECT DISTINCT refreshed_date FROM refresh_log").fetchall()
+    assert refreshed_dates == [("2024-01-01",)]
+
+def test_load_snapshot_with_deferred_indexes(db_conn: sqlite3.Connection, snapshot_dir):
+    stats = load_snapshot(db_conn, snapshot_dir, defer_indexes=True)
+    assert stats["records"] == 30
+    indexes = {row[0] for row in db_conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "authors_orcid_idx" in indexes
+
+def test_load_snapshot_skips_applied_partitions(db_conn: sqlite3.Connection, snapshot_dir):
+    load_snapshot(db_conn, snapshot_dir)
+    stats = load_snapshot(db_conn, snapshot_dir)
+    assert stats == {"partitions": 0, "skipped_partitions": 3, "records": 0}
+
+def test_load_snapshot_applies_newer_partitions(db_conn: sqlite3.Connection, snapshot_dir):
+    load_snapshot(db_conn, snapshot_dir, entity_types=["authors"])
+    counts_by_year_before = db_conn.execute("SELECT COUNT(*) FROM authors_counts_by_year").fetchone()[0]
+
+    author = copies_with_ids(load_web_api_example("author"), 1)[0]
+    author["display_name"] = "Renamed Author"
+    write_partition(snapshot_dir, "authors", "2024-02-01", 0, [author])
+    stats = load_snapshot(db_conn, snapshot_dir, entity_types=["authors"])
+
+    assert stats == {"partitions": 1, "skipped_partitions": 2, "records": 1}
+    assert db_conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 25
+    assert db_conn.execute("SELECT COUNT(*) FROM authors_counts_by_year").fetchone()[0] == counts_by_year_before
+    author_read = Author.read_authors_from_db_by_ids(db_conn, author["id"])[0]
+    assert author_read.data["display_name"] == "Renamed Author"
+    assert db_conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0] == 0
+
+def test_load_snapshot_unknown_entity_type(db_conn: sqlite3.Connection, snapshot_dir):
+    with pytest.raises(ValueError):
+        load_snapshot(db_conn, snapshot_dir, entity_types=["keywords"])
+
+def test_load_snapshot_parallel_matches_sequential(snapshot_dir):
+    author = copies_with_ids(load_web_api_example("author"), 1)[0]
+    author["display_name"] = "Renamed Author"
+    write_partition(snapshot_dir, "authors", "2024-02-01", 0, [author])
+    sequential_conn = init_openalex_db(":memory:")
+    parallel_conn = init_openalex_db(":memory:")
+    try:
+        load_snapshot(sequential_conn, snapshot_dir)
+        stats = load_snapshot_parallel(parallel_conn, snapshot_dir, batch_size=4, processes=2)
+
+        assert stats["partitions"] == 4
+        assert stats["records"] == 31
+        assert stats["records_per_second"] > 0
+        for table in ["authors", "authors_counts_by_year", "authors_ids", "topics"]:
+            sql = f"SELECT * FROM {table}"
+            assert sorted(parallel_conn.execute(sql).fetchall()) == sorted(sequential_conn.execute(sql).fetchall())
+        assert load_snapshot_parallel(parallel_conn, snapshot_dir)["skipped_partitions"] == 4
+    finally:
+        sequential_conn.close()
+        parallel_conn.close()
+
+def test_load_snapshot_parallel_reports_worker_errors(db_conn: sqlite3.Connection, snapshot_dir):
+    partition_dir = os.path.join(snapshot_dir, "data", "authors", "updated_date=2024-02-01")
+    os.makedirs(partition_dir)
+    with gzip.open(os.path.join(partition_dir, "part_000.gz"), "wt") as f:
+        f.write("not json\n")
+    with pytest.raises(ValueError):
+        load_snapshot_parallel(db_conn, snapshot_dir, processes=2)
+    # The partitions of the earlier updated_date were fully loaded and recorded.
+    assert db_conn.execute("SELECT COUNT(*) FROM snapshot_partitions").fetchone()[0] == 3
+
+def raise_unpicklable(path):
+    class UnpicklableError(Exception):
+        pass
+    raise UnpicklableError(f"cannot read {path}")
+
+def exit_worker(path):
+    os._exit(1)
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the patched iter_records")
+@pytest.mark.parametrize("iter_records, exception, message", [
+    (raise_unpicklable, RuntimeError, "UnpicklableError: cannot read"),
+    (exit_worker, BrokenProcessPool, "terminated abruptly"),
+])
+def test_load_snapshot_parallel_does_not_hang_on_failed_workers(db_conn: sqlite3.Connection, snapshot_dir, monkeypatch, iter_records, exception: type, message: str):
+    monkeypatch.setattr(snapshot, "iter_records", iter_records)
+    monkeypatch.setattr(snapshot, "QUEUE_POLL_SECONDS", 0.1)
+    with pytest.raises(exception, match=message):
+        load_snapshot_parallel(db_conn, snapshot_dir, processes=2)
+    assert db_conn.execute("SELECT COUNT(*) FROM snapshot_partitions").fetchone()[0] == 0
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.topic import Topic
+from openalex_sqlite_cache.topic_taxonomy import rebuild_topic_rollups, work_counts_by_year
+from openalex_sqlite_cache.work import Work
+from openalex_sqlite_cache.init_db import init_openalex_db
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+
+# The taxa of each topic, as {topic: (subfield, field, domain)}.
+TAXONOMY = {1: (101, 11, 1), 2: (102, 11, 1), 3: (201, 21, 2)}
+
+# The publication year and topics of each work.
+WORKS = {1: (2020, [1, 2]), 2: (2020, [1]), 3: (2021, [3]), 4: (2021, [2, 3])}
+
+def make_topics(taxonomy: dict) -> dict:
+    template = load_web_api_example("topic")
+    template["id"] = "https://openalex.org/T1"
+    topics = {}
+    for topic in copies_with_ids(template, max(taxonomy)):
+        number = int(topic["id"].rsplit("T", 1)[-1])
+        subfield, field, domain = taxonomy[number]
+        topic["subfield"] = {"id": f"https://openalex.org/subfields/{subfield}", "display_name": f"Subfield {subfield}"}
+        topic["field"] = {"id": f"https://openalex.org/fields/{field}", "display_name": f"Field {field}"}
+        topic["domain"] = {"id": f"https://openalex.org/domains/{domain}", "display_name": f"Domain {domain}"}
+        topics[number] = topic
+    return topics
+
+def make_works(works: dict) -> dict:
+    template = load_web_api_example("work")
+    template["id"] = "https://openalex.org/W1"
+    made = {}
+    for work in copies_with_ids(template, max(works)):
+        number = int(work["id"].rsplit("W", 1)[-1])
+        work["doi"] = None
+        work["ids"] = {"openalex": work["id"]}
+        work["publication_year"], topic_numbers = works[number]
+        work["topics"] = [{"id": f"https://openalex.org/T{n}", "score": 0.9} for n in topic_numbers]
+        made[number] = work
+    return made
+
+def rollup_rows(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT level, taxon_id, year, works_count FROM topic_rollups ORDER BY level, taxon_id, year").fetchall()
+
+@pytest.fixture
+def db_conn():
+    """Fixture to provide a fresh SQLite in-memory database connection with the topics of TAXONOMY and the works of WORKS."""
+    conn = init_openalex_db(":memory:")
+    Topic.bulk_insert(conn, make_topics(TAXONOMY).values())
+    Work.bulk_insert(conn, make_works(WORKS).values())
+    yield conn
+    conn.close()
+
+def test_taxonomy_tables(db_conn: sqlite3.Connection):
+    assert db_conn.execute("SELECT id, display_name FROM domains ORDER BY id").fetchall() == [("domains/1", "Domain 1"), ("domains/2", "Domain 2")]
+    assert db_conn.execute("SELECT id, domain_id FROM fields ORDER BY id").fetchall() == [("fields/11", "domains/1"), ("fields/21", "domains/2")]
+    assert db_conn.execute("SELECT id, field_id FROM subfields ORDER BY id").fetchall() == [
+        ("subfields/101", "fields/11"), ("subfields/102", "fields/11"), ("subfields/201", "fields/21")]
+
+def test_work_counts_by_year(db_conn: sqlite3.Connection):
+    # W1 has two topics in fields/11, but counts once.
+    assert work_counts_by_year(db_conn) == {"fields/11": {2020: 2, 2021: 1}, "fields/21": {2021: 2}}
+    assert work_counts_by_year(db_conn, "topic", ["https://openalex.org/T2"]) == {"T2": {2020: 1, 2021: 1}}
+    assert work_counts_by_year(db_conn, "domain", years=[2021]) == {"domains/1": {2021: 1}, "domains/2": {2021: 2}}
+    with pytest.raises(ValueError):
+        work_counts_by_year(db_conn, "keyword")
+
+def test_rollups_follow_work_replace_and_delete(db_conn: sqlite3.Connection):
+    work = make_works({1: (2021, [3])})[1]
+    Work.bulk_insert(db_conn, [work])
+    assert work_counts_by_year(db_conn) == {"fields/11": {2020: 1, 2021: 1}, "fields/21": {2021: 3}}
+    Work(work).delete(db_conn)
+    assert work_counts_by_year(db_conn) == {"fields/11": {2020: 1, 2021: 1}, "fields/21": {2021: 2}}
+    expected = rollup_rows(db_conn)
+    rebuild_topic_rollups(db_conn)
+    assert rollup_rows(db_conn) == expected
+
+def test_rollups_follow_topic_insert_and_replace():
+    conn = init_openalex_db(":memory:")
+    Work.bulk_insert(conn, make_works(WORKS).values())
+    # Without their topics, the works only count at the topic level.
+    assert work_counts_by_year(conn) == {}
+    assert work_counts_by_year(conn, "topic", ["T1"]) == {"T1": {2020: 2}}
+    Topic.bulk_insert(conn, make_topics(TAXONOMY).values())
+    assert work_counts_by_year(conn) == {"fields/11": {2020: 2, 2021: 1}, "fields/21": {2021: 2}}
+    # T2 moves to fields/21: W4 now only counts there, and W1 still counts in fields/11 through T1.
+    Topic.bulk_insert(conn, [make_topics({**TAXONOMY, 2: (201, 21, 2)})[2]])
+    assert work_counts_by_year(conn) == {"fields/11": {2020: 2}, "fields/21": {2020: 1, 2021: 2}}
+    conn.close()
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])
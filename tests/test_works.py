@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from openalex_sqlite_cache.work import Work
+
+from fixtures.examples import load_web_api_example, copies_with_ids
+from fixtures.test_conn import db_conn
+
+@pytest.fixture
+def example_work():
+    return load_web_api_example("work")
+
+def location(location: dict) -> dict:
+    """The fields of a location that the works_*locations tables keep."""
+    if location is None:
+        return None
+    source = {"id": location["source"]["id"]} if location.get("source") else None
+    return {"source": source, **{k: location[k] for k in ("landing_page_url", "pdf_url", "is_oa", "version", "license")}}
+
+def test_read_work_round_trip(db_conn: sqlite3.Connection, example_work: dict):
+    Work.bulk_insert(db_conn, [example_work])
+
+    works = Work.read_works_from_db_by_ids(db_conn, example_work["id"])
+
+    assert len(works) == 1
+    work = works[0].data
+    for key in ("id", "doi", "title", "display_name", "publication_year", "publication_date", "type", "cited_by_count",
+                "is_retracted", "is_paratext", "cited_by_api_url", "abstract_inverted_index", "language", "updated_date",
+                "biblio", "open_access", "ids", "mesh", "referenced_works", "related_works"):
+        assert work[key] == example_work[key], key
+    assert work["primary_location"] == location(example_work["primary_location"])
+    assert work["best_oa_location"] == location(example_work["best_oa_location"])
+    assert work["locations"] == [location(loc) for loc in example_work["locations"]]
+    assert work["authorships"] == [
+        {"author_position": a["author_position"], "author": {"id": a["author"]["id"]}, "institutions": [{"id": i["id"]} for i in a["institutions"]]}
+        for a in example_work["authorships"]
+    ]
+    assert work["topics"] == [{"id": t["id"], "score": t["score"]} for t in example_work["topics"]]
+    assert work["concepts"] == [{"id": c["id"], "score": c["score"]} for c in example_work["concepts"]]
+
+def test_read_works_groups_child_rows_by_work(db_conn: sqlite3.Connection, example_work: dict):
+    works = copies_with_ids(example_work, 30)
+    works[1]["referenced_works"] = works[1]["referenced_works"][:2]
+    works[2]["authorships"][0]["institutions"] = []
+    Work.bulk_insert(db_conn, works)
+    requested_ids = [w["id"] for w in reversed(works)] + ["W1"]
+
+    read_works = Work.read_works_from_db_by_ids(db_conn, requested_ids)
+
+    assert [w.data["id"] for w in read_works] == requested_ids[:-1]
+    by_id = {w.id: w.data for w in read_works}
+    assert by_id[works[1]["id"].rsplit("/", 1)[-1]]["referenced_works"] == works[1]["referenced_works"]
+    assert by_id[works[0]["id"].rsplit("/", 1)[-1]]["referenced_works"] == example_work["referenced_works"]
+    assert by_id[works[2]["id"].rsplit("/", 1)[-1]]["authorships"][0]["institutions"] == []
+    assert len(by_id[works[2]["id"].rsplit("/", 1)[-1]]["authorships"]) == len(example_work["authorships"])
+
+def test_read_works_uses_one_query_per_table(db_conn: sqlite3.Connection, example_work: dict):
+    Work.bulk_insert(db_conn, copies_with_ids(example_work, 50))
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    Work.read_works_from_db_by_ids(db_conn, [w["id"] for w in copies_with_ids(example_work, 50)])
+
+    db_conn.set_trace_callback(None)
+    assert len(statements) == len(Work.TABLES)
+
+if __name__=="__main__":
+    pytest.main([__file__, "-s"])